@@ -0,0 +1,220 @@
+#######################################################################
+# Benchmarks of the load and interaction hot paths of the Flight_onTime bokeh-app
+#
+# Runs headless (no browser, server or network) on synthetic flights (see
+# syntheticData.py) at 1x, 12x and 60x the volume of January 2018:
+#
+#   coldLoad        the full data pipeline of a month (dataStore.buildDataStore)
+#                   with empty caches
+#   warmLoad        the same pipeline from the caches a previous load left
+#   nearestStation  the nearest weather stations of all the top airports
+#   figures         building the delay and weather figures (plots.py)
+#   delayPlots      computing and showing the delay histograms of every
+#                   airport/airline combination
+#   weatherPlots    computing and showing the daily stats and worst day
+#                   histograms of every airport
+#   binSweep        re-binning the histograms of the busiest airports and
+#                   airlines for every bin width of the slider (1 to 30 mins)
+#
+# For every case and scale it reports the latency percentiles and the peak
+# memory allocated (tracemalloc, on one extra run).  The result can be saved
+# as a baseline and later runs compared against it:
+#
+#       python benchmarks/runBenchmarks.py --scales 1 12 --save-baseline baseline.json
+#       python benchmarks/runBenchmarks.py --scales 1 12 --baseline baseline.json
+#
+# A comparison exits with status 1 when the median of a case is more than
+# 'tolerance' times its baseline.  The 60x data takes several GB of memory.
+#######################################################################
+import numpy as Numpy
+import argparse as Argparse
+import gc as Gc
+import json as Json
+import os as Os
+import platform as Platform
+import shutil as Shutil
+import sys as Sys
+import tempfile as Tempfile
+import time as Time
+import tracemalloc as Tracemalloc
+import syntheticData as SyntheticData     # (puts bokeh-app on the path)
+import dataStore as DataStore
+import perfMetrics as PerfMetrics
+import plotData as PlotData
+import plots as Plots
+import referenceData as ReferenceData
+import stationIndex as StationIndex
+
+defaultScales = [1, 12, 60]
+coldRepeat = 3
+sweepCombos = 5     # busiest airports x busiest airlines in the bin width sweep
+tolerance = 1.2
+
+def timeCalls(calls):
+    # return the seconds taken by each of the 'calls' (functions without arguments)
+    seconds = []
+    for call in calls:
+        startTime = Time.perf_counter()
+        call()
+        seconds.append(Time.perf_counter() - startTime)
+    return seconds
+
+def peakBytes(call):
+    # return the peak of the memory allocated while running 'call()'
+    Gc.collect()
+    Tracemalloc.start()
+    try:
+        call()
+        return Tracemalloc.get_traced_memory()[1]
+    finally:
+        Tracemalloc.stop()
+
+def summary(seconds, peak):
+    # return the count, percentiles (ms) and peak memory of a case
+    p50, p90, p99 = Numpy.percentile(seconds, [50, 90, 99])*1000
+    return {'n': len(seconds), 'mean_ms': float(Numpy.mean(seconds))*1000, 'p50_ms': float(p50),
+            'p90_ms': float(p90), 'p99_ms': float(p99), 'max_ms': float(Numpy.max(seconds))*1000,
+            'peak_bytes': int(peak)}
+
+def useDataDir(dataDir):
+    # point the data store at 'dataDir' (absolute paths override the app directory)
+    DataStore.baseDir = Os.path.join(dataDir, '')
+    DataStore.cacheDir = Os.path.join(dataDir, 'cache', '')
+    DataStore.reportMemory = False
+    DataStore.reportProgress = False
+
+def coldLoad(yyyymm):
+    Shutil.rmtree(DataStore.cacheDir, ignore_errors=True)
+    return DataStore.buildDataStore(yyyymm)
+
+def benchLoad(yyyymm):
+    #######################################################################
+    # time 'coldRepeat' cold and warm loads of the month, and return their
+    # results, the per stage times of the cold loads (see perfMetrics.py)
+    # and the data store of the last load
+    #######################################################################
+    PerfMetrics.resetMetrics()
+    cold = timeCalls([lambda: coldLoad(yyyymm)]*coldRepeat)
+    stages = {name: round(x['mean']*1000, 2) for name, x in PerfMetrics.metricsReport()['metrics'].items()
+              if (not name.endswith('.rss')) and name.startswith('load.')}
+    results = {'coldLoad': summary(cold, peakBytes(lambda: coldLoad(yyyymm)))}
+    DataStore.buildDataStore(yyyymm)
+    warm = timeCalls([lambda: DataStore.buildDataStore(yyyymm)]*coldRepeat)
+    results['warmLoad'] = summary(warm, peakBytes(lambda: DataStore.buildDataStore(yyyymm)))
+    return results, stages, DataStore.buildDataStore(yyyymm)
+
+def benchNearest(dataStore, yyyymm):
+    # time the nearest station query of all the top airports
+    stations = ReferenceData.stationTable(Os.path.join(DataStore.baseDir, DataStore.weatherStatLocFile), yyyymm,
+                                          Os.path.join(DataStore.cacheDir, 'reference'))
+    stationIndex = StationIndex.buildStationIndex(stations)
+    airports = dataStore['topAirports'].loc[dataStore['topAirports']['Type']=='DEP_DEL']
+    query = lambda: StationIndex.queryNearest(stationIndex, airports['LAT'], airports['LON'], k=DataStore.nearestStationCount)
+    return summary(timeCalls([query]*20), peakBytes(query))
+
+def benchPlots(dataStore, binW=5):
+    #######################################################################
+    # time building the figures, the delay plots of every airport/airline,
+    # the weather plots of every airport and the bin width sweep; the plot
+    # data is computed directly (not through the result cache of main.py)
+    #######################################################################
+    results = {}
+    makeFigures = lambda: (Plots.make_plot_delay(dataStore['durationRange']), Plots.make_plot_Weather())
+    results['figures'] = summary(timeCalls([makeFigures]*10), peakBytes(makeFigures))
+    pltDelay, pltWeather = makeFigures()
+    combos = [(x, y) for x in dataStore['airportList'] for y in dataStore['airlineList']
+              if (dataStore['airportIds'][x], dataStore['airlineIds'][y], 'DEP_DEL') in dataStore['durationHists']]
+
+    def delayPlot(airport, airline, binW):
+        Plots.update_plot_delay(pltDelay, PlotData.delayHists(dataStore, airport, airline, binW), airport, airline)
+    def weatherPlot(airport, binW):
+        airpByDatestats = PlotData.dailyStats(dataStore, airport)
+        Plots.update_plot_daily(pltWeather, airpByDatestats, 'TEMP')
+        Plots.update_plot_worst_day(pltWeather, PlotData.worstDayHists(dataStore, airport, airpByDatestats, binW))
+
+    results['delayPlots'] = summary(timeCalls([lambda x=x: delayPlot(*x, binW) for x in combos]),
+                                    peakBytes(lambda: [delayPlot(*x, binW) for x in combos]))
+    results['weatherPlots'] = summary(timeCalls([lambda x=x: weatherPlot(x, binW) for x in dataStore['airportList']]),
+                                      peakBytes(lambda: [weatherPlot(x, binW) for x in dataStore['airportList']]))
+    busiest = dataStore['topAirports'].loc[dataStore['topAirports']['Type']=='DEP_DEL'].nlargest(sweepCombos, 'AirpMonthTotal')
+    busiestAirlines = dataStore['topAirlines'].loc[dataStore['topAirlines']['Type']=='DEP_DEL'].nlargest(sweepCombos, 'AirlMonthTotal')
+    sweep = [(x, y, w) for x, y in combos if x in set(busiest['City']) and y in set(busiestAirlines['Airline'])
+             for w in range(1, 31)]
+    def sweepPlot(airport, airline, binW):
+        delayPlot(airport, airline, binW)
+        Plots.update_plot_worst_day(pltWeather, PlotData.worstDayHists(dataStore, airport, PlotData.dailyStats(dataStore, airport), binW))
+    results['binSweep'] = summary(timeCalls([lambda x=x: sweepPlot(*x) for x in sweep]),
+                                  peakBytes(lambda: [sweepPlot(*x) for x in sweep]))
+    return results
+
+def runScale(workDir, yyyymm, scale, seed):
+    # run all the cases on the synthetic data of 'scale' and return their results
+    dataDir = Os.path.join(workDir, f'{yyyymm}-x{scale:g}-seed{seed}')
+    startTime = Time.time()
+    SyntheticData.writeDataDir(dataDir, yyyymm, scale, seed)
+    print(f'x{scale:g}: synthetic data ready in {Time.time() - startTime:.1f} s', flush=True)
+    useDataDir(dataDir)
+    results, stages, dataStore = benchLoad(yyyymm)
+    results['nearestStation'] = benchNearest(dataStore, yyyymm)
+    results.update(benchPlots(dataStore))
+    return {'flights': len(dataStore['flightDur'])//len(PlotData.durTypes), 'airports': len(dataStore['airportList']),
+            'airlines': len(dataStore['airlineList']), 'loadStages_ms': stages, 'cases': results}
+
+def compare(results, baseline, tolerance=tolerance):
+    #######################################################################
+    # print the ratio of the median of every case to its 'baseline' and return
+    # the (scale, case) pairs that are more than 'tolerance' times slower
+    #######################################################################
+    regressions = []
+    for scale, scaleResults in results['scales'].items():
+        for case, caseResult in scaleResults['cases'].items():
+            base = baseline['scales'].get(scale, {}).get('cases', {}).get(case)
+            if base is None:
+                continue
+            ratio = caseResult['p50_ms']/max(base['p50_ms'], 1e-6)
+            memRatio = caseResult['peak_bytes']/max(base['peak_bytes'], 1)
+            flag = 'REGRESSION' if ratio > tolerance else ''
+            print(f'x{scale:<4} {case:<15} p50 {ratio:5.2f}x  peak {memRatio:5.2f}x  {flag}')
+            if ratio > tolerance:
+                regressions.append((scale, case))
+    return regressions
+
+def printResults(results):
+    for scale, scaleResults in results['scales'].items():
+        print(f"\nx{scale}: {scaleResults['flights']:,} flights, {scaleResults['airports']} airports, "
+              f"{scaleResults['airlines']} airlines")
+        print(f"{'case':<15} {'n':>6} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'peak MB':>10}")
+        for case, x in scaleResults['cases'].items():
+            print(f"{case:<15} {x['n']:>6} {x['p50_ms']:>10.2f} {x['p90_ms']:>10.2f} {x['p99_ms']:>10.2f} "
+                  f"{x['peak_bytes']/2**20:>10.1f}")
+        print('load stages (ms):', ', '.join(f'{k[5:]} {v}' for k, v in scaleResults['loadStages_ms'].items()))
+
+if __name__ == '__main__':
+    parser = Argparse.ArgumentParser(description='Benchmarks of the Flight_onTime bokeh-app')
+    parser.add_argument('--scales', type=float, nargs='+', default=defaultScales,
+                        help='volumes of the synthetic data, in months of January 2018')
+    parser.add_argument('--month', default=DataStore.yyyymmOfInt, help='month of the synthetic data (yyyymm)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=Os.path.join(Tempfile.gettempdir(), 'flight_ontime_bench'),
+                        help='where the synthetic data and caches are kept between runs')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--save-baseline', help='write the results as the baseline to this JSON file')
+    parser.add_argument('--baseline', help='compare the results against this baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=tolerance,
+                        help='slowdown of the median over the baseline counted as a regression')
+    args = parser.parse_args()
+
+    results = {'python': Platform.python_version(), 'machine': Platform.machine(), 'cpus': Os.cpu_count(),
+               'month': args.month, 'seed': args.seed, 'scales': {}}
+    for scale in args.scales:
+        results['scales'][f'{scale:g}'] = runScale(args.work_dir, args.month, scale, args.seed)
+        Gc.collect()
+    printResults(results)
+    for outFile in [args.output, args.save_baseline]:
+        if outFile:
+            with open(outFile, 'w') as resultFile:
+                Json.dump(results, resultFile, indent=1)
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            regressions = compare(results, Json.load(baselineFile), args.tolerance)
+        Sys.exit(1 if regressions else 0)
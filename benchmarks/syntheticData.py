@@ -0,0 +1,112 @@
+#######################################################################
+# Synthetic flight data for the Flight_onTime benchmarks
+#
+# Generates the flights of a month in the shape of the BTS On-Time pickle the
+# app reads ('Date', 'CAR', 'ORIGIN_ID', 'DEST_ID', 'DEP_DEL', 'DEP_TAXI',
+# 'ARR_TAXI', 'ARR_DEL', see 'flightColNos' in dataStore.py), 'scale' times
+# the volume of January 2018 ('flightsPerMonth').  Airports and airlines are
+# drawn with a Zipf-like weighting (a few hubs and carriers carry most of the
+# traffic); the hubs are the airports nearest to the weather stations of the
+# committed weather data, so the weather plots have data to show.  Delays are
+# mostly small with a long tail, taxiing times are gamma distributed.
+#
+# The data is reproducible: the same 'scale' and 'seed' always give the same
+# flights.
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+import calendar as Calendar
+import os as Os
+import sys as Sys
+
+appDir = Os.path.join(Os.path.dirname(Os.path.abspath(__file__)), '..', 'bokeh-app')
+Sys.path.insert(0, appDir)
+import dataStore as DataStore
+import referenceData as ReferenceData
+import stationIndex as StationIndex
+
+flightsPerMonth = 570000    # On-Time flights in January 2018
+hubCount = 60               # airports nearest to the stations with weather data
+smallAirportCount = 240     # airports without weather data
+carrierCodes = ['WN', 'AA', 'DL', 'OO', 'UA', 'B6', 'AS', 'EV', 'NK',
+                '9E', 'MQ', 'YX', 'OH', 'F9', 'YV', 'G4', 'HA']
+referenceFiles = [DataStore.airportInfoFile, DataStore.airlinesFile, DataStore.weatherStatLocFile]
+
+def zipfWeights(count, exponent=1.0):
+    # return the normalized weights 1/rank**exponent of 'count' ranked items
+    weights = 1/Numpy.arange(1, count + 1)**exponent
+    return weights/weights.sum()
+
+def benchAirports(yyyymm, rng):
+    #######################################################################
+    # return the AIRPORT_IDs of the synthetic airports, largest first: the
+    # 'hubCount' US airports nearest to the weather stations of the month's
+    # weather data, then 'smallAirportCount' other US airports
+    #######################################################################
+    airportData = Pandas.read_csv(Os.path.join(appDir, DataStore.baseDir + DataStore.airportInfoFile), index_col=False)
+    airportData = airportData.loc[(airportData['AIRPORT_IS_LATEST'] == 1) & (airportData['AIRPORT_COUNTRY_CODE_ISO'] == 'US')]
+    airportData = airportData.dropna(subset=['LATITUDE', 'LONGITUDE']).reset_index(drop=True)
+    weatherData = Pandas.read_pickle(Os.path.join(appDir, DataStore.baseDir + DataStore.weatherFilePrefix + yyyymm + '.pickle.gz'))
+    stations = ReferenceData.readStations(Os.path.join(appDir, DataStore.baseDir + DataStore.weatherStatLocFile), yyyymm)
+    stations = stations.assign(STN=stations['STN'].astype(str), WBAN=stations['WBAN'].astype(str).str.zfill(5))
+    stations = stations.merge(weatherData[['STN', 'WBAN']].drop_duplicates(), on=['STN', 'WBAN'], how='inner')
+    airportIndex = StationIndex.buildStationIndex(Pandas.DataFrame({'STN': airportData['AIRPORT_SEQ_ID'], 'WBAN': 0,
+                                                                    'LAT': airportData['LATITUDE'],
+                                                                    'LON': airportData['LONGITUDE']}))
+    nearestPos, _ = StationIndex.queryNearest(airportIndex, stations['LAT'], stations['LON'])
+    hubs = list(dict.fromkeys(airportIndex['STN'][nearestPos[:, 0]]))[:hubCount]
+    others = Numpy.setdiff1d(airportData['AIRPORT_SEQ_ID'].to_numpy(), hubs)
+    return Numpy.concatenate([hubs, rng.choice(others, smallAirportCount, replace=False)]).astype(Numpy.int64)
+
+def makeFlights(yyyymm, scale=1, seed=0):
+    # return the synthetic flights of the month 'yyyymm' ('scale' times the volume of January 2018)
+    rng = Numpy.random.default_rng(seed)
+    airports = benchAirports(yyyymm, rng)
+    flightCount = int(round(flightsPerMonth*scale))
+    daysInMonth = Calendar.monthrange(int(yyyymm[0:4]), int(yyyymm[4:6]))[1]
+    dates = Numpy.array([f'{yyyymm[0:4]}-{yyyymm[4:6]}-{x:02d}' for x in range(1, daysInMonth + 1)], dtype=object)
+    airportWeights = zipfWeights(len(airports))
+    origins = rng.choice(airports, flightCount, p=airportWeights)
+    dests = rng.choice(airports, flightCount, p=airportWeights)
+    sameAirport = origins == dests
+    dests[sameAirport] = rng.choice(airports, sameAirport.sum())
+    #######################################################################
+    # Departure delays: most flights leave a few minutes early or on time,
+    # about a fifth are late with an exponential tail; the arrival delay
+    # follows the departure delay
+    #######################################################################
+    late = rng.random(flightCount) < 0.2
+    depDel = Numpy.where(late, rng.exponential(45, flightCount), rng.normal(-4, 5, flightCount))
+    arrDel = depDel + rng.normal(-5, 10, flightCount)
+    return Pandas.DataFrame({'Date': dates[rng.integers(0, daysInMonth, flightCount)],
+                             'CAR': Numpy.array(carrierCodes, dtype=object)[rng.choice(len(carrierCodes), flightCount,
+                                                                                       p=zipfWeights(len(carrierCodes), 0.8))],
+                             'ORIGIN_ID': origins,
+                             'DEST_ID': dests,
+                             'DEP_DEL': Numpy.round(depDel),
+                             'DEP_TAXI': Numpy.round(1 + rng.gamma(3, 5, flightCount)),
+                             'ARR_TAXI': Numpy.round(1 + rng.gamma(2, 3.5, flightCount)),
+                             'ARR_DEL': Numpy.round(arrDel)})
+
+def writeDataDir(dataDir, yyyymm, scale=1, seed=0):
+    #######################################################################
+    # make 'dataDir' a data directory for the app (see 'baseDir' in
+    # dataStore.py) with the synthetic flights of 'yyyymm' and links to the
+    # reference files and weather data of bokeh-app/data.  The flights are
+    # only generated when the directory does not have them yet.
+    #######################################################################
+    Os.makedirs(dataDir, exist_ok=True)
+    for fileName in referenceFiles + [DataStore.weatherFilePrefix + yyyymm + '.pickle.gz']:
+        if not Os.path.exists(Os.path.join(dataDir, fileName)):
+            Os.symlink(Os.path.abspath(Os.path.join(appDir, DataStore.baseDir + fileName)), Os.path.join(dataDir, fileName))
+    flightFile = Os.path.join(dataDir, DataStore.flightFilePrefix + yyyymm + '.pickle.gz')
+    if not Os.path.exists(flightFile):
+        makeFlights(yyyymm, scale, seed).to_pickle(flightFile + '.tmp', compression={'method': 'gzip', 'compresslevel': 1})
+        Os.replace(flightFile + '.tmp', flightFile)
+    return flightFile
+
+if __name__ == '__main__':
+    # python syntheticData.py <dataDir> [scale] [yyyymm]
+    dataDir = Sys.argv[1]
+    print(writeDataDir(dataDir, Sys.argv[3] if len(Sys.argv) > 3 else DataStore.yyyymmOfInt,
+                       float(Sys.argv[2]) if len(Sys.argv) > 2 else 1))
@@ -0,0 +1,242 @@
+#######################################################################
+# Binary columnar cache for the Flight_onTime bokeh-app
+#
+# A frame is stored as one uncompressed '.npy' file per column plus a small
+# 'manifest.json' describing the columns and the source files it was built
+# from.  Numeric columns are memory-mapped on load, so the pages are shared
+# (zero-copy) between all sessions and between server worker processes.
+# String columns are stored as integer codes plus a list of categories;
+# categorical columns keep their own codes and come back as categoricals whose
+# codes are memory-mapped too.
+#
+# The cache is rebuilt automatically when any of its source files change
+# (size or modification time).
+#
+# A store ('storeDir') is a symbolic link to a directory holding one version
+# of it ('storeDir.v-...').  A new version is switched in by replacing the
+# link, which is atomic, so a reader always sees a whole store, the old or
+# the new one, even while other processes rebuild it.
+#
+# Large sources can be written in pieces: openColumns(), appendColumns() for
+# every chunk and closeColumns(), so that only one chunk is held in memory.
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+import contextlib as Contextlib
+import fcntl as Fcntl
+import json as Json
+import os as Os
+import shutil as Shutil
+import time as Time
+
+manifestFile = 'manifest.json'
+copyRows = 1 << 20      # rows copied at a time when a chunked store is closed
+
+def sourceSignature(sourceFiles):
+    #######################################################################
+    # return a dictionary {file name: [size, mtime]} of the given source files.
+    # Missing files are recorded as None.
+    #######################################################################
+    signature = {}
+    for sourceFile in sourceFiles:
+        try:
+            fileStat = Os.stat(sourceFile)
+            signature[Os.path.basename(sourceFile)] = [fileStat.st_size, int(fileStat.st_mtime)]
+        except OSError:
+            signature[Os.path.basename(sourceFile)] = None
+    return signature
+
+def saveColumns(frame, storeDir, sourceFiles=(), extra=None):
+    #######################################################################
+    # write 'frame' to 'storeDir' as one '.npy' per column.  The files are
+    # written to a temporary directory first and then switched in as the new
+    # version (see commitStore), so readers never see a partially written store.
+    # Missing strings are stored with code -1.
+    # 'extra' is stored (as JSON) in the manifest for the caller's use.
+    #######################################################################
+    tmpDir = storeDir + '.tmp-' + str(Os.getpid())
+    Shutil.rmtree(tmpDir, ignore_errors=True)
+    Os.makedirs(tmpDir)
+
+    columns = []
+    for colNo, colName in enumerate(frame.columns):
+        colData = frame[colName]
+        colInfo = {'name': colName, 'file': 'col' + str(colNo) + '.npy'}
+        if isinstance(colData.dtype, Pandas.CategoricalDtype):
+            colInfo['categories'] = [str(x) for x in colData.cat.categories]
+            colInfo['categorical'] = True
+            colValues = colData.cat.codes.to_numpy()
+        elif colData.dtype == object:
+            colCodes, colCategories = Pandas.factorize(colData.astype(object), sort=True)
+            colInfo['categories'] = [str(x) for x in colCategories]
+            colValues = colCodes.astype(Numpy.int32)
+        else:
+            colValues = colData.to_numpy()
+        Numpy.save(Os.path.join(tmpDir, colInfo['file']), colValues, allow_pickle=False)
+        columns.append(colInfo)
+
+    commitStore(tmpDir, storeDir, {'rows': len(frame),
+                                   'columns': columns,
+                                   'source': sourceSignature(sourceFiles),
+                                   'extra': extra or {}})
+
+@Contextlib.contextmanager
+def storeLock(lockName):
+    #######################################################################
+    # hold an exclusive lock on the file 'lockName.lock' (across processes)
+    # for the duration of the block, e.g.
+    #       with storeLock(storeDir):
+    #           ...
+    #######################################################################
+    Os.makedirs(Os.path.dirname(Os.path.abspath(lockName)), exist_ok=True)
+    with open(lockName + '.lock', 'a') as lockObj:
+        Fcntl.flock(lockObj, Fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            Fcntl.flock(lockObj, Fcntl.LOCK_UN)
+
+def commitStore(tmpDir, storeDir, manifest):
+    #######################################################################
+    # write the 'manifest' into 'tmpDir' and switch the link 'storeDir' to it
+    # (see the header).  The version it replaces is removed: processes that
+    # have it memory-mapped keep their pages.
+    #######################################################################
+    with open(Os.path.join(tmpDir, manifestFile), 'w') as fileObj:
+        Json.dump(manifest, fileObj)
+
+    versionDir = storeDir + '.v-' + str(Os.getpid()) + '-' + str(Time.time_ns())
+    Os.rename(tmpDir, versionDir)
+    linkFile = storeDir + '.link-' + str(Os.getpid())
+    with storeLock(storeDir):
+        oldDir = Os.path.realpath(storeDir) if Os.path.islink(storeDir) else None
+        if Os.path.isdir(storeDir) and not Os.path.islink(storeDir):
+            # a store written before the versions were linked
+            Shutil.rmtree(storeDir, ignore_errors=True)
+        Os.symlink(Os.path.basename(versionDir), linkFile)
+        Os.replace(linkFile, storeDir)
+        if oldDir is not None:
+            Shutil.rmtree(oldDir, ignore_errors=True)
+
+def openColumns(storeDir):
+    #######################################################################
+    # start a store in 'storeDir' that is written chunk by chunk; returns the
+    # writer (a dictionary) to pass to appendColumns() and closeColumns()
+    #######################################################################
+    tmpDir = storeDir + '.tmp-' + str(Os.getpid())
+    Shutil.rmtree(tmpDir, ignore_errors=True)
+    Os.makedirs(tmpDir)
+    return {'storeDir': storeDir, 'tmpDir': tmpDir, 'rows': 0, 'columns': None, 'codes': {}}
+
+def appendColumns(writer, frame):
+    #######################################################################
+    # append the rows of 'frame' to the store being written.  Every chunk must
+    # have the same columns; the dtypes of the first chunk are kept.  The raw
+    # column values are appended to one '.bin' file per column.
+    #######################################################################
+    if writer['columns'] is None:
+        writer['columns'] = []
+        for colNo, colName in enumerate(frame.columns):
+            colInfo = {'name': colName, 'file': 'col' + str(colNo) + '.npy'}
+            if frame[colName].dtype == object or isinstance(frame[colName].dtype, Pandas.CategoricalDtype):
+                colInfo['dtype'] = 'int32'
+                writer['codes'][colName] = {}
+            else:
+                colInfo['dtype'] = frame[colName].dtype.str
+            writer['columns'].append(colInfo)
+
+    for colInfo in writer['columns']:
+        colData = frame[colInfo['name']]
+        if colInfo['name'] in writer['codes']:
+            # codes are assigned in order of first appearance over all chunks
+            codes = writer['codes'][colInfo['name']]
+            colCodes, colCategories = Pandas.factorize(colData.astype(object))
+            lookup = Numpy.array([codes.setdefault(str(x), len(codes)) for x in colCategories] + [-1], dtype=Numpy.int32)
+            colValues = lookup[colCodes]
+        else:
+            colValues = colData.to_numpy().astype(colInfo['dtype'], copy=False)
+        with open(Os.path.join(writer['tmpDir'], colInfo['file'] + '.bin'), 'ab') as fileObj:
+            colValues.tofile(fileObj)
+    writer['rows'] += len(frame)
+
+def closeColumns(writer, sourceFiles=(), extra=None):
+    #######################################################################
+    # turn the appended '.bin' files into '.npy' files ('copyRows' at a time)
+    # and move the finished store into place
+    #######################################################################
+    columns = []
+    for colInfo in writer['columns'] or []:
+        binFile = Os.path.join(writer['tmpDir'], colInfo['file'] + '.bin')
+        colValues = Numpy.lib.format.open_memmap(Os.path.join(writer['tmpDir'], colInfo['file']), mode='w+',
+                                                 dtype=Numpy.dtype(colInfo['dtype']), shape=(writer['rows'],))
+        if writer['rows'] > 0:
+            binValues = Numpy.memmap(binFile, dtype=Numpy.dtype(colInfo['dtype']), mode='r', shape=(writer['rows'],))
+            for start in range(0, writer['rows'], copyRows):
+                colValues[start:start + copyRows] = binValues[start:start + copyRows]
+            del binValues
+        colValues.flush()
+        del colValues
+        Os.remove(binFile)
+        colInfo = {'name': colInfo['name'], 'file': colInfo['file']}
+        if colInfo['name'] in writer['codes']:
+            colInfo['categories'] = list(writer['codes'][colInfo['name']])
+        columns.append(colInfo)
+
+    commitStore(writer['tmpDir'], writer['storeDir'], {'rows': writer['rows'],
+                                                       'columns': columns,
+                                                       'source': sourceSignature(sourceFiles),
+                                                       'extra': extra or {}})
+
+def readManifest(storeDir, sourceFiles=None):
+    #######################################################################
+    # return the manifest of the store in 'storeDir', or None if the store
+    # does not exist or is stale with respect to 'sourceFiles'
+    #######################################################################
+    try:
+        with open(Os.path.join(storeDir, manifestFile)) as fileObj:
+            manifest = Json.load(fileObj)
+    except (OSError, ValueError):
+        return None
+    if (sourceFiles is not None) and (manifest['source'] != sourceSignature(sourceFiles)):
+        return None
+    return manifest
+
+def loadStore(storeDir, sourceFiles=None, mmap=True):
+    #######################################################################
+    # return (frame, manifest) of the store in 'storeDir' (see loadColumns),
+    # both from the same version of it, or (None, None).  A version that is
+    # replaced (and removed) by another process while it is read is read
+    # again from the new one.
+    #######################################################################
+    while True:
+        versionDir = Os.path.realpath(storeDir)
+        manifest = readManifest(versionDir, sourceFiles)
+        try:
+            if manifest is not None:
+                return loadVersion(versionDir, manifest, mmap), manifest
+        except OSError:
+            pass
+        if Os.path.realpath(storeDir) == versionDir:
+            return None, None
+
+def loadVersion(versionDir, manifest, mmap):
+    # return the frame of the columns of 'manifest' in 'versionDir'
+    colData = {}
+    for colInfo in manifest['columns']:
+        colValues = Numpy.load(Os.path.join(versionDir, colInfo['file']),
+                               mmap_mode=('r' if mmap else None), allow_pickle=False)
+        if colInfo.get('categorical'):
+            colValues = Pandas.Categorical.from_codes(colValues, categories=colInfo['categories'])
+        elif 'categories' in colInfo:
+            # code -1 (missing) picks up the trailing None
+            colValues = Numpy.asarray(colInfo['categories'] + [None], dtype=object)[colValues]
+        colData[colInfo['name']] = colValues
+    return Pandas.DataFrame(colData, columns=[x['name'] for x in manifest['columns']], copy=False)
+
+def loadColumns(storeDir, sourceFiles=None, mmap=True):
+    #######################################################################
+    # load a frame previously written by saveColumns().  Numeric columns are
+    # memory-mapped (read-only) unless 'mmap' is False.  Returns None if the
+    # store is missing or stale so that the caller can rebuild it.
+    #######################################################################
+    return loadStore(storeDir, sourceFiles, mmap)[0]
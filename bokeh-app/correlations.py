@@ -0,0 +1,58 @@
+#######################################################################
+# Weather/delay correlations for the Flight_onTime bokeh-app
+#
+# For every group of the daily statistics (e.g. every airport and type of
+# duration) and every weather parameter, the Pearson correlation between the
+# parameter and the daily mean duration, and the slope of the least squares
+# line (mins per unit of the parameter).  All groups and parameters are done
+# in one pass: the frame is sorted by the group keys once and the sums
+# (n, Sx, Sy, Sxx, Syy, Sxy) of every group are reduced column-wise with
+# Numpy.add.reduceat.  Days where the parameter or the duration is missing
+# are left out of that pair only.  The weather of weatherFetch.py has no
+# missing values: they were replaced by a fill value per parameter (see
+# 'sentinelTable'), so the values given in 'missing' count as missing.
+# Only fill values that are not also a reading belong there
+# (weatherFetch.missingValues): dry and snow-free days are days of the
+# PRCP and SnowDep correlations like any other.
+#######################################################################
+import numpy as Numpy
+
+minCorrDays = 10    # groups with fewer days get no correlation
+
+def groupSums(values, starts):
+    # return the sums of the rows of 'values' in the groups of sorted rows starting at 'starts'
+    return Numpy.add.reduceat(values, starts, axis=0)
+
+def weatherCorrelations(dailyStats, keys, valueCol, params, missing=None, minDays=minCorrDays):
+    #######################################################################
+    # return a frame with the 'keys' of every group of 'dailyStats', the
+    # 'param' and its 'r' (correlation with 'valueCol'), 'slope' and 'days'
+    # (the number of days with both values).  'missing' maps a parameter to
+    # the value that stands for a missing reading.  'r' and 'slope' are NaN
+    # for groups with fewer than 'minDays' days or without variation.
+    #######################################################################
+    dailyStats = dailyStats.sort_values(keys, kind='mergesort')
+    groupKeys = dailyStats[keys].reset_index(drop=True)
+    starts = Numpy.flatnonzero((groupKeys != groupKeys.shift()).any(axis=1).to_numpy())
+    x = dailyStats[params].to_numpy(dtype=float)
+    y = Numpy.broadcast_to(dailyStats[valueCol].to_numpy(dtype=float)[:, None], x.shape)
+    fills = Numpy.array([(missing or {}).get(x, Numpy.nan) for x in params], dtype=float)
+    valid = Numpy.isfinite(x) & Numpy.isfinite(y) & (x != fills)
+    x, y = Numpy.where(valid, x, 0), Numpy.where(valid, y, 0)
+    n = groupSums(valid.astype(float), starts)
+    sumX, sumY = groupSums(x, starts), groupSums(y, starts)
+    with Numpy.errstate(divide='ignore', invalid='ignore'):
+        covXY = n*groupSums(x*y, starts) - sumX*sumY
+        varX = n*groupSums(x*x, starts) - sumX**2
+        varY = n*groupSums(y*y, starts) - sumY**2
+        # sums of squares of constant columns may round to tiny non-zero values
+        flat = (varX <= 1e-9*Numpy.maximum(sumX**2, 1)) | (varY <= 1e-9*Numpy.maximum(sumY**2, 1)) | (n < minDays)
+        r = Numpy.where(flat, Numpy.nan, covXY/Numpy.sqrt(varX*varY))
+        slope = Numpy.where(flat, Numpy.nan, covXY/varX)
+    corr = groupKeys.iloc[starts].reset_index(drop=True)
+    corr = corr.loc[corr.index.repeat(len(params))].reset_index(drop=True)
+    corr['param'] = Numpy.tile(params, len(starts))
+    corr['r'] = Numpy.clip(r.ravel(), -1, 1)
+    corr['slope'] = slope.ravel()
+    corr['days'] = n.ravel().astype(int)
+    return corr
@@ -0,0 +1,632 @@
+#######################################################################
+# Shared, read-only data layer for the Flight_onTime bokeh-app
+#
+# 'bokeh serve' re-executes main.py for every new browser session.  All of the
+# data loading and preparation (flight and weather pickles, airport, airline and
+# weather station tables, nearest weather station search) lives in this module
+# instead.  It is built once per server process (see 'on_server_loaded' in
+# server_lifecycle.py) and every session document only references the result.
+#
+# The data is partitioned by month ('yyyymm'): every month has its own flight
+# and weather files and its own data store, which is only built when a month is
+# first selected.  The built months are kept in a least recently used cache
+# bounded by 'monthMemoryBudget'.
+#
+# The frames handed out by getDataStore() are shared between all sessions and
+# must be treated as read-only.
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+import os as Os
+import re as Re
+import datetime as Datetime
+import collections as Collections
+import threading as Threading
+import contextlib as Contextlib
+import columnStore as ColumnStore
+import ingest as Ingest
+import weatherFetch as WeatherFetch
+import referenceData as ReferenceData
+import stationIndex as StationIndex
+import groupIndex as GroupIndex
+import histograms as Histograms
+import correlations as Correlations
+import perfMetrics as PerfMetrics
+Pandas.set_option('display.expand_frame_repr', False)
+#######################################################################
+# User Input
+#   file names and locations
+#   rawData = 'True'
+#       - Read raw files (including pulling the weather files from FTP site)
+#       - Compile the relevant data and save as a pickle file
+#   rawData = 'False'
+#       - Read the pre-generated pickle file to load data.
+#       - This reduces the data stored on disk and the number of I/O to disk,
+#               thus speeding up web response
+#   nearestStationCount
+#       - Number of nearest weather stations considered for each airport, the
+#               nearest one with data for the month is used
+#   useColumnCache = 'True'
+#       - Keep an uncompressed, memory-mapped columnar copy (one '.npy' per column)
+#               of the pickles under 'cacheDir', rebuilt when the pickle changes,
+#               and of the parsed reference tables (see referenceData.py)
+#   reportMemory = 'True'
+#       - Print the in-memory footprint of 'flightDur' before and after it is
+#               compacted (see compactFlightDur)
+#   reportProgress = 'True'
+#       - Print a line as each stage of building a month starts (the server
+#               extension watches these while a server is starting)
+#   yyyymmOfInt
+#       - Month shown when a session starts (the latest available month if
+#               there is no data for it)
+#   weatherSource
+#       - With 'rawData', where missing weather station files are fetched from
+#               (see weatherFetch.py): an FTP URL or a local directory, or None
+#               to only use the files already in 'baseDir'
+#   weatherFetchThreads, weatherParseProcs
+#       - Number of download threads and of parsing processes (None: one per CPU)
+#   monthMemoryBudget
+#       - Bytes of built month data stores to keep in memory; the least
+#               recently used months are dropped beyond it (environment
+#               variable 'FLIGHT_ONTIME_MEMORY_MB')
+#   appendDir
+#       - Directory (in 'baseDir') of the batches of days appended to a month
+#               after its flight and weather files were made (see incremental.py)
+#######################################################################
+baseDir = 'data/'
+cacheDir = 'data/cache/'
+rawData = False
+useColumnCache = True
+reportMemory = True
+reportProgress = True
+nearestStationCount = 3
+yyyymmOfInt = '201801'
+weatherSource = None     # e.g. WeatherFetch.ncdcSource
+weatherFetchThreads = 8
+weatherParseProcs = None
+monthMemoryBudget = int(Os.environ.get('FLIGHT_ONTIME_MEMORY_MB', '4096'))*(1 << 20)
+appendDir = 'appends/'
+airportInfoFile = 'Airport_locations.csv'
+airlinesFile = 'Carriers.csv'
+weatherStatLocFile = 'isd-history.txt'
+flightFilePrefix = 'Flights_onTime_'
+weatherFilePrefix = 'weatherData_'
+flightFile = flightFilePrefix + yyyymmOfInt
+weatherFile = weatherFilePrefix + yyyymmOfInt
+yearOfInt = yyyymmOfInt[0:4]
+flightColsFull = ['Date', 'CAR', 'TAIL', 'FLNum', 'ORIGIN_ID', 'ORIGIN', 'DEST_ID', 'DEST',
+              'DEP_SCH', 'DEP_ACT', 'DEP_DEL', 'DEP_TAXI', 'DEP_OFF',
+              'ARR_ON', 'ARR_TAXI', 'ARR_SCH', 'ARR_ACT', 'ARR_DEL',
+              'CANCEL', 'CANCEL_CODE', 'DIV', 'FLY_SCH', 'FLY_ACT', 'FLY_AIR', 'FLY_DIST',
+              'DEL_CAR', 'DEL_WET', 'DEL_NAS', 'DEL_SEC', 'DEL_AIR']
+flightColNos = [0, 1, 4, 6, 10, 11, 14, 17]
+flightCols = ['Date', 'CAR', 'AIRPORT_ID', 'DURATION']
+flightKeys = ['AIRPORT_ID', 'CAR', 'Type']
+derivedVersion = 1      # bump when the layout of the derived flightDur store changes
+airportInfoColNos = [0,3,4,18,23]
+airportInfoCols = ['AIRPORT_ID', 'Airport', 'City', 'LAT', 'LON']
+#######################################################################
+# User defined functions
+#######################################################################
+def readPickle(fileName):
+    #######################################################################
+    # given the base name of a gzipped pickle in 'baseDir' ('fileName.pickle.gz'),
+    # return its frame.  The pickle is decompressed in memory (no temporary
+    # files).  With 'useColumnCache' the frame is served from the memory-mapped
+    # columnar cache, which is (re)built from the pickle when needed.
+    #######################################################################
+    pickleFile = Os.path.join(Os.path.dirname(__file__), baseDir + fileName + '.pickle.gz')
+    storeDir = Os.path.join(Os.path.dirname(__file__), cacheDir + fileName)
+    if (useColumnCache):
+        frame = ColumnStore.loadColumns(storeDir, [pickleFile])
+        if frame is not None:
+            return frame
+    frame = Pandas.read_pickle(pickleFile, compression='gzip')
+    if (useColumnCache):
+        ColumnStore.saveColumns(frame, storeDir, [pickleFile])
+    return frame
+
+def compactFlightDur(flightDur):
+    #######################################################################
+    # return 'flightDur' with compact dtypes: 'Date', 'CAR' and 'Type' as
+    # categoricals (sorted categories, so sorting and grouping order is the same
+    # as for the strings), an int8 'Day' of month, int32 'AIRPORT_ID' and int16
+    # 'DURATION' (float32 if the durations are not all whole minutes in range)
+    #######################################################################
+    date = Pandas.Categorical(flightDur['Date'])
+    dayOfCategory = Numpy.asarray(date.categories.str[8:10].astype(int), dtype=Numpy.int8)
+    duration = flightDur['DURATION'].to_numpy()
+    int16Info = Numpy.iinfo(Numpy.int16)
+    if (Numpy.isfinite(duration).all() and (duration == Numpy.round(duration)).all() and
+        (len(duration) == 0 or (int16Info.min <= duration.min() and duration.max() <= int16Info.max))):
+        duration = duration.astype(Numpy.int16)
+    else:
+        duration = duration.astype(Numpy.float32)
+    return Pandas.DataFrame({'Date': date,
+                             'CAR': Pandas.Categorical(flightDur['CAR']),
+                             'AIRPORT_ID': flightDur['AIRPORT_ID'].to_numpy().astype(Numpy.int32),
+                             'DURATION': duration,
+                             'Type': Pandas.Categorical(flightDur['Type']),
+                             'Day': dayOfCategory[date.codes]})
+
+def buildStage(name, yyyymm):
+    # time the stage 'name' of building the month 'yyyymm' as the span 'load.<name>' (see perfMetrics.py), announcing it
+    if (reportProgress):
+        print(f'Building {monthLabel(yyyymm)}: {name}', flush=True)
+    return PerfMetrics.span('load.' + name, month=yyyymm)
+
+def memoryFootprint(frame):
+    # return the number of bytes used by 'frame' (including the strings it references)
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+def availableMonths():
+    #######################################################################
+    # return the sorted list of months ('yyyymm') that have flight data in
+    # 'baseDir' (the csv file with 'rawData', otherwise the flight and the
+    # weather pickles)
+    #######################################################################
+    dataDir = Os.path.join(Os.path.dirname(__file__), baseDir)
+    fileNames = set(Os.listdir(dataDir))
+    months = []
+    for fileName in fileNames:
+        fileMatch = Re.fullmatch(Re.escape(flightFilePrefix) + r'(\d{6})\.(csv|pickle\.gz)', fileName)
+        if fileMatch is None:
+            continue
+        yyyymm = fileMatch.group(1)
+        if (rawData) and fileMatch.group(2) == 'csv':
+            months.append(yyyymm)
+        elif (not rawData) and fileMatch.group(2) == 'pickle.gz' and (weatherFilePrefix + yyyymm + '.pickle.gz') in fileNames:
+            months.append(yyyymm)
+    return sorted(set(months))
+
+def defaultMonth():
+    # return 'yyyymmOfInt' if it is available, otherwise the latest available month
+    months = availableMonths()
+    return yyyymmOfInt if (yyyymmOfInt in months or not months) else months[-1]
+
+def monthLabel(yyyymm):
+    # return the display name of the month 'yyyymm' (e.g. 'Jan 2018')
+    return Datetime.datetime.strptime(yyyymm, '%Y%m').strftime('%b %Y')
+
+def appendedFiles(filePrefix, yyyymm):
+    #######################################################################
+    # return the base names (for readPickle) of the batches of days appended
+    # to the month 'yyyymm' (see incremental.py), oldest first: the files
+    # '<appendDir>/<filePrefix><yyyymm>_<timestamp>.pickle.gz'
+    #######################################################################
+    batchDir = Os.path.join(Os.path.dirname(__file__), baseDir + appendDir)
+    fileNames = Os.listdir(batchDir) if Os.path.isdir(batchDir) else []
+    batchNames = [x[:-len('.pickle.gz')] for x in fileNames
+                  if Re.fullmatch(Re.escape(filePrefix + yyyymm) + r'_\d+\.pickle\.gz', x)]
+    return [appendDir + x for x in sorted(batchNames)]
+
+def flightSourceFiles(yyyymm):
+    # return the files the flights of the month 'yyyymm' are read from: its pickle and the appended batches
+    return [Os.path.join(Os.path.dirname(__file__), baseDir + x + '.pickle.gz')
+            for x in [flightFilePrefix + yyyymm] + appendedFiles(flightFilePrefix, yyyymm)]
+
+def newDays(frame, knownDates):
+    # return the rows of 'frame' whose 'Date' is not in 'knownDates' (appended batches only add whole days)
+    return frame.loc[~frame['Date'].isin(knownDates)]
+
+def meltFlights(flightData):
+    #######################################################################
+    # return the durations of the flights 'flightData' in long format: one row
+    # ('Date', 'CAR', 'AIRPORT_ID', 'DURATION', 'Type') per flight and type of
+    # duration, departures keyed by the origin and arrivals by the destination
+    #######################################################################
+    flightDepDel = flightData[['Date', 'CAR', 'ORIGIN_ID', 'DEP_DEL']].copy()
+    flightArrDel = flightData[['Date', 'CAR', 'DEST_ID', 'ARR_DEL']].copy()
+    flightDepTaxi = flightData[['Date', 'CAR', 'ORIGIN_ID', 'DEP_TAXI']].copy()
+    flightArrTaxi = flightData[['Date', 'CAR', 'DEST_ID', 'ARR_TAXI']].copy()
+    flightDepDel.columns = flightArrDel.columns = flightDepTaxi.columns = flightArrTaxi.columns = flightCols
+    flightDepDel['Type'] = 'DEP_DEL'
+    flightArrDel['Type'] = 'ARR_DEL'
+    flightDepTaxi['Type'] = 'DEP_TAXI'
+    flightArrTaxi['Type'] = 'ARR_TAXI'
+    return Pandas.concat([flightDepDel, flightArrDel, flightDepTaxi, flightArrTaxi])
+
+def buildFlightDur(yyyymm):
+    #######################################################################
+    # read the flights of the month 'yyyymm' and return the compact durations
+    # (one row per flight and type of duration) sorted by 'flightKeys', and
+    # the memory report of the compaction
+    #######################################################################
+    flightFile = flightFilePrefix + yyyymm
+    #######################################################################
+    # Read in the flight data (condensed version from pickle file OR from the original csv file)
+    #   The csv file is streamed in chunks into the columnar store (see ingest.py)
+    #######################################################################
+    with buildStage('flightFile', yyyymm):
+        if (rawData):
+            flightData = Ingest.ingestFlightFile(Os.path.join(Os.path.dirname(__file__), baseDir + flightFile + '.csv'),
+                                                 Os.path.join(Os.path.dirname(__file__), cacheDir + flightFile),
+                                                 Os.path.join(Os.path.dirname(__file__), baseDir + flightFile + '.pickle.gz'),
+                                                 flightColsFull, flightColNos)
+        else:
+            flightData = readPickle(flightFile)
+        #
+        # Followed by the days appended since (see incremental.py); days the
+        # month's file already has are not added twice
+        #
+        batchFiles = appendedFiles(flightFilePrefix, yyyymm)
+        if batchFiles:
+            knownDates, batches = set(Pandas.unique(flightData['Date'])), []
+            for batchFile in batchFiles:
+                batches.append(newDays(readPickle(batchFile), knownDates))
+                knownDates.update(batches[-1]['Date'])
+            flightData = Pandas.concat([flightData] + batches, ignore_index=True)
+            del batches
+    #######################################################################
+    # Combine arrival and departure delays and arrival and departure taxi times
+    #######################################################################
+    with buildStage('concat', yyyymm):
+        flightDur = meltFlights(flightData)
+        del flightData
+    #######################################################################
+    # Compact the dtypes of the durations (see compactFlightDur).  They stay in
+    # long format: departures and arrivals are keyed by different airports.
+    #######################################################################
+    with buildStage('compact', yyyymm):
+        memoryReport = {'flightDur': {'rows': len(flightDur), 'before': memoryFootprint(flightDur)}}
+        flightDur = compactFlightDur(flightDur)
+        memoryReport['flightDur']['after'] = memoryFootprint(flightDur)
+    #######################################################################
+    # Sort the durations by (AIRPORT_ID, CAR, Type) once
+    #######################################################################
+    with buildStage('sort', yyyymm):
+        flightDur = flightDur.sort_values(flightKeys, kind='mergesort').reset_index(drop=True)
+    return flightDur, memoryReport
+
+def derivedStoreDir(yyyymm):
+    # return the directory of the derived flightDur store of the month 'yyyymm' (see loadFlightDur)
+    return Os.path.join(Os.path.dirname(__file__), cacheDir + 'derived/' + flightFilePrefix + yyyymm)
+
+def loadDerivedStore(storeDir, sourceFiles):
+    # return (flightDur, memoryReport) of the derived store 'storeDir' if it is up to date, otherwise (None, None)
+    if (not useColumnCache) or (rawData):
+        return None, None
+    flightDur, manifest = ColumnStore.loadStore(storeDir, sourceFiles)
+    if (manifest is None) or (manifest['extra'].get('version') != derivedVersion):
+        return None, None
+    return flightDur, manifest['extra']['memoryReport']
+
+def loadFlightDur(yyyymm):
+    #######################################################################
+    # return the durations of the month 'yyyymm' (see buildFlightDur) and their
+    # memory report.  With 'useColumnCache' they are kept in a derived columnar
+    # store under 'cacheDir' and memory-mapped from there, so that all the server
+    # processes (see 'FLIGHT_ONTIME_NUM_PROCS' in bokehServerExtension.py) share
+    # the same pages.  The store is rebuilt when the flight pickle changes or
+    # days are appended to the month (unless incremental.py has merged them in),
+    # by one process at a time: the others wait for it and map its store.
+    #######################################################################
+    storeDir = derivedStoreDir(yyyymm)
+    sourceFiles = flightSourceFiles(yyyymm)
+    flightDur, memoryReport = loadDerivedStore(storeDir, sourceFiles)
+    if flightDur is None:
+        with ColumnStore.storeLock(storeDir + '.build') if (useColumnCache) else Contextlib.nullcontext():
+            flightDur, memoryReport = loadDerivedStore(storeDir, sourceFiles)
+            if flightDur is None:
+                flightDur, memoryReport = buildFlightDur(yyyymm)
+                if (useColumnCache):
+                    ColumnStore.saveColumns(flightDur, storeDir, sourceFiles, extra={'version': derivedVersion, 'memoryReport': memoryReport})
+                    # (the frame just built is kept if the store was replaced again meanwhile)
+                    storedDur = ColumnStore.loadColumns(storeDir)
+                    if storedDur is not None:
+                        flightDur = storedDur
+    if (reportMemory):
+        print("Memory footprint of flightDur for {month} ({rows} rows): {before:,} bytes -> {after:,} bytes".format(
+              month=monthLabel(yyyymm), **memoryReport['flightDur']))
+    return flightDur, memoryReport
+
+def appendWeather(airpWet, batches):
+    # return the weather 'airpWet' followed by the station days of the appended 'batches' that it does not have yet
+    if len(batches) == 0:
+        return airpWet
+    airpWet = Pandas.concat([airpWet] + list(batches), ignore_index=True)
+    return airpWet.drop_duplicates(['STN', 'WBAN', 'Date'], keep='first').reset_index(drop=True)
+
+def dailyDurationStats(dayDur):
+    # return the 'mean', 'median' and 'count' of the durations 'dayDur' of each (Date, Type, AIRPORT_ID)
+    # (With several categorical keys and 'observed', the groups come out unsorted.)
+    dailyStats = dayDur.groupby(['Date', 'Type', 'AIRPORT_ID'], observed=True)['DURATION'].agg(['mean', 'median', 'count'])
+    return dailyStats.sort_index().reset_index()
+
+def dailyCube(dayStats, topAirports, airpWet):
+    #######################################################################
+    # return the daily statistics cube (see buildDataStore), indexed by
+    # AIRPORT_ID, of the daily duration stats 'dayStats' of the top airports,
+    # and the list of weather parameters
+    #######################################################################
+    dailyStats = dayStats.merge(topAirports, on=['AIRPORT_ID', 'Type'], how='inner')
+    dailyStats = dailyStats.merge(airpWet, on=['STN', 'WBAN', 'Date'], how='inner')
+    dailyStats['Day'] = dailyStats['Date'].str[8:10].astype(int)
+    dailyIndex = GroupIndex.buildGroupIndex(dailyStats, ['AIRPORT_ID'], 'mean')
+    weatherParams = sorted(list(airpWet.columns)[3:len(list(airpWet.columns))])
+    return dailyIndex, weatherParams
+
+def correlateWeather(dailyIndex, weatherParams):
+    # return the correlations of the 'weatherParams' with the daily mean durations of the cube 'dailyIndex' (see correlations.py)
+    return Correlations.weatherCorrelations(dailyIndex['frame'], ['AIRPORT_ID', 'City', 'Type'], 'mean', weatherParams,
+                                            WeatherFetch.missingValues)
+
+def buildDataStore(yyyymm=yyyymmOfInt):
+    #######################################################################
+    # Run the full data preparation pipeline for the month 'yyyymm' and return
+    # a dictionary of the frames and lists that the plots need:
+    #   'flightDur', 'flightIndex', 'durationRange', 'durationHists', 'dailyHists', 'dayStats', 'dailyIndex',
+    #   'weatherCorr', 'topAirlines', 'topAirports',
+    #   'airpWet', 'airportList', 'airlineList', 'airportIds', 'airlineIds', 'weatherParams',
+    #   'memoryReport', 'appendBatches' (the appended batches it includes), 'yyyymm'
+    #######################################################################
+    weatherFile = weatherFilePrefix + yyyymm
+    batchFiles = appendedFiles(flightFilePrefix, yyyymm) + appendedFiles(weatherFilePrefix, yyyymm)
+
+    #######################################################################
+    # The sorted, compact durations of every flight (see loadFlightDur), indexed by
+    # (AIRPORT_ID, CAR, Type) so that every airport and (airport, airline, type)
+    # group is a contiguous slice (see groupIndex.py)
+    #######################################################################
+    with buildStage('flights', yyyymm):
+        flightDur, memoryReport = loadFlightDur(yyyymm)
+    with buildStage('flightIndex', yyyymm):
+        flightIndex = GroupIndex.indexSortedFrame(flightDur, flightKeys, 'DURATION')
+        durationRange = (flightDur['DURATION'].quantile(0.02), flightDur['DURATION'].quantile(0.98))
+    #######################################################################
+    # Only select those airlines that have a large number of flights (at least 2 per hour on average)
+    # Merge this info with airline names
+    #######################################################################
+    with buildStage('topAirlines', yyyymm):
+        topAirlines = flightDur.groupby(['CAR', 'Type'])['DURATION'].agg(['count']).reset_index().rename(columns={'count':'AirlMonthTotal'})
+        topAirlines = topAirlines.loc[topAirlines['AirlMonthTotal'] > 24*2*flightDur['Date'].nunique()]
+        #
+        airlineData = ReferenceData.airlineTable(Os.path.join(Os.path.dirname(__file__), baseDir + airlinesFile),
+                                                 Os.path.join(Os.path.dirname(__file__), cacheDir + 'reference'), useColumnCache)
+        topAirlines = topAirlines.merge(airlineData, on=['CAR'], how='inner')
+        del airlineData
+    #######################################################################
+    # Only select those airports that have a large number of flights (at least 2 per hour on average)
+    # Merge this with airport info
+    #######################################################################
+    with buildStage('topAirports', yyyymm):
+        topAirports = flightDur.groupby(['AIRPORT_ID', 'Type'])['DURATION'].agg(['count']).reset_index().rename(columns={'count':'AirpMonthTotal'})
+        topAirports = topAirports.loc[topAirports['AirpMonthTotal'] > 24*2*flightDur['Date'].nunique()]
+        #
+        airportData = ReferenceData.airportTable(Os.path.join(Os.path.dirname(__file__), baseDir + airportInfoFile),
+                                                 airportInfoColNos, airportInfoCols,
+                                                 Os.path.join(Os.path.dirname(__file__), cacheDir + 'reference'), useColumnCache)
+        topAirports = topAirports.merge(airportData, on=['AIRPORT_ID'], how='inner')
+        del airportData
+    #######################################################################
+    # Extract the location of the weather stations that are active during the time period
+    # of the flight delays.  Make sure to include only those data that have valid LAT and LON
+    # and build the spatial index over them
+    #######################################################################
+    with buildStage('stations', yyyymm):
+        weatherStatData = ReferenceData.stationTable(Os.path.join(Os.path.dirname(__file__), baseDir + weatherStatLocFile), yyyymm,
+                                                     Os.path.join(Os.path.dirname(__file__), cacheDir + 'reference'), useColumnCache)
+        stationIndex = StationIndex.buildStationIndex(weatherStatData)
+        del weatherStatData
+    #######################################################################
+    # For each of the airports in 'topAirports', find the 'nearestStationCount' nearest
+    # weather stations (in one batched query), nearest first
+    #######################################################################
+    with buildStage('nearestStation', yyyymm):
+        airpStat = topAirports.loc[topAirports['Type']=='DEP_DEL', ['AIRPORT_ID', 'LAT', 'LON']].reset_index(drop=True)
+        nearestPos, nearestDist = StationIndex.queryNearest(stationIndex, airpStat['LAT'], airpStat['LON'],
+                                                            k=nearestStationCount)
+        nearestSTN = stationIndex['STN'][nearestPos].astype(str)
+        nearestWBAN = Numpy.char.zfill(stationIndex['WBAN'][nearestPos].astype(str), 5)
+        del stationIndex
+    #######################################################################
+    # Load the weather data
+    #   With 'rawData', the station files are read nearest first, all the airports
+    #   at once (see weatherFetch.py); the next nearest station is only read for
+    #   the airports whose nearer ones have no data for the month.
+    #######################################################################
+    with buildStage('weather', yyyymm):
+        if (rawData):
+            stationWet = {}
+            airpNos = Numpy.arange(len(airpStat))
+            for candNo in range(nearestPos.shape[1]):
+                statNames = [WeatherFetch.stationFile(nearestSTN[x, candNo], nearestWBAN[x, candNo], yyyymm[0:4]) for x in airpNos]
+                stationWet.update(WeatherFetch.loadStations([x for x in statNames if x not in stationWet], yyyymm,
+                                                            Os.path.join(Os.path.dirname(__file__), baseDir), weatherSource,
+                                                            weatherFetchThreads, weatherParseProcs))
+                airpNos = [x for x, statName in zip(airpNos, statNames) if len(stationWet[statName]) == 0]
+                if len(airpNos) == 0:
+                    break
+            # (an empty frame if none of the stations has data for the month)
+            airpWet = Pandas.concat([stationWet[x] for x in sorted(stationWet) if len(stationWet[x]) > 0] or [WeatherFetch.emptyWeather()])
+            del stationWet
+            airpWet.to_pickle(Os.path.join(Os.path.dirname(__file__), baseDir + weatherFile + '.pickle.gz'), compression='gzip')
+        else:
+            airpWet = readPickle(weatherFile)
+        airpWet = appendWeather(airpWet, [readPickle(x) for x in appendedFiles(weatherFilePrefix, yyyymm)])
+    #######################################################################
+    # Assign each airport to its nearest weather station that has data for the month
+    # (falling back to the 2nd, 3rd, ... nearest).  Airports for which none of the
+    # candidates have data keep their nearest station.
+    #######################################################################
+    statsWithData = set(zip(airpWet['STN'], airpWet['WBAN']))
+    candHasData = Numpy.array([[(stn, wban) in statsWithData for stn, wban in zip(rowSTN, rowWBAN)]
+                               for rowSTN, rowWBAN in zip(nearestSTN, nearestWBAN)], dtype=bool).reshape(nearestPos.shape)
+    candNo = Numpy.where(candHasData.any(axis=1), candHasData.argmax(axis=1), 0)
+    airpNo = Numpy.arange(len(airpStat))
+    airpStat['dist2WetStat'] = Numpy.round(nearestDist[airpNo, candNo], 0)
+    airpStat['STN'] = nearestSTN[airpNo, candNo]
+    airpStat['WBAN'] = nearestWBAN[airpNo, candNo]
+    airpStat.drop(['LAT', 'LON'], axis=1, inplace=True)
+    topAirports = topAirports.merge(airpStat, on=['AIRPORT_ID'], how='inner')
+    del airpStat
+    #######################################################################
+    # find list of airports and airlines
+    #######################################################################
+    airportList = list(topAirports.sort_values(['City'], ascending=[True])['City'].unique())
+    airlineList = list(topAirlines.sort_values(['Airline'], ascending=[True])['Airline'].unique())
+    airportIds = dict(zip(topAirports['City'], topAirports['AIRPORT_ID']))
+    airlineIds = dict(zip(topAirlines['Airline'], topAirlines['CAR']))
+    #######################################################################
+    # Cumulative 1-minute histograms (see histograms.py) of the durations of each
+    # (airport, airline, type) and each (airport, type, day) of the top airports
+    #######################################################################
+    with buildStage('histograms', yyyymm):
+        topAirportIds, topAirlineIds = set(airportIds.values()), set(airlineIds.values())
+        durationHists = Histograms.cumulativeHistsFromIndex(flightIndex,
+                                                            lambda key: (key[0] in topAirportIds) and (key[1] in topAirlineIds))
+        dayDur = flightDur.loc[flightDur['AIRPORT_ID'].isin(topAirportIds), ['AIRPORT_ID', 'Type', 'Date', 'Day', 'DURATION']]
+        dailyHists = Histograms.buildCumulativeHists(dayDur, ['AIRPORT_ID', 'Type', 'Day'], 'DURATION')
+    #######################################################################
+    # Daily statistics cube: the 'mean', 'median' and 'count' of the durations of
+    # each (airport, type, day) of the top airports, joined with the airport info
+    # and the weather at its station.  Indexed by AIRPORT_ID (see groupIndex.py),
+    # so the daily stats of an airport are a slice and a weather parameter a column.
+    # The duration stats alone ('dayStats') are kept to append days to the cube.
+    #######################################################################
+    with buildStage('dailyStats', yyyymm):
+        dayStats = dailyDurationStats(dayDur)
+        del dayDur
+        dailyIndex, weatherParams = dailyCube(dayStats, topAirports, airpWet)
+    #######################################################################
+    # Correlation (and regression slope) of every weather parameter with the
+    # daily mean of every type of duration at every top airport, in one pass
+    # over the daily statistics cube (see correlations.py)
+    #######################################################################
+    with buildStage('correlations', yyyymm):
+        weatherCorr = correlateWeather(dailyIndex, weatherParams)
+
+    return {'flightDur': flightDur,
+            'flightIndex': flightIndex,
+            'durationRange': durationRange,
+            'durationHists': durationHists,
+            'dailyHists': dailyHists,
+            'dayStats': dayStats,
+            'dailyIndex': dailyIndex,
+            'weatherCorr': weatherCorr,
+            'topAirlines': topAirlines,
+            'topAirports': topAirports,
+            'airpWet': airpWet,
+            'airportList': airportList,
+            'airlineList': airlineList,
+            'airportIds': airportIds,
+            'airlineIds': airlineIds,
+            'weatherParams': weatherParams,
+            'memoryReport': memoryReport,
+            'appendBatches': batchFiles,
+            'yyyymm': yyyymm}
+
+def storeFootprint(dataStore):
+    #######################################################################
+    # return the (approximate) number of bytes held by 'dataStore': its frames
+    # and the count arrays of its histograms.  Memory-mapped columns are
+    # counted too, although their pages may be shared with other processes.
+    #######################################################################
+    frames = {}
+    for item in dataStore.values():
+        if isinstance(item, dict) and isinstance(item.get('frame'), Pandas.DataFrame):
+            item = item['frame']     # a group index
+        if isinstance(item, Pandas.DataFrame):
+            frames[id(item)] = item
+    footprint = sum(memoryFootprint(x) for x in frames.values())
+    for hists in (dataStore['durationHists'], dataStore['dailyHists']):
+        footprint += sum(x['cumCounts'].nbytes for x in hists.values())
+    return footprint
+
+#######################################################################
+# Process wide (shared by all sessions) data stores, one per month, least
+# recently used first
+#######################################################################
+_dataStores = Collections.OrderedDict()
+_dataStoreLock = Threading.Lock()
+_monthLocks = {}
+_listeners = []     # called with the month whenever days are appended to a built month
+
+def getDataStore(yyyymm=None):
+    #######################################################################
+    # Return the shared data store of the month 'yyyymm' (by default the
+    # 'defaultMonth'), building it on first use.  The default month is
+    # normally built in 'on_server_loaded' before any session is created;
+    # other months are built when they are first selected, and only one
+    # thread builds a given month while the others wait for it.
+    #######################################################################
+    yyyymm = yyyymm or defaultMonth()
+    with _dataStoreLock:
+        monthLock = _monthLocks.setdefault(yyyymm, Threading.Lock())
+    with monthLock:
+        with _dataStoreLock:
+            if yyyymm in _dataStores:
+                _dataStores.move_to_end(yyyymm)
+                return _dataStores[yyyymm]
+        with PerfMetrics.span('load.month', month=yyyymm):
+            dataStore = buildDataStore(yyyymm)
+        dataStore['memoryReport']['store'] = storeFootprint(dataStore)
+        with _dataStoreLock:
+            _dataStores[yyyymm] = dataStore
+            evictMonths(yyyymm)
+    return dataStore
+
+def evictMonths(keepMonth):
+    #######################################################################
+    # drop the least recently used months (except 'keepMonth') while the
+    # built months take more than 'monthMemoryBudget'.  Sessions still
+    # showing a dropped month keep their reference until they move on.
+    # Called with '_dataStoreLock' held.
+    #######################################################################
+    totalBytes = sum(x['memoryReport']['store'] for x in _dataStores.values())
+    for yyyymm in list(_dataStores):
+        if totalBytes <= monthMemoryBudget:
+            break
+        if yyyymm != keepMonth:
+            totalBytes -= _dataStores.pop(yyyymm)['memoryReport']['store']
+            if (reportMemory):
+                print(f"Dropped the data of {monthLabel(yyyymm)} from memory")
+
+def loadedStores():
+    # return {yyyymm: data store} of the months built in this process (without touching their recency)
+    with _dataStoreLock:
+        return dict(_dataStores)
+
+def replaceDataStore(yyyymm, dataStore):
+    #######################################################################
+    # replace the built data store of the month 'yyyymm' by 'dataStore' (the
+    # same month with days appended, see incremental.py); returns False if the
+    # month has been dropped from memory in the meantime.  Sessions pick up
+    # the new store on their next update.
+    #######################################################################
+    dataStore['memoryReport']['store'] = storeFootprint(dataStore)
+    with _dataStoreLock:
+        if yyyymm not in _dataStores:
+            return False
+        _dataStores[yyyymm] = dataStore
+        evictMonths(yyyymm)
+    return True
+
+def addListener(listener):
+    # call 'listener(yyyymm)' (from any thread) whenever days are appended to a built month
+    with _dataStoreLock:
+        _listeners.append(listener)
+
+def removeListener(listener):
+    with _dataStoreLock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+def notifyListeners(yyyymm):
+    # tell the listeners (e.g. the sessions, see main.py) that the data of the month 'yyyymm' has changed
+    with _dataStoreLock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(yyyymm)
+
+if __name__ == '__main__':
+    #######################################################################
+    # Prepare the caches (columnar copies of the pickles, reference tables and
+    # derived durations) of the given months (default: the default month)
+    # before starting several server processes, so that they all map the same
+    # files instead of each building them:
+    #       python bokeh-app/dataStore.py [yyyymm ...]
+    #######################################################################
+    import sys as Sys
+    for yyyymm in (Sys.argv[1:] or [defaultMonth()]):
+        buildDataStore(yyyymm)
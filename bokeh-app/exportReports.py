@@ -0,0 +1,142 @@
+#######################################################################
+# Static HTML reports of the Flight_onTime bokeh-app
+#
+# Writes the delay and weather dashboards of every airport ('airportList') and
+# airline ('airlineList') of a month as static HTML, without a bokeh server or
+# any widgets: the figures are built with the same builders as the app
+# (plots.py) and filled with the same plot data (plotData.py).  Combinations
+# without flights are skipped.
+#
+# The airports are spread over a pool of processes; with the default (fork)
+# start method the workers share the data store the parent has built (one
+# pool per month).  A worker builds the figures of an airport once and only
+# replaces their data for each airline, as the app does for a session.  The
+# BokehJS files are copied once into '<outDir>/static' and every report refers
+# to them (or to the CDN with '--cdn'), so a report only holds its plot data.
+# '<outDir>/index.html' links all the reports.
+#
+#       python exportReports.py --out reports --month 201801 --procs 8
+#######################################################################
+import argparse as Argparse
+import concurrent.futures as Futures
+import html as Html
+import os as Os
+import shutil as Shutil
+import time as Time
+import bokeh.embed as BokehEmbed
+import bokeh.layouts as BokehLayouts
+import bokeh.models.widgets as BokehWidgets
+import bokeh.resources as BokehResources
+import bokeh.util.paths as BokehPaths
+import dataStore as DataStore
+import plotData as PlotData
+import plots as Plots
+
+reportPage = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{resources}
+</head>
+<body>
+{div}
+{script}
+</body>
+</html>
+'''
+
+def reportFile(airpID, carID):
+    # return the name of the report of an airport and airline (within the month's directory)
+    return f'{airpID}_{carID}.html'
+
+def reportResources(outDir, cdn=False):
+    #######################################################################
+    # return the html tags loading BokehJS in the reports in '<outDir>/<yyyymm>':
+    # from the CDN, or from the files copied (once) to '<outDir>/static'
+    #######################################################################
+    if (cdn):
+        return BokehResources.CDN.render_js() + BokehResources.CDN.render_css()
+    resources = BokehResources.Resources(mode='server', root_url='../')
+    for jsFile in resources.js_files:
+        target = Os.path.join(outDir, jsFile[len('../'):])
+        if not Os.path.exists(target):
+            Os.makedirs(Os.path.dirname(target), exist_ok=True)
+            Shutil.copyfile(Os.path.join(BokehPaths.bokehjsdir(), 'js', Os.path.basename(jsFile)), target)
+    return resources.render_js() + resources.render_css()
+
+def exportAirport(yyyymm, airport, outDir, param, binW, cdn):
+    #######################################################################
+    # write the reports of 'airport' with every airline that has flights there
+    # to '<outDir>/<yyyymm>' and return the [(airline, file name)] written
+    #######################################################################
+    dataStore = DataStore.getDataStore(yyyymm)
+    resources = reportResources(outDir, cdn)
+    airpID = dataStore['airportIds'][airport]
+    airpByDatestats = PlotData.dailyStats(dataStore, airport)
+    worstDay = PlotData.worstDayHists(dataStore, airport, airpByDatestats, binW)
+    pltDelay = Plots.make_plot_delay(dataStore['durationRange'])
+    pltWeather = Plots.make_plot_Weather()
+    Plots.update_plot_daily(pltWeather, airpByDatestats, param)
+    Plots.update_plot_worst_day(pltWeather, worstDay)
+    header = BokehWidgets.Div(width=900)
+    layout = BokehLayouts.column(header, pltDelay['layout'], pltWeather['layout'])
+    written = []
+    for airline in dataStore['airlineList']:
+        carID = dataStore['airlineIds'][airline]
+        if not any((airpID, carID, x) in dataStore['durationHists'] for x in PlotData.durTypes):
+            continue
+        Plots.update_plot_delay(pltDelay, PlotData.delayHists(dataStore, airport, airline, binW), airport, airline)
+        header.text = f'<h2>{Html.escape(airport)} &ndash; {Html.escape(airline)}, {DataStore.monthLabel(yyyymm)}</h2>'
+        script, div = BokehEmbed.components(layout)
+        with open(Os.path.join(outDir, yyyymm, reportFile(airpID, carID)), 'w') as htmlFile:
+            htmlFile.write(reportPage.format(title=Html.escape(f'Flight_onTime: {airport}, {airline}'),
+                                             resources=resources, div=div, script=script))
+        written.append((airline, reportFile(airpID, carID)))
+    return written
+
+def writeIndex(outDir, reports):
+    # write '<outDir>/index.html', linking the 'reports' ({yyyymm: {airport: [(airline, file name)]}})
+    lines = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>Flight_onTime reports</title></head><body>']
+    for yyyymm in sorted(reports):
+        lines.append(f'<h2>{DataStore.monthLabel(yyyymm)}</h2><ul>')
+        for airport in sorted(reports[yyyymm]):
+            links = ', '.join(f'<a href="{yyyymm}/{fileName}">{Html.escape(airline)}</a>'
+                              for airline, fileName in reports[yyyymm][airport])
+            lines.append(f'<li>{Html.escape(airport)}: {links}</li>')
+        lines.append('</ul>')
+    lines.append('</body></html>')
+    with open(Os.path.join(outDir, 'index.html'), 'w') as htmlFile:
+        htmlFile.write('\n'.join(lines))
+
+def exportReports(months, outDir, param='TEMP', binW=5, procs=None, cdn=False):
+    #######################################################################
+    # write the reports of all the airports and airlines of the 'months' with
+    # 'procs' processes (None: one per CPU) and return their number
+    #######################################################################
+    reports = {}
+    reportResources(outDir, cdn)
+    for yyyymm in months:
+        dataStore = DataStore.getDataStore(yyyymm)      # built before the workers of the month start
+        Os.makedirs(Os.path.join(outDir, yyyymm), exist_ok=True)
+        with Futures.ProcessPoolExecutor(max_workers=procs) as pool:
+            futures = {airport: pool.submit(exportAirport, yyyymm, airport, outDir, param, binW, cdn)
+                       for airport in dataStore['airportList']}
+            reports[yyyymm] = {airport: future.result() for airport, future in futures.items()}
+        reports[yyyymm] = {x: y for x, y in reports[yyyymm].items() if y}
+    writeIndex(outDir, reports)
+    return sum(len(x) for month in reports.values() for x in month.values())
+
+if __name__ == '__main__':
+    parser = Argparse.ArgumentParser(description='Write the Flight_onTime dashboards as static HTML')
+    parser.add_argument('--month', nargs='+', default=None, help='months (yyyymm), by default the month the app opens with (yyyymmOfInt of dataStore.py if available, otherwise the latest)')
+    parser.add_argument('--out', default='reports', help='output directory')
+    parser.add_argument('--param', default='TEMP', help='weather parameter of the weather plots')
+    parser.add_argument('--bin-width', type=int, default=5, help='bin width of the histograms (mins)')
+    parser.add_argument('--procs', type=int, default=None, help='number of processes (default: one per CPU)')
+    parser.add_argument('--cdn', action='store_true', help='load BokehJS from the CDN instead of <out>/static')
+    args = parser.parse_args()
+    startTime = Time.time()
+    reportCount = exportReports(args.month or [DataStore.defaultMonth()], args.out, args.param, args.bin_width,
+                                args.procs, args.cdn)
+    print(f'{reportCount} reports written to {args.out} in {Time.time() - startTime:.1f} s')
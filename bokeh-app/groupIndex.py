@@ -0,0 +1,62 @@
+#######################################################################
+# Group index over a sorted frame for the Flight_onTime bokeh-app
+#
+# The frame is sorted once by the key columns (e.g. AIRPORT_ID, CAR, Type) so
+# that every group, and every group of a key prefix (e.g. just AIRPORT_ID, or
+# AIRPORT_ID and CAR), occupies a contiguous block of rows.  The index maps each
+# key tuple to its (start, stop) row offsets, so that the rows or values of any
+# group are an O(1) slice instead of a boolean scan over the whole frame.
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+
+def buildGroupIndex(frame, keys, valueCol):
+    #######################################################################
+    # sort 'frame' by the columns in 'keys' and return the group index:
+    #   'frame'   - the sorted frame (with a fresh RangeIndex)
+    #   'values'  - the sorted 'valueCol' as a NumPy array
+    #   'offsets' - {key tuple: (start, stop)} for every key prefix
+    #######################################################################
+    frame = frame.sort_values(keys, kind='mergesort').reset_index(drop=True)
+    return indexSortedFrame(frame, keys, valueCol)
+
+def indexSortedFrame(frame, keys, valueCol):
+    #######################################################################
+    # return the group index (see buildGroupIndex) of a 'frame' that is already
+    # sorted by 'keys', without copying it (e.g. a memory-mapped frame).
+    # Categorical keys are compared by their codes.
+    #######################################################################
+    keyArrays, keyValues = [], []
+    for key in keys:
+        if isinstance(frame[key].dtype, Pandas.CategoricalDtype):
+            keyArrays.append(frame[key].cat.codes.to_numpy())
+            keyValues.append(Numpy.asarray(frame[key].cat.categories, dtype=object))
+        else:
+            keyArrays.append(frame[key].to_numpy())
+            keyValues.append(None)
+    numRows = len(frame)
+
+    offsets = {}
+    groupStart = Numpy.zeros(numRows, dtype=bool)
+    groupStart[:1] = True
+    for keyLen, keyArray in enumerate(keyArrays, 1):
+        groupStart[1:] |= (keyArray[1:] != keyArray[:-1])
+        starts = Numpy.flatnonzero(groupStart)
+        stops = Numpy.append(starts[1:], numRows)
+        keyTuples = zip(*[(x[starts] if y is None else y[x[starts]]).tolist()
+                          for x, y in zip(keyArrays[:keyLen], keyValues[:keyLen])])
+        offsets.update(zip(keyTuples, zip(starts.tolist(), stops.tolist())))
+
+    return {'keys': keys,
+            'frame': frame,
+            'values': frame[valueCol].to_numpy(),
+            'offsets': offsets}
+
+def groupRows(groupIndex, key):
+    # return the slice of rows of the group 'key' (a tuple, or a prefix of the keys)
+    start, stop = groupIndex['offsets'].get(tuple(key), (0, 0))
+    return slice(start, stop)
+
+def groupValues(groupIndex, key):
+    # return the values of the group 'key' as a NumPy array (a view, not a copy)
+    return groupIndex['values'][groupRows(groupIndex, key)]
@@ -0,0 +1,92 @@
+#######################################################################
+# Precomputed cumulative histograms for the Flight_onTime bokeh-app
+#
+# For every group (e.g. airport, airline and type of duration) the durations,
+# which are whole minutes, are reduced once to a cumulative count array at a
+# resolution of 1 minute:
+#       cumCounts[k] = number of durations < minValue + k
+# A histogram for any (integer) bin width, and any quantile, is then read off
+# this array in O(number of bins) without touching the individual flights.
+#######################################################################
+import numpy as Numpy
+import groupIndex as GroupIndex
+
+def cumulativeHist(values):
+    #######################################################################
+    # given the 'values' (whole minutes) of one group, return the dictionary
+    # {'min', 'max', 'count', 'cumCounts'}
+    #######################################################################
+    values = Numpy.floor(Numpy.asarray(values, dtype=float)).astype(Numpy.int64)
+    if len(values) == 0:
+        return {'min': 0, 'max': 0, 'count': 0, 'cumCounts': Numpy.zeros(1, dtype=Numpy.int32)}
+    minValue, maxValue = values.min(), values.max()
+    counts = Numpy.bincount(values - minValue, minlength=maxValue - minValue + 1)
+    cumCounts = Numpy.concatenate([[0], Numpy.cumsum(counts)]).astype(Numpy.int32)
+    return {'min': int(minValue), 'max': int(maxValue), 'count': len(values), 'cumCounts': cumCounts}
+
+def cumulativeHistsFromIndex(groupIndex, keyFilter=None):
+    #######################################################################
+    # return {key tuple: cumulativeHist} for every (full key) group of the
+    # group index (see groupIndex.py) for which 'keyFilter(key)' is true
+    #######################################################################
+    numKeys = len(groupIndex['keys'])
+    return {key: cumulativeHist(groupIndex['values'][start:stop])
+            for key, (start, stop) in groupIndex['offsets'].items()
+            if (len(key) == numKeys) and ((keyFilter is None) or keyFilter(key))}
+
+def buildCumulativeHists(frame, keys, valueCol):
+    # return {key tuple: cumulativeHist} for every group of 'frame' by 'keys'
+    return cumulativeHistsFromIndex(GroupIndex.buildGroupIndex(frame[keys + [valueCol]], keys, valueCol))
+
+def mergeHists(cumHist, other):
+    # return the cumulative histogram of the values of both groups (as if built from all of them at once)
+    if other['count'] == 0:
+        return cumHist
+    if cumHist['count'] == 0:
+        return other
+    minValue, maxValue = min(cumHist['min'], other['min']), max(cumHist['max'], other['max'])
+    valueCounts = Numpy.zeros(maxValue - minValue + 1, dtype=Numpy.int64)
+    for hist in (cumHist, other):
+        values, histCounts = counts(hist)
+        valueCounts[values - minValue] += histCounts
+    cumCounts = Numpy.concatenate([[0], Numpy.cumsum(valueCounts)]).astype(Numpy.int32)
+    return {'min': minValue, 'max': maxValue, 'count': cumHist['count'] + other['count'], 'cumCounts': cumCounts}
+
+def getHist(cumHists, key):
+    # return the cumulative histogram of group 'key' (an empty one if it has no data)
+    return cumHists.get(tuple(key)) or cumulativeHist([])
+
+def rebin(cumHist, binW):
+    #######################################################################
+    # return (hist, edges) for bins of width 'binW' (whole minutes) starting at the
+    # group minimum.  Identical to
+    #       Numpy.histogram(values, bins=Numpy.arange(minValue, maxValue, binW))
+    # i.e. the last bin is closed and values above the last edge are dropped.
+    #######################################################################
+    edges = Numpy.arange(cumHist['min'], cumHist['max'], binW, dtype=float)
+    if len(edges) < 2:
+        return Numpy.zeros(0, dtype=Numpy.int64), edges
+    cumCounts = cumHist['cumCounts']
+    edgeOffsets = Numpy.arange(len(edges))*int(binW)
+    upper = edgeOffsets[1:].copy()
+    upper[-1] += 1      # last bin includes its right edge
+    hist = cumCounts[upper].astype(Numpy.int64) - cumCounts[edgeOffsets[:-1]]
+    return hist, edges
+
+def counts(cumHist):
+    # return (values, counts) of the group at the 1-minute resolution, from 'min' to 'max'
+    if cumHist['count'] == 0:
+        return Numpy.zeros(0, dtype=Numpy.int64), Numpy.zeros(0, dtype=Numpy.int64)
+    return Numpy.arange(cumHist['min'], cumHist['max'] + 1), Numpy.diff(cumHist['cumCounts'])
+
+def quantile(cumHist, q):
+    #######################################################################
+    # return the 'q' quantile of the group, with the same linear interpolation
+    # as Numpy.quantile / Pandas.Series.quantile
+    #######################################################################
+    if cumHist['count'] == 0:
+        return Numpy.nan
+    rank = (cumHist['count'] - 1)*q
+    lowRank, highRank = int(Numpy.floor(rank)), int(Numpy.ceil(rank))
+    lowValue, highValue = cumHist['min'] + Numpy.searchsorted(cumHist['cumCounts'], [lowRank, highRank], side='right') - 1
+    return lowValue + (highValue - lowValue)*(rank - lowRank)
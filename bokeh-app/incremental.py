@@ -0,0 +1,290 @@
+#######################################################################
+# Incremental append of new days for the Flight_onTime bokeh-app
+#
+# New days of a month (e.g. yesterday's flights and the weather of the days
+# the month does not have yet) are added without running the full pipeline of
+# dataStore.py again.  Run as a script with the new flights, a BTS On-Time csv
+# (which may hold the whole month so far) or a pickle of the same columns:
+#       python incremental.py --month 201801 --flights On_Time_2018_1.csv
+# Only the days the month does not have yet are kept and written as a batch,
+# '<appendDir>/Flights_onTime_<yyyymm>_<timestamp>.pickle.gz'.  The yearly
+# GSOD files of the month's weather stations are fetched again (see
+# weatherFetch.py) and the station days the month does not have yet are
+# written as another batch ('weatherData_...').  The durations of the new
+# flights are merged into the sorted, derived flightDur store (see
+# loadFlightDur in dataStore.py) in one linear pass, so neither a restart nor
+# the running servers have to re-read and re-sort the month.
+#
+# Every server process looks for new batches every 'appendCheckSeconds'
+# ('FLIGHT_ONTIME_APPEND_SECONDS', 0 turns it off, see server_lifecycle.py)
+# and folds them into the months it has built: the 1-minute histograms of the
+# groups and days with new flights are merged (see histograms.py), the daily
+# statistics cube and the weather correlations are redone from the small daily
+# duration stats, the cached plot data of the month is dropped and the
+# sessions showing the month refresh their plots (see main.py).
+#
+# Which airports and airlines are the top ones (their monthly totals are
+# updated), their weather stations and the range of the delay plots stay
+# those of the last full build of the month; they are recomputed (from the
+# merged store) when the server restarts.
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+import argparse as Argparse
+import datetime as Datetime
+import os as Os
+import shutil as Shutil
+import threading as Threading
+import time as Time
+import columnStore as ColumnStore
+import dataStore as DataStore
+import groupIndex as GroupIndex
+import histograms as Histograms
+import ingest as Ingest
+import perfMetrics as PerfMetrics
+import resultCache as ResultCache
+import weatherFetch as WeatherFetch
+
+appendCheckSeconds = int(Os.environ.get('FLIGHT_ONTIME_APPEND_SECONDS', '60'))
+
+_refreshLock = Threading.Lock()
+
+def dataPath(fileName):
+    # return the path of 'fileName' in 'baseDir'
+    return Os.path.join(Os.path.dirname(__file__), DataStore.baseDir + fileName)
+
+def batchName(filePrefix, yyyymm):
+    # return the base name of a new batch of the month 'yyyymm' (see dataStore.appendedFiles)
+    return DataStore.appendDir + filePrefix + yyyymm + '_' + Datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+
+def readFlights(flightFile):
+    #######################################################################
+    # return the flights (the columns of the flight pickles) of a BTS On-Time
+    # csv (see ingest.py) or of a pickle, without those missing a duration
+    #######################################################################
+    flightCols = [DataStore.flightColsFull[x] for x in DataStore.flightColNos]
+    if '.csv' in Os.path.basename(flightFile):
+        chunks = list(Ingest.readFlightChunks(flightFile, DataStore.flightColsFull, DataStore.flightColNos))
+        return Pandas.concat(chunks or [Pandas.DataFrame(columns=flightCols)], ignore_index=True)
+    return Pandas.read_pickle(flightFile)[flightCols].dropna(subset=Ingest.durationCols).reset_index(drop=True)
+
+def mergeSorted(flightDur, newDur):
+    #######################################################################
+    # return the compact durations 'flightDur' (sorted by 'flightKeys') with
+    # the compact durations 'newDur' merged in, in the order a stable sort of
+    # both would give (the new rows after the old ones of the same group).
+    # The categories are unified, the new rows sorted and their positions
+    # found by a binary search on a combined key, so the old rows are only
+    # copied once.
+    #######################################################################
+    columns = {}
+    for colName in flightDur.columns:
+        if isinstance(flightDur[colName].dtype, Pandas.CategoricalDtype):
+            categories = Numpy.union1d(flightDur[colName].cat.categories.astype(str), newDur[colName].cat.categories.astype(str))
+            columns[colName] = [Numpy.searchsorted(categories, x[colName].cat.categories.astype(str))[x[colName].cat.codes]
+                                for x in (flightDur, newDur)] + [categories]
+        else:
+            dtype = Numpy.promote_types(flightDur[colName].dtype, newDur[colName].dtype)
+            columns[colName] = [flightDur[colName].to_numpy().astype(dtype, copy=False),
+                                newDur[colName].to_numpy().astype(dtype, copy=False)]
+    airport, car, durType = [columns[x] for x in DataStore.flightKeys]
+    oldKeys, newKeys = [(x.astype(Numpy.int64) << 32) | (y.astype(Numpy.int64) << 16) | z.astype(Numpy.int64)
+                        for x, y, z in zip(airport[:2], car[:2], durType[:2])]
+    newOrder = Numpy.argsort(newKeys, kind='stable')
+    positions = Numpy.searchsorted(oldKeys, newKeys[newOrder], side='right')
+    merged = {}
+    for colName, (oldValues, newValues, *categories) in columns.items():
+        values = Numpy.insert(oldValues, positions, newValues[newOrder])
+        merged[colName] = Pandas.Categorical.from_codes(values, categories=categories[0]) if categories else values
+    return Pandas.DataFrame(merged, columns=list(flightDur.columns))
+
+def appendFlights(yyyymm, flightData):
+    #######################################################################
+    # write the flights of 'flightData' on days of the month 'yyyymm' that it
+    # does not have yet as a batch, merge their durations into the derived
+    # flightDur store and return the batch name (None if there are no new
+    # days), the new dates and the number of new flights.  The store is
+    # written first and the batch renamed into place after it, so a server
+    # never sees the batch without the store that matches it.
+    #######################################################################
+    flightDur, memoryReport = DataStore.loadFlightDur(yyyymm)     # (re)built first if it is stale
+    flightData = flightData.loc[(flightData['Date'].str[0:4] + flightData['Date'].str[5:7]) == yyyymm]
+    flightData = DataStore.newDays(flightData, set(flightDur['Date'].cat.categories)).reset_index(drop=True)
+    if len(flightData) == 0:
+        return None, [], 0
+    batchFile = batchName(DataStore.flightFilePrefix, yyyymm)
+    tmpDir = dataPath(DataStore.appendDir + '.tmp-' + str(Os.getpid()))
+    tmpFile = Os.path.join(tmpDir, Os.path.basename(batchFile) + '.pickle.gz')   # same base name as the batch
+    Os.makedirs(tmpDir, exist_ok=True)
+    try:
+        flightData.to_pickle(tmpFile, compression='gzip')
+        if (DataStore.useColumnCache) and (not DataStore.rawData):
+            newDur = DataStore.meltFlights(flightData)
+            newBytes = DataStore.memoryFootprint(newDur)
+            newDur = DataStore.compactFlightDur(newDur)
+            flightDur = mergeSorted(flightDur, newDur)
+            memoryReport = {'flightDur': {'rows': len(flightDur),
+                                          'before': memoryReport['flightDur']['before'] + newBytes,
+                                          'after': DataStore.memoryFootprint(flightDur)}}
+            ColumnStore.saveColumns(flightDur, DataStore.derivedStoreDir(yyyymm),
+                                    DataStore.flightSourceFiles(yyyymm) + [tmpFile],
+                                    extra={'version': DataStore.derivedVersion, 'memoryReport': memoryReport})
+        Os.replace(tmpFile, dataPath(batchFile + '.pickle.gz'))
+    finally:
+        Shutil.rmtree(tmpDir, ignore_errors=True)
+    return batchFile, sorted(Pandas.unique(flightData['Date'])), len(flightData)
+
+def monthWeather(yyyymm):
+    # return the weather of the month 'yyyymm' with the batches appended so far
+    return DataStore.appendWeather(DataStore.readPickle(DataStore.weatherFilePrefix + yyyymm),
+                                   [DataStore.readPickle(x) for x in DataStore.appendedFiles(DataStore.weatherFilePrefix, yyyymm)])
+
+def appendWeather(yyyymm, source=None):
+    #######################################################################
+    # fetch the GSOD files of the weather stations of the month 'yyyymm' again
+    # (from 'source', see weatherFetch.py; without one the files already in
+    # 'baseDir' are read), write the station days the month does not have
+    # yet as a batch and return the batch name (None if there are none) and
+    # the number of station days
+    #######################################################################
+    airpWet = monthWeather(yyyymm)
+    stations = airpWet[['STN', 'WBAN']].drop_duplicates()
+    statNames = [WeatherFetch.stationFile(stn, wban, yyyymm[0:4]) for stn, wban in zip(stations['STN'], stations['WBAN'])]
+    stationWet = WeatherFetch.loadStations(statNames, yyyymm, dataPath(''), source, DataStore.weatherFetchThreads,
+                                           DataStore.weatherParseProcs, refresh=True)
+    stationWet = [x for x in stationWet.values() if len(x) > 0]
+    if len(stationWet) == 0:
+        return None, 0
+    newWet = Pandas.concat(stationWet, ignore_index=True)
+    keyCols = ['STN', 'WBAN', 'Date']
+    newWet = newWet.loc[~Pandas.MultiIndex.from_frame(newWet[keyCols]).isin(Pandas.MultiIndex.from_frame(airpWet[keyCols]))]
+    if len(newWet) == 0:
+        return None, 0
+    batchFile = batchName(DataStore.weatherFilePrefix, yyyymm)
+    tmpFile = dataPath(batchFile + '.pickle.gz.tmp-' + str(Os.getpid()))
+    newWet.reset_index(drop=True).to_pickle(tmpFile, compression='gzip')
+    Os.replace(tmpFile, dataPath(batchFile + '.pickle.gz'))
+    return batchFile, len(newWet)
+
+def appendDays(yyyymm, flightFile=None, weather=True, source=None):
+    #######################################################################
+    # append the new days of the flights in 'flightFile' and (with 'weather')
+    # the new station days of weather to the month 'yyyymm'; return a summary
+    # {'batches', 'dates', 'flights', 'weatherDays'}
+    #######################################################################
+    Os.makedirs(dataPath(DataStore.appendDir), exist_ok=True)
+    summary = {'batches': [], 'dates': [], 'flights': 0, 'weatherDays': 0}
+    if flightFile is not None:
+        batchFile, summary['dates'], summary['flights'] = appendFlights(yyyymm, readFlights(flightFile))
+        summary['batches'] += [batchFile] if batchFile else []
+    if weather:
+        batchFile, summary['weatherDays'] = appendWeather(yyyymm, source)
+        summary['batches'] += [batchFile] if batchFile else []
+    return summary
+
+def addCounts(frame, keys, totalCol, newDur):
+    # return a copy of 'frame' with the durations 'newDur' of its groups ('keys') added to their count 'totalCol'
+    newCounts = newDur.groupby(keys, observed=True).size().rename('newCount').reset_index()
+    newCounts = newCounts.astype({x: frame[x].dtype for x in keys})
+    frame = frame.merge(newCounts, on=keys, how='left')
+    frame[totalCol] = frame[totalCol] + frame['newCount'].fillna(0).astype(frame[totalCol].dtype)
+    return frame.drop(columns='newCount')
+
+def appendToStore(dataStore, batchFiles):
+    #######################################################################
+    # return a copy of the built 'dataStore' with the appended 'batchFiles'
+    # (flight and weather batches, see dataStore.appendedFiles) folded into
+    # its aggregates.  The frames and dictionaries of 'dataStore' itself are
+    # left untouched, as sessions may still be reading them.
+    #######################################################################
+    yyyymm = dataStore['yyyymm']
+    flightBatches = [x for x in batchFiles if Os.path.basename(x).startswith(DataStore.flightFilePrefix)]
+    weatherBatches = [x for x in batchFiles if Os.path.basename(x).startswith(DataStore.weatherFilePrefix)]
+    appended = dict(dataStore)
+    #######################################################################
+    # Durations of the new days of the top airports (days the store already
+    # has, e.g. of a batch that arrived while it was built, are skipped)
+    #######################################################################
+    knownDates, newFlights = set(dataStore['flightDur']['Date'].cat.categories), []
+    for batchFile in flightBatches:
+        newFlights.append(DataStore.newDays(DataStore.readPickle(batchFile), knownDates))
+        knownDates.update(newFlights[-1]['Date'])
+    if sum(len(x) for x in newFlights) > 0:
+        topAirportIds, topAirlineIds = set(dataStore['airportIds'].values()), set(dataStore['airlineIds'].values())
+        newDur = DataStore.compactFlightDur(DataStore.meltFlights(Pandas.concat(newFlights, ignore_index=True)))
+        dayDur = newDur.loc[newDur['AIRPORT_ID'].isin(topAirportIds)]
+        #######################################################################
+        # Merge the 1-minute histograms of the groups and days with new flights
+        #######################################################################
+        appended['durationHists'], appended['dailyHists'] = dict(dataStore['durationHists']), dict(dataStore['dailyHists'])
+        for hists, frame, keys in [(appended['durationHists'], dayDur.loc[dayDur['CAR'].isin(topAirlineIds)], DataStore.flightKeys),
+                                   (appended['dailyHists'], dayDur, ['AIRPORT_ID', 'Type', 'Day'])]:
+            for key, cumHist in Histograms.buildCumulativeHists(frame, keys, 'DURATION').items():
+                hists[key] = Histograms.mergeHists(Histograms.getHist(hists, key), cumHist)
+        dayStats = Pandas.concat([dataStore['dayStats'], DataStore.dailyDurationStats(dayDur)], ignore_index=True)
+        appended['dayStats'] = dayStats.sort_values(['Date', 'Type', 'AIRPORT_ID'], kind='mergesort').reset_index(drop=True)
+        appended['topAirports'] = addCounts(dataStore['topAirports'], ['AIRPORT_ID', 'Type'], 'AirpMonthTotal', newDur)
+        appended['topAirlines'] = addCounts(dataStore['topAirlines'], ['CAR', 'Type'], 'AirlMonthTotal', newDur)
+        #######################################################################
+        # The durations of all the flights, from the derived store the new
+        # flights were merged into (see appendFlights)
+        #######################################################################
+        appended['flightDur'], appended['memoryReport'] = DataStore.loadFlightDur(yyyymm)
+        appended['flightIndex'] = GroupIndex.indexSortedFrame(appended['flightDur'], DataStore.flightKeys, 'DURATION')
+    #######################################################################
+    # The daily statistics cube and the correlations, with the new weather
+    #######################################################################
+    appended['airpWet'] = DataStore.appendWeather(dataStore['airpWet'], [DataStore.readPickle(x) for x in weatherBatches])
+    appended['dailyIndex'], appended['weatherParams'] = DataStore.dailyCube(appended['dayStats'], appended['topAirports'],
+                                                                            appended['airpWet'])
+    appended['weatherCorr'] = DataStore.correlateWeather(appended['dailyIndex'], appended['weatherParams'])
+    appended['memoryReport'] = dict(appended['memoryReport'])
+    appended['appendBatches'] = dataStore['appendBatches'] + list(batchFiles)
+    return appended
+
+def refreshMonths():
+    #######################################################################
+    # fold the batches appended since into every month built in this process
+    # (see appendToStore), drop the cached plot data of those months and
+    # notify the sessions; return the months refreshed.  Runs in the worker
+    # pool (see server_lifecycle.py), one call at a time.
+    #######################################################################
+    if not _refreshLock.acquire(blocking=False):
+        return []
+    try:
+        refreshed = []
+        for yyyymm, dataStore in DataStore.loadedStores().items():
+            batchFiles = [x for x in DataStore.appendedFiles(DataStore.flightFilePrefix, yyyymm) +
+                                     DataStore.appendedFiles(DataStore.weatherFilePrefix, yyyymm)
+                          if x not in dataStore['appendBatches']]
+            if len(batchFiles) == 0:
+                continue
+            try:
+                with PerfMetrics.span('load.append', month=yyyymm):
+                    appended = appendToStore(dataStore, batchFiles)
+            except Exception as e:
+                print(f'Appending to {DataStore.monthLabel(yyyymm)} failed ({type(e).__name__}: {e})')
+                continue
+            if DataStore.replaceDataStore(yyyymm, appended):
+                ResultCache.dropMonth(yyyymm)
+                DataStore.notifyListeners(yyyymm)
+                refreshed.append(yyyymm)
+                print(f'{DataStore.monthLabel(yyyymm)}: {len(batchFiles)} appended batch(es) loaded')
+        return refreshed
+    finally:
+        _refreshLock.release()
+
+if __name__ == '__main__':
+    parser = Argparse.ArgumentParser(description='Append new days of flights and weather to a month of Flight_onTime')
+    parser.add_argument('--month', default=None, help='month (yyyymm), by default the latest one')
+    parser.add_argument('--flights', default=None, help='BTS On-Time csv (or pickle) with the new days of flights')
+    parser.add_argument('--no-weather', action='store_true', help='do not fetch the weather of the new days')
+    parser.add_argument('--weather-source', default=DataStore.weatherSource,
+                        help='FTP URL or directory of the GSOD files (default: the files in the data directory)')
+    args = parser.parse_args()
+    startTime = Time.time()
+    yyyymm = args.month or DataStore.defaultMonth()
+    summary = appendDays(yyyymm, args.flights, not args.no_weather, args.weather_source)
+    print(f"{DataStore.monthLabel(yyyymm)}: {summary['flights']} flights on {len(summary['dates'])} new days "
+          f"({', '.join(summary['dates']) or 'none'}), {summary['weatherDays']} new station days of weather, "
+          f"in {Time.time() - startTime:.1f} s")
@@ -0,0 +1,82 @@
+#######################################################################
+# Streaming ingest of the raw BTS On-Time CSV files for the Flight_onTime bokeh-app
+#
+# A monthly On-Time file is read in chunks of 'ingestChunkRows' rows, with only
+# the columns the app uses ('flightColNos' in dataStore.py) and explicit dtypes.
+# Flights without all four durations are dropped chunk by chunk and every chunk
+# is appended to the columnar store (see columnStore.py), so the peak memory is
+# bounded by the chunk size and not by the size of the file.
+#
+# Run as a script to ingest any number of monthly files (e.g. a full year) in
+# one go:
+#       python ingest.py data/Flights_onTime_2018??.csv
+# Each file is written to its own store under 'cacheDir' and to the gzipped
+# pickle that the app reads (with the same base name, in 'baseDir').
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+import os as Os
+import sys as Sys
+import time as Time
+import columnStore as ColumnStore
+
+ingestChunkRows = 250000
+durationCols = ['DEP_DEL', 'DEP_TAXI', 'ARR_TAXI', 'ARR_DEL']
+flightDtypes = {'Date': str, 'CAR': str,
+                'ORIGIN_ID': Numpy.int32, 'DEST_ID': Numpy.int32,
+                'DEP_DEL': Numpy.float32, 'DEP_TAXI': Numpy.float32,
+                'ARR_TAXI': Numpy.float32, 'ARR_DEL': Numpy.float32}
+
+def csvBaseName(csvFile):
+    # return the base name of 'csvFile' without the '.csv' (and any compression) extension
+    baseName = Os.path.basename(csvFile)
+    return baseName[:baseName.index('.csv')] if '.csv' in baseName else Os.path.splitext(baseName)[0]
+
+def readFlightChunks(csvFile, colNames, colNos, chunkRows=ingestChunkRows):
+    #######################################################################
+    # generator over the chunks of the On-Time file 'csvFile' whose columns
+    # are named 'colNames' (the trailing empty column of the BTS files is
+    # ignored).  Only the columns 'colNos' are parsed, and the rows without
+    # all of the 'durationCols' are dropped.
+    #######################################################################
+    useCols = [colNames[x] for x in colNos]
+    reader = Pandas.read_csv(csvFile, header=0, names=colNames, usecols=useCols, index_col=False,
+                             dtype={x: flightDtypes[x] for x in useCols if x in flightDtypes},
+                             chunksize=chunkRows)
+    for chunk in reader:
+        chunk = chunk.dropna(subset=[x for x in durationCols if x in useCols])
+        yield chunk[useCols]
+
+def ingestFlights(csvFile, storeDir, colNames, colNos, chunkRows=ingestChunkRows):
+    #######################################################################
+    # stream 'csvFile' into the columnar store 'storeDir' and return the
+    # number of flights kept
+    #######################################################################
+    writer = ColumnStore.openColumns(storeDir)
+    for chunk in readFlightChunks(csvFile, colNames, colNos, chunkRows):
+        ColumnStore.appendColumns(writer, chunk)
+    ColumnStore.closeColumns(writer, [csvFile], extra={'csvFile': Os.path.basename(csvFile)})
+    return writer['rows']
+
+def ingestFlightFile(csvFile, storeDir, pickleFile, colNames, colNos, chunkRows=ingestChunkRows):
+    #######################################################################
+    # ingest 'csvFile' into 'storeDir', write the gzipped 'pickleFile' from
+    # the store (only the compact columns are ever in memory) and return the
+    # (memory-mapped) frame of flights
+    #######################################################################
+    ingestFlights(csvFile, storeDir, colNames, colNos, chunkRows)
+    flightData = ColumnStore.loadColumns(storeDir)
+    flightData.to_pickle(pickleFile, compression='gzip')
+    return flightData
+
+if __name__ == '__main__':
+    import dataStore as DataStore
+    appDir = Os.path.dirname(Os.path.abspath(__file__))
+    for csvFile in Sys.argv[1:]:
+        startTime = Time.time()
+        baseName = csvBaseName(csvFile)
+        flightData = ingestFlightFile(csvFile,
+                                      Os.path.join(appDir, DataStore.cacheDir + baseName),
+                                      Os.path.join(appDir, DataStore.baseDir + baseName + '.pickle.gz'),
+                                      DataStore.flightColsFull, DataStore.flightColNos)
+        print(f'{csvFile}: {len(flightData)} flights in {Time.time() - startTime:.1f} s')
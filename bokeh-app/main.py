@@ -38,552 +38,241 @@ import bokeh.layouts as BokehLayouts
 import bokeh.models.widgets as BokehWidgets
 import bokeh.core.properties as BokehCoreProps
 import pandas as Pandas
-import math as Math
-import os as Os
+import time as Time
 for name in dir():
     if not name.startswith('_'):
         del name
 Pandas.set_option('display.expand_frame_repr', False)
 #######################################################################
-# User Input
-#   file names and locations
-#   rawData = 'True'
-#       - Read raw files (including pulling the weather files from FTP site)
-#       - Compile the relevant data and save as a pickle file
-#   rawData = 'False'
-#       - Read the pre-generated pickle file to load data.
-#       - This reduces the data stored on disk and the number of I/O to disk, 
-#               thus speeding up web response
+# Shared data
+#   All of the data loading and preparation is done once per server process
+#   in dataStore.py (triggered from 'on_server_loaded' in server_lifecycle.py).
+#   Every session only references the shared, read-only frames of the month
+#   it shows; other months are loaded when they are first selected.
+#######################################################################
+import dataStore as DataStore
+import plotData as PlotData
+import plots as Plots
+import resultCache as ResultCache
+import perfMetrics as PerfMetrics
+monthList = [(x, DataStore.monthLabel(x)) for x in DataStore.availableMonths()]
+dataStore = DataStore.getDataStore()
+airportList = dataStore['airportList']
+airlineList = dataStore['airlineList']
+weatherParams = dataStore['weatherParams']
 #######################################################################
-baseDir = 'data/'
-rawData = False
-yyyymmOfInt = '201801'
-airportInfoFile = 'Airport_locations.csv'
-airlinesFile = 'Carriers.csv'
-weatherStatLocFile = 'isd-history.txt'
-flightFile = 'Flights_onTime_' + yyyymmOfInt
-weatherFile = 'weatherData_' + yyyymmOfInt
-yearOfInt = yyyymmOfInt[0:4]
-#TOOLS = "crosshair,hover,save,pan,wheel_zoom,box_zoom,reset,box_select,lasso_select"
-TOOLS = "hover,pan,zoom_in,zoom_out,box_zoom,reset,save"
-flightColsFull = ['Date', 'CAR', 'TAIL', 'FLNum', 'ORIGIN_ID', 'ORIGIN', 'DEST_ID', 'DEST', 
-              'DEP_SCH', 'DEP_ACT', 'DEP_DEL', 'DEP_TAXI', 'DEP_OFF',
-              'ARR_ON', 'ARR_TAXI', 'ARR_SCH', 'ARR_ACT', 'ARR_DEL',
-              'CANCEL', 'CANCEL_CODE', 'DIV', 'FLY_SCH', 'FLY_ACT', 'FLY_AIR', 'FLY_DIST',
-              'DEL_CAR', 'DEL_WET', 'DEL_NAS', 'DEL_SEC', 'DEL_AIR']
-flightColNos = [0, 1, 4, 6, 10, 11, 14, 17]
-flightCols = ['Date', 'CAR', 'AIRPORT_ID', 'DURATION']
-airportInfoColNos = [0,3,4,18,23]
-airportInfoCols = ['AIRPORT_ID', 'Airport', 'City', 'LAT', 'LON']
-#######################################################################
-# User defined functions
-#######################################################################
-def distance(loc1, loc2):
-    # Uses the Haversine formula to compute and return the distance (in km) between 
-    #   'loc1' = [lat1, lon1] and 'loc2' = [lat2, lon2]
-    p = (Math.pi/180)  #Pi/180
-    a = 0.5 - Math.cos((loc2[0]-loc1[0])*p)/2 + Math.cos(loc1[0]*p)*Math.cos(loc2[0]*p) * (1-Math.cos((loc2[1]-loc1[1])*p)) / 2
-    return 12742 * Math.asin(Math.sqrt(a)) # 2 * R; R = 6371 km
-
-def is_float(x):
-    try:
-        float(x)
-        return True
-    except:
-        return False
-    
-def nearest_Station(loc):
-	#######################################################################
-    # given the data frame 'weatherStations' that contains 'STN' 'WBAN', and 'LOC' = [LAT, LON]
-    # find the weather station that is closest to 'loc' = [LAT, LON]
-    # and return the a list of 'STN', 'WBAN', and 'distance to the closest station'
-	#######################################################################
-    
-    #weatherStations = weatherStatData
-    #loc = (39.86166667, -104.67305556)
-    
-    localWeatherStat = weatherStatData.copy()
-    localWeatherStat['dist'] = localWeatherStat['LOC'].apply(lambda x: distance([float(x[0]), float(x[1])], [loc[0], loc[1]]))
-    localWeatherStat = localWeatherStat.sort_values(['dist'], ascending=['False']).iloc[0,]
-    
-    return [localWeatherStat['STN'], 
-            format(localWeatherStat['WBAN'],'05d'), 
-            round(localWeatherStat['dist'],0)]
-    
-def weatherData(statName):
-    #######################################################################
-    # given the stationName ('STAT_WBAN_YYYY.op.gz') and 'weatherServer' info,
-    # retrieve it from the FTP site or load the data locally, read and clean 
-    # the data and return a dataframe of weather data.
-    #######################################################################
-    weatherServer = 'ftp.ncdc.noaa.gov' 
-    weatherPath = 'pub/data/gsod/'
-    weatherUser = 'anonymous'
-    toDownload = False
-    
-    if (toDownload):      
-        try:
-            ftp_obj = Ftplib.FTP()
-            ftp_obj.connect(host=weatherServer,port=21)
-            ftp_obj.login(user='anonymous')
-            ftp_obj.cwd(weatherPath + '/' + yearOfInt + '/')
-            ftp_obj.retrbinary('RETR %s'%statName, open(Os.path.join(Os.path.dirname(__file__), baseDir + statName), 'wb').write)
-        except:
-            print("Download Issue:")
-        finally:
-            print("Download Complete:")
-    Os.system('gunzip -f ' + Os.path.join(Os.path.dirname(__file__), baseDir + statName))
-        
-    airpWet = Pandas.DataFrame()    # To ensure it returns an empty Dataframe if no data exists.
-    airpWet = Pandas.read_fwf(Os.path.join(baseDir + statName.split('.')[0]) + '.op',
-                            names = ['STN', 'WBAN', 'YEARMODA', 'TEMP', 'TEMP_Count', 
-                                     'DEWP', 'DEWP_Count', 'SLPress', 'SLP_Count', 'STPress', 'STP_Count', 
-                                     'VISIB', 'VISIB_Count', 'WindSpd', 'WDSP_Count', 'MaxWindSpd', 'GUST',
-                                     'MAXTemp', 'MAX_Flag', 'MINTemp', 'MIN_Flag', 'PRCP', 'PRCP_Flag', 
-                                     'SnowDep', 'FRSHTT'], 
-                                     header = None,
-                                     colspecs = [(0,6), (7,12), (14,22), (24,30), (31,33), (35,41),
-                                                 (42,44), (46,52), (53,55), (57,63), (64,66), (68,73),
-                                                 (74,76), (78,83), (84,86), (88,93), (95,100), (102,108),
-                                                 (108, 109), (110,116), (116,117), (118,123), (123,124), 
-                                                 (125,130), (132,138)],
-                                                 delim_whitespace=True, skiprows=1)
-    Os.system('gzip -f ' + Os.path.join(Os.path.dirname(__file__), baseDir + statName.split(".")[0] + "." + statName.split(".")[1]))
-    airpWet.drop(['TEMP_Count', 'DEWP_Count', 'SLP_Count', 'STP_Count', 'VISIB_Count', 
-                  'WDSP_Count', 'MAX_Flag', 'MIN_Flag', 'PRCP_Flag'], axis=1, inplace=True)
-    airpWet = airpWet.loc[airpWet['YEARMODA'].apply(lambda x: yyyymmOfInt in str(x))]
-    #
-    # Fill up the unmeasured values with 'unexpected' values and break up the FRSHTT column
-    #
-    airpWet.replace({'TEMP':  {9999.9: -50}}, inplace=True)
-    airpWet.replace({'DEWP':  {9999.9: -50}}, inplace=True)
-    airpWet.replace({'MAXTemp':   {9999.9: -50}}, inplace=True)
-    airpWet.replace({'MINTemp':   {9999.9: -50}}, inplace=True)
-    airpWet.replace({'SLPress':   {9999.9: 0}}, inplace=True)
-    airpWet.replace({'STPress':   {9999.9: 0}}, inplace=True)
-    airpWet.replace({'VISIB': {999.9:  -1}}, inplace=True)
-    airpWet.replace({'MaxWindSpd': {999.9:  -1}}, inplace=True)
-    airpWet.replace({'WindSpd':  {999.9:  -1}}, inplace=True)
-    airpWet.replace({'GUST':  {999.9:  -1}}, inplace=True)
-    airpWet.replace({'PRCP':  {99.99:  0}}, inplace=True)
-    airpWet.replace({'SnowDep':  {999.9:  0}}, inplace=True)
-    airpWet['Fog'] = airpWet['FRSHTT'].apply(lambda x: int(format(x, '06d')[0]))
-    airpWet['Rain'] = airpWet['FRSHTT'].apply(lambda x: int(format(x, '06d')[1]))
-    airpWet['Snow'] = airpWet['FRSHTT'].apply(lambda x: int(format(x, '06d')[2]))
-    airpWet['Hail'] = airpWet['FRSHTT'].apply(lambda x: int(format(x, '06d')[3]))
-    airpWet['Thunder'] = airpWet['FRSHTT'].apply(lambda x: int(format(x, '06d')[4]))
-    airpWet['Tornado'] = airpWet['FRSHTT'].apply(lambda x: int(format(x, '06d')[5]))
-    airpWet.drop(['FRSHTT'], axis=1, inplace=True)
-    airpWet = airpWet.rename(columns={'YEARMODA': 'Date'})
-    airpWet['STN'] = airpWet['STN'].apply(lambda x: format(x, '06d'))
-    airpWet['WBAN'] = airpWet['WBAN'].apply(lambda x: format(x, '05d'))
-    #
-    airpWet['Date'] = airpWet['Date'].apply(lambda x: str(x)[0:4] + '-' + str(x)[4:6] + '-' + str(x)[6:8])
-    #
-    return airpWet
-#######################################################################
-# Read in the flight data (condensed version from pickle file OR from the original csv file)
-#######################################################################
-if (rawData):
-    flightDataFull = Pandas.read_csv(Os.path.join(flightFile + '.csv'), index_col=False)
-    flightDataFull.drop([list(flightDataFull)[len(list(flightDataFull))-1]], axis=1, inplace=True)
-#
-    flightData = flightDataFull.copy()
-    flightData.columns = flightColsFull
-    flightData = flightData.dropna(subset=['DEP_DEL', 'ARR_DEL', 'DEP_TAXI', 'ARR_TAXI'])
-    flightData = flightData.iloc[:, flightColNos].copy()
-    flightData.to_pickle(Os.path.join(Os.path.dirname(__file__), baseDir + flightFile + '.pickle'))
-    del flightDataFull
-else:
-    Os.system('gunzip -f ' + Os.path.join(Os.path.dirname(__file__), baseDir + flightFile + '.pickle.gz'))
-    flightData = Pandas.read_pickle(Os.path.join(Os.path.dirname(__file__), baseDir + flightFile + '.pickle'))
-Os.system('gzip -f ' + Os.path.join(Os.path.dirname(__file__), baseDir + flightFile + '.pickle'))
-#######################################################################
-# Combine arrival and departure delays and arrival and departure taxi times
-#######################################################################
-flightDepDel = flightData[['Date', 'CAR', 'ORIGIN_ID', 'DEP_DEL']].copy()
-flightArrDel = flightData[['Date', 'CAR', 'DEST_ID', 'ARR_DEL']].copy()
-flightDepTaxi = flightData[['Date', 'CAR', 'ORIGIN_ID', 'DEP_TAXI']].copy()
-flightArrTaxi = flightData[['Date', 'CAR', 'DEST_ID', 'ARR_TAXI']].copy()
-flightDepDel.columns = flightArrDel.columns = flightDepTaxi.columns = flightArrTaxi.columns = flightCols
-flightDepDel['Type'] = 'DEP_DEL'
-flightArrDel['Type'] = 'ARR_DEL'
-flightDepTaxi['Type'] = 'DEP_TAXI'
-flightArrTaxi['Type'] = 'ARR_TAXI'
-flightDur = Pandas.concat([flightDepDel, flightArrDel, flightDepTaxi, flightArrTaxi])
-del flightData, flightDepDel, flightArrDel, flightDepTaxi, flightArrTaxi
-#######################################################################
-# Only select those airlines that have a large number of flights (at least 2 per hour on average)
-# Merge this info with airline names
-#######################################################################
-topAirlines = flightDur.groupby(['CAR', 'Type'])['DURATION'].agg(['count']).reset_index().rename(columns={'count':'AirlMonthTotal'})
-topAirlines = topAirlines.loc[topAirlines['AirlMonthTotal'] > 24*2*flightDur['Date'].nunique()]
-#
-airlineData = Pandas.read_csv(Os.path.join(Os.path.dirname(__file__), baseDir + airlinesFile), index_col=False)
-airlineData.columns = ['CAR', 'Airline']
-topAirlines = topAirlines.merge(airlineData, on=['CAR'], how='inner')
-del airlineData
-#######################################################################
-# Only select those airports that have a large number of flights (at least 2 per hour on average)
-# Merge this with airport info 
-#######################################################################
-topAirports = flightDur.groupby(['AIRPORT_ID', 'Type'])['DURATION'].agg(['count']).reset_index().rename(columns={'count':'AirpMonthTotal'})
-topAirports = topAirports.loc[topAirports['AirpMonthTotal'] > 24*2*flightDur['Date'].nunique()]
-#
-airportData = Pandas.read_csv(Os.path.join(Os.path.dirname(__file__), baseDir + airportInfoFile), index_col=False)
-airportData = airportData.iloc[:,airportInfoColNos].copy()
-airportData.columns = airportInfoCols
-airportData = airportData.dropna(subset=['LAT', 'LON'])
-airportData['City'] = airportData['City'] + ' - ' + airportData['Airport'].apply(lambda x: ''.join([y[0] for y in x.split()]))
-topAirports = topAirports.merge(airportData, on=['AIRPORT_ID'], how='inner')
-del airportData
-#######################################################################
-# Extract the location of the weather stations that are active during the time period
-# of the flight delays.  Make sure to include only those data that have valid LAT and LON
-#######################################################################
-weatherStatData = Pandas.read_fwf(Os.path.join(Os.path.dirname(__file__), baseDir + weatherStatLocFile), 
-                                  names = ['STN', 'WBAN', 'STN_Name', 'CTRY', 'ST', 'CALL', 
-                                           'LAT', 'LON', 'ELEV_M', 'BEGIN', 'END'],
-                                           header = None,
-                                           colspecs = [(0,6), (7,12), (13,42), (43,47), (48,50), (51,56), 
-                                                       (57,64), (65,73), (74,81), (82,90), (91,99)], 
-                                           delim_whitespace=True, skiprows=22)
-weatherStatData = weatherStatData.loc[(weatherStatData['BEGIN'] < int(yyyymmOfInt + '01')) & 
-                                      (weatherStatData['END'] > int(yyyymmOfInt + '31'))]
-weatherStatData = weatherStatData.dropna(subset=['LAT', 'LON'])
-weatherStatData = weatherStatData.loc[(weatherStatData['LAT'].apply(lambda x: is_float(x))) &
-                                      (weatherStatData['LON'].apply(lambda x: is_float(x)))]
-weatherStatData['LOC'] = list(zip(weatherStatData['LAT'], weatherStatData['LON']))
-weatherStatData.drop(['CTRY', 'ST', 'CALL', 'BEGIN', 'END', 'LAT', 'LON'], axis=1, inplace=True)
-#######################################################################
-# For each of the airports in 'topAirports', find the nearest weather station 
-#######################################################################
-airpWet = topAirports.loc[topAirports['Type']=='DEP_DEL', ['AIRPORT_ID', 'LAT', 'LON']]
-airpWet['LOC'] = list(zip(airpWet['LAT'], airpWet['LON']))
-airpWet['LOC'] = airpWet['LOC'].apply(lambda x: nearest_Station(x))
-airpWet['dist2WetStat'] = airpWet['LOC'].apply(lambda x: x[2])
-airpWet['STN'] = airpWet['LOC'].apply(lambda x: x[0])
-airpWet['WBAN'] = airpWet['LOC'].apply(lambda x: x[1])
-if (rawData):
-    airpWet['statName'] = airpWet['LOC'].apply(lambda x: x[0] + '-' + x[1] + '-' + yearOfInt + '.op.gz')
-airpWet.drop(['LAT', 'LON', 'LOC'], axis=1, inplace=True)    
-topAirports = topAirports.merge(airpWet, on=['AIRPORT_ID'], how='inner')
-del weatherStatData, airpWet
-#######################################################################
-# find list of airports and airlines
-#######################################################################
-airportList = list(topAirports.sort_values(['City'], ascending=['True'])['City'].unique())
-airlineList = list(topAirlines.sort_values(['Airline'], ascending=['True'])['Airline'].unique())
-#######################################################################
-# These will be the base data for rest of the analysis
 # Select a airport and airline (interactively)
-# Extract the flightDelays and taxiTimes just for this airport
 #######################################################################
 airport = [x for x in airportList if 'Denver' in x][0]
 airline = [x for x in airlineList if 'United' in x][0]
 #######################################################################
-# Load the weather data
+# Build the figures once; the widget callbacks below only update their data
 #######################################################################
-if (rawData):
-    airpWet = Pandas.DataFrame()
-    for statName in list(topAirports.statName.unique()):
-        airpWet = Pandas.concat([airpWet, weatherData(statName)])
-    airpWet.to_pickle(Os.path.join(Os.path.dirname(__file__), baseDir + weatherFile + '.pickle'))
-else:
-    Os.system('gunzip ' + Os.path.join(Os.path.dirname(__file__), baseDir + weatherFile + '.pickle.gz'))
-    airpWet = Pandas.read_pickle(Os.path.join(Os.path.dirname(__file__), baseDir + weatherFile + '.pickle'))
-Os.system('gzip -f ' + Os.path.join(Os.path.dirname(__file__), baseDir + weatherFile + '.pickle'))
-weatherParams = sorted(list(airpWet.columns)[3:len(list(airpWet.columns))])
-#######################################################################
-# Styling for a plot
-#######################################################################
-def style(p):
-    # Title 
-    p.title.align = 'center'
-    p.title.text_font_size = '14pt'
-    p.title.text_font = 'Helvetica'
-
-    # Axis titles
-    p.xaxis.axis_label_text_font_size = '14pt'
-    p.xaxis.axis_label_text_font_style = 'bold'
-    p.yaxis.axis_label_text_font_size = '14pt'
-    p.yaxis.axis_label_text_font_style = 'bold'
-
-    # Tick labels
-    p.xaxis.major_label_text_font_size = '12pt'
-    p.yaxis.major_label_text_font_size = '12pt'
+monthInp = BokehWidgets.Select(title="Select Month", value=dataStore['yyyymm'], options=monthList)
+airpInp = BokehWidgets.Select(title="Select Airport city", value=airport, options=airportList)
+airlInp = BokehWidgets.Select(title="Select Airline", value=airline, options=airlineList)
+wetInp = BokehWidgets.Select(title='Select Weather Param', value='TEMP', options=weatherParams)
+binWid = BokehWidgets.Slider(title="Select Bin Width (mins)", value=5, start=1, end=30, step=1)
+clientRebin = BokehWidgets.Toggle(label='Re-bin delay histograms in browser', active=False)
+corrInp = BokehWidgets.Select(title='Correlate the weather with', value='DEP_DEL',
+                              options=[(x, Plots.durTypeLabels[x]) for x in PlotData.durTypes])
 
-    return p
+with PerfMetrics.span('session.figures'):
+    plt_month = Plots.make_plot_delay(dataStore['durationRange'])
+    plt_Weather = Plots.make_plot_Weather()
+    plt_corr = Plots.make_plot_corr(weatherParams)
+    Plots.link_client_rebin(plt_month, binWid, clientRebin)
+#table_CatMM = make_table(allData)
 
 #######################################################################
-# Interactive plot of Expenses vs Year, all categories stacked up OR for a specific Category.
+# Plot updates
+#   The plot data is computed in the shared worker pool (PlotData.executor) so
+#   that the IOLoop is never blocked, and the results are applied to the
+#   document on the next tick.  While a computation is in flight any further
+#   widget changes are coalesced: only the latest selection is rendered and the
+#   results of superseded requests are dropped.
 #######################################################################
-def make_plot_delay():
+doc = BokehIO.curdoc()
+busyDiv = BokehWidgets.Div(text='')
 
-    # For debug only
-    #BokehIO.output_file("tmp.html")
-    #flight = flightDur
-    #airline = 'United Air Lines Inc.' 
-    #airport = 'Denver, CO'
-    #binW = 5
-    
-    
-    airline = airlInp.value
-    airport = airpInp.value
-    binW = binWid.value
+session = {'airpByDatestats': None,   # daily stats of the selected airport
+           'applying': False,         # widgets are being set from a month change
+           'generation': 0,           # number of the latest update request
+           'updates': set(),          # updates requested but not yet applied
+           'future': None,            # computation of the latest request
+           'patchEvents': None}       # document changes of the update being applied (for its patch size)
 
-    minAll, maxAll = flightDur['DURATION'].quantile(0.02), flightDur['DURATION'].quantile(0.98)
-    airpID = topAirports.loc[topAirports['City']==airport, 'AIRPORT_ID'].unique()[0]
-    carID = topAirlines.loc[topAirlines['Airline']==airline, 'CAR'].unique()[0]
-    
-    monthFull = flightDur.loc[(flightDur['AIRPORT_ID']==airpID) & (flightDur['CAR']==carID)]
-    #monthFullstats = monthFull.groupby(['Type'])['DURATION'].agg(['mean', 'median', 'std', 'min', 'max', 'count']).reset_index()
+def collect_patch_events(event):
+    if session['patchEvents'] is not None:
+        session['patchEvents'].append(event)
 
+def current_selection():
+    return {'month': monthInp.value,
+            'airport': airpInp.value,
+            'airline': airlInp.value,
+            'param': wetInp.value,
+            'binW': binWid.value,
+            'corrType': corrInp.value,
+            'clientRebin': clientRebin.active}
+
+def default_choice(choices, preferred, name):
+    # return 'preferred' if it is one of the 'choices', else the first choice containing 'name'
+    if preferred in choices:
+        return preferred
+    return ([x for x in choices if name in x] or choices)[0]
+
+def compute_plots(updates, selection, airpByDatestats):
+    # compute the data of the requested 'updates' (runs in the worker pool)
+    dataStore = DataStore.getDataStore(selection['month'])
+    if 'month' in updates:
+        # keep the airport and airline if the month has them
+        selection['airport'] = default_choice(dataStore['airportList'], selection['airport'], 'Denver')
+        selection['airline'] = default_choice(dataStore['airlineList'], selection['airline'], 'United')
+        selection['param'] = default_choice(dataStore['weatherParams'], selection['param'], 'TEMP')
+    #######################################################################
+    # With 'clientRebin' the 1-minute counts of the delays ('delayCounts') are
+    # sent once per airport/airline and the browser re-bins them for every
+    # bin width, so a bin width change ('delayBins') needs nothing from here.
+    # The results are cached for all the sessions (see resultCache.py), per
+    # generation of the month's data store: a result computed from a store
+    # that days have since been appended to (see incremental.py) is never
+    # served for the new one, even if it is cached after the refresh.
     #######################################################################
+    month, airport, airline, binW = selection['month'], selection['airport'], selection['airline'], selection['binW']
+    generation = len(dataStore['appendBatches'])
+    results = {}
+    if 'month' in updates:
+        results['month'] = {x: dataStore[x] for x in ['airportList', 'airlineList', 'weatherParams', 'durationRange']}
+    if selection['clientRebin']:
+        if 'delay' in updates:
+            results['delayCounts'] = ResultCache.cached(('delayCounts', month, generation, airport, airline),
+                                                        lambda: PlotData.delayCounts(dataStore, airport, airline))
+    elif updates & {'delay', 'delayBins'}:
+        results['delay'] = ResultCache.cached(('delay', month, generation, airport, airline, binW),
+                                              lambda: PlotData.delayHists(dataStore, airport, airline, binW))
+    if 'daily' in updates:
+        airpByDatestats = results['daily'] = ResultCache.cached(('daily', month, generation, airport),
+                                                                lambda: PlotData.dailyStats(dataStore, airport))
+    if 'worstDay' in updates:
+        results['worstDay'] = ResultCache.cached(('worstDay', month, generation, airport, binW),
+                                                 lambda: PlotData.worstDayHists(dataStore, airport, airpByDatestats, binW))
+    if 'corr' in updates:
+        results['corr'] = ResultCache.cached(('corr', month, generation, selection['corrType']),
+                                             lambda: PlotData.correlationData(dataStore, selection['corrType']))
+    return results
 
-    minDepDel = min(monthFull.loc[monthFull['Type']=='DEP_DEL', 'DURATION'])
-    maxDepDel = max(monthFull.loc[monthFull['Type']=='DEP_DEL', 'DURATION'])
-    histDepDel, edgesDepDel = Numpy.histogram(monthFull.loc[monthFull['Type']=='DEP_DEL', 'DURATION'], 
-                                  density=False, bins=Numpy.arange(minDepDel, maxDepDel, binW))
-    
-    minArrDel = min(monthFull.loc[monthFull['Type']=='ARR_DEL', 'DURATION'])
-    maxArrDel = max(monthFull.loc[monthFull['Type']=='ARR_DEL', 'DURATION'])
-    histArrDel, edgesArrDel = Numpy.histogram(monthFull.loc[monthFull['Type']=='ARR_DEL', 'DURATION'], 
-                                  density=False, bins=Numpy.arange(minArrDel, maxArrDel, binW))
-    
-    plt1 = BokehPlotting.figure(
-                             title=f'Delays at {airport} for {airline}', 
-                             x_axis_label='Duration (mins)', 
-                             y_axis_label='Number of flights',
-                             plot_width=900, plot_height=500,
-                             x_range = (minAll, maxAll),
-                             tools = TOOLS)                                
+def apply_plots(updates, selection, results):
+    # show the computed 'results' (runs on the IOLoop)
+    if 'month' in results:
+        session['applying'] = True
+        airpInp.options, airpInp.value = results['month']['airportList'], selection['airport']
+        airlInp.options, airlInp.value = results['month']['airlineList'], selection['airline']
+        wetInp.options, wetInp.value = results['month']['weatherParams'], selection['param']
+        session['applying'] = False
+        Plots.update_range_delay(plt_month, results['month']['durationRange'])
+    if 'delay' in results:
+        Plots.update_plot_delay(plt_month, results['delay'], selection['airport'], selection['airline'])
+    if 'delayCounts' in results:
+        Plots.update_plot_delay_counts(plt_month, results['delayCounts'], selection['airport'], selection['airline'])
+    if 'daily' in results:
+        session['airpByDatestats'] = results['daily']
+        Plots.update_plot_daily(plt_Weather, session['airpByDatestats'], selection['param'])
+    elif 'param' in updates:
+        Plots.update_plot_param(plt_Weather, session['airpByDatestats'], selection['param'])
+    if 'worstDay' in results:
+        Plots.update_plot_worst_day(plt_Weather, results['worstDay'])
+    if 'corr' in results:
+        Plots.update_plot_corr(plt_corr, results['corr'], selection['corrType'])
 
-    
-    plt1.quad(top=histDepDel, bottom=0, left=edgesDepDel[:-1], right=edgesDepDel[1:],
-              fill_color="red", line_color="white", alpha=0.5, legend='Departures')
-    
-    plt1.quad(top=histArrDel, bottom=0, left=edgesArrDel[:-1], right=edgesArrDel[1:],
-          fill_color="blue", line_color="white", alpha=0.5, legend='Arrivals')
-     
-    plt1.legend.location = "top_right"
-    plt1.legend.orientation = "vertical"       
-    
+def request_update(updates):
     #######################################################################
-    
-    minDepTaxi, maxDepTaxi = min(monthFull.loc[monthFull['Type']=='DEP_TAXI', 'DURATION']), max(monthFull.loc[monthFull['Type']=='DEP_TAXI', 'DURATION'])
-    histDepTaxi, edgesDepTaxi = Numpy.histogram(monthFull.loc[monthFull['Type']=='DEP_TAXI', 'DURATION'], 
-                                  density=False, bins=Numpy.arange(minDepTaxi, maxDepTaxi, binW))
-    
-    minArrTaxi, maxArrTaxi = min(monthFull.loc[monthFull['Type']=='ARR_TAXI', 'DURATION']), max(monthFull.loc[monthFull['Type']=='ARR_TAXI', 'DURATION'])
-    histArrTaxi, edgesArrTaxi = Numpy.histogram(monthFull.loc[monthFull['Type']=='ARR_TAXI', 'DURATION'], 
-                                  density=False, bins=Numpy.arange(minArrTaxi, maxArrTaxi, binW))
-    
-    plt2 = BokehPlotting.figure(
-                             title=f'Taxiing times at {airport} for {airline}', 
-                             x_axis_label='Duration (mins)', 
-                             y_axis_label='Number of flights',
-                             plot_width=900, plot_height=500,
-                             x_range = (minAll, maxAll),
-                             #tooltips = [('Year', '@Year'),('Exp.', '@$category')]
-                             tools = TOOLS)                                
-    
-    plt2.quad(top=histDepTaxi, bottom=0, left=edgesDepTaxi[:-1], right=edgesDepTaxi[1:],
-              fill_color="red", line_color="white", alpha=0.5, legend='Departures')
-    
-    plt2.quad(top=histArrTaxi, bottom=0, left=edgesArrTaxi[:-1], right=edgesArrTaxi[1:],
-          fill_color="blue", line_color="white", alpha=0.5, legend='Arrivals')
-    
-    
-    plt2.legend.location = "top_right"
-    plt2.legend.orientation = "vertical"    
-    
+    # queue the 'updates' for the current widget values; a request that has
+    # not started yet is cancelled, as the new one covers all pending updates
     #######################################################################
-    
-    plt = BokehLayouts.column(style(plt1), style(plt2))
-    
-    #BokehIO.save(plt)
+    session['generation'] += 1
+    session['updates'] |= set(updates)
+    if session['future'] is not None:
+        session['future'].cancel()
+    generation, updates, selection = session['generation'], set(session['updates']), current_selection()
+    busyDiv.text = '<b>Updating ...</b>'
+    requestTime = Time.perf_counter()
+    future = PlotData.executor.submit(PerfMetrics.timed, 'update.compute', compute_plots,
+                                      updates, selection, session['airpByDatestats'])
+    session['future'] = future
+    future.add_done_callback(lambda x: doc.add_next_tick_callback(lambda: finish_update(generation, updates, selection, x,
+                                                                                         requestTime)))
 
-    return plt
+def finish_update(generation, updates, selection, future, requestTime):
+    if (generation != session['generation']) or future.cancelled():
+        return      # superseded by a later request
+    session['updates'], session['future'] = set(), None
+    busyDiv.text = ''
+    try:
+        session['patchEvents'] = [] if PerfMetrics.metricsOn else None
+        with PerfMetrics.span('update.apply'):
+            apply_plots(updates, selection, future.result())
+        PerfMetrics.record('update.patchBytes', PerfMetrics.patchBytes(session['patchEvents']))
+        PerfMetrics.record('update.total', Time.perf_counter() - requestTime)
+    except Exception as e:
+        busyDiv.text = f'<b>Update failed:</b> {e}'
+        raise
+    finally:
+        session['patchEvents'] = None
 
 #######################################################################
-# Interactive plot of Expenses vs month (for specific year), all categories stacked up OR for a specific Category.
+# Which plots depend on which widget
 #######################################################################
-def make_plot_Weather():
-    
-    # For debug only
-    #BokehIO.output_file("tmp.html")
-    #flight = flightDur
-    #airport = 'Denver, CO'
-    #param = 'TEMP'
-    #binW = 5
-    
-    airport = airpInp.value
-    param = wetInp.value
-    binW = binWid.value
-    
-    airpID = topAirports.loc[topAirports['City']==airport, 'AIRPORT_ID'].unique()[0]
-    
-    airpByDate = flightDur.loc[flightDur['AIRPORT_ID']==airpID].copy()
-    airpByDatestats = airpByDate.groupby(['Date', 'Type', 'AIRPORT_ID'])['DURATION'].agg(['mean', 'median', 'count']).reset_index()
-    
-    airpByDatestats = airpByDatestats.merge(topAirports, on=['AIRPORT_ID', 'Type'], how='inner')
-    airpByDatestats = airpByDatestats.merge(airpWet, on=['STN', 'WBAN', 'Date'], how='inner')
-    
-    airpByDate['Day'] = airpByDate['Date'].apply(lambda x: int(x[8:10]))
-    airpByDatestats['Day'] = airpByDatestats['Date'].apply(lambda x: int(x[8:10]))
-    
-    #######################################################################
-    
-    pltTopLeft = BokehPlotting.figure(x_range = (0, airpByDatestats['Date'].nunique()),
-                                 title="Delays vs Day", 
-                                 x_axis_label='Day of month', 
-                                 y_axis_label='Delay (mins)',
-                                 plot_width=450, plot_height=300,
-                                 tools = TOOLS,
-                                 tooltips = [('Day', '@Day'),
-                                             ('Avg', '@mean{int}'),
-                                             ('Med', '@median'),
-                                             ('Count', '@count')]    
-                                 )
-    pltTopLeft.circle(x = 'Day', y = 'mean', line_color='red' ,color = 'red', fill_alpha=1, size=5,
-                      source = airpByDatestats.loc[airpByDatestats['Type']=='DEP_DEL'], legend='Dep')
-    
-    pltTopLeft.circle(x = 'Day', y = 'mean', line_color='blue' ,color = 'blue', fill_alpha=1, size=5,
-                  source = airpByDatestats.loc[airpByDatestats['Type']=='ARR_DEL'], legend='Arr')
-                                                
-    #pltTopLeft.legend.location = (0, 200)
-    pltTopLeft.legend.orientation = "horizontal"
-    
-    ######################################################################
-    
-    pltTopRight = BokehPlotting.figure(
-                                 title=f'Delays vs {param}', 
-                                 x_axis_label=f'{param}', 
-                                 y_axis_label='Delay (mins)',
-                                 plot_width=450, plot_height=300,
-                                 tools = TOOLS,
-                                 tooltips = [('Day', '@Day'),
-                                             (f'{param}', f'@{param}'),
-                                             ('Avg', '@mean{int}')
-											]    
-                                 )
-    pltTopRight.circle(x = param, y = 'mean', line_color='red' ,color = 'red', fill_alpha=1, size=5,
-                      source = airpByDatestats.loc[airpByDatestats['Type']=='DEP_DEL'], legend='Dep')
-    
-    pltTopRight.circle(x = param, y = 'mean', line_color='blue' ,color = 'blue', fill_alpha=1, size=5,
-                  source = airpByDatestats.loc[airpByDatestats['Type']=='ARR_DEL'], legend='Arr')
-                                                
-    #pltTopRight.legend.location = (0, 200)
-    pltTopRight.legend.orientation = "horizontal"
-    
-    #######################################################################
-    
-    pltBotLeft = BokehPlotting.figure(x_range = (0, airpByDatestats['Date'].nunique()),
-                                 title=f'{param} vs Day', 
-                                 x_axis_label='Day of month', 
-                                 y_axis_label=f'{param}',
-                                 plot_width=400, plot_height=300,
-                                 tools = TOOLS,
-                                 tooltips = [('Day', '@Day'),
-                                             (f'{param}', f'@{param}')
-                                             ]    
-                                 )
-    pltBotLeft.circle(x = 'Day', y = param, line_color='red' ,color = 'red', fill_alpha=1, size=5,
-                      source = airpByDatestats.loc[airpByDatestats['Type']=='DEP_DEL'], legend='Dep')
-    
-    pltBotLeft.circle(x = 'Day', y = param, line_color='blue' ,color = 'blue', fill_alpha=1, size=5,
-                  source = airpByDatestats.loc[airpByDatestats['Type']=='ARR_DEL'], legend='Arr')
-                                                
-    #pltBotLeft.legend.location = (0, 200)
-    pltBotLeft.legend.orientation = "horizontal"
-    
-    #######################################################################
-    maxDepDur = max(airpByDatestats.loc[(airpByDatestats['Type']=='DEP_DEL'), 'mean'])
-    maxDepDay = airpByDatestats.loc[(airpByDatestats['Type']=='DEP_DEL') & (airpByDatestats['mean'] == maxDepDur), 'Day'].iloc[0,]
-    maxArrDur = max(airpByDatestats.loc[(airpByDatestats['Type']=='ARR_DEL'), 'mean'])
-    maxArrDay = airpByDatestats.loc[(airpByDatestats['Type']=='ARR_DEL') & (airpByDatestats['mean'] == maxArrDur), 'Day'].iloc[0,]
-    
-    minDepDel = min(airpByDate.loc[(airpByDate['Type']=='DEP_DEL') & (airpByDate['Day']==maxDepDay), 'DURATION'])
-    maxDepDel = max(airpByDate.loc[(airpByDate['Type']=='DEP_DEL') & (airpByDate['Day']==maxDepDay), 'DURATION'])
-    histDepDel, edgesDepDel = Numpy.histogram(airpByDate.loc[(airpByDate['Type']=='DEP_DEL') & 
-                                                               (airpByDate['Day']==maxDepDay), 'DURATION'], 
-                                  density=False, bins=Numpy.arange(minDepDel, maxDepDel, binW))
-    
-    minArrDel = min(airpByDate.loc[(airpByDate['Type']=='ARR_DEL') & (airpByDate['Day']==maxArrDay), 'DURATION'])
-    maxArrDel = max(airpByDate.loc[(airpByDate['Type']=='ARR_DEL') & (airpByDate['Day']==maxArrDay), 'DURATION'])
-    histArrDel, edgesArrDel = Numpy.histogram(airpByDate.loc[(airpByDate['Type']=='ARR_DEL') & 
-                                                               (airpByDate['Day']==maxArrDay), 'DURATION'], 
-                                  density=False, bins=Numpy.arange(minArrDel, maxArrDel, binW))
-    
-    xmin = min(airpByDate.loc[(airpByDate['Type']=='DEP_DEL') & (airpByDate['Day']==maxDepDay), 'DURATION'].quantile(0.05),
-                              airpByDate.loc[(airpByDate['Type']=='ARR_DEL') & (airpByDate['Day']==maxArrDay), 'DURATION'].quantile(0.05))
-    xmax = max(airpByDate.loc[(airpByDate['Type']=='DEP_DEL') & (airpByDate['Day']==maxDepDay), 'DURATION'].quantile(0.95),
-                              airpByDate.loc[(airpByDate['Type']=='ARR_DEL') & (airpByDate['Day']==maxArrDay), 'DURATION'].quantile(0.95))
+plotUpdates = [(monthInp, 'value', ['month', 'delay', 'daily', 'worstDay', 'corr']),
+               (airpInp, 'value', ['delay', 'daily', 'worstDay']),
+               (airlInp, 'value', ['delay']),
+               (wetInp,  'value', ['param']),
+               (binWid,  'value_throttled', ['delayBins', 'worstDay']),
+               (clientRebin, 'active', ['delay']),
+               (corrInp, 'value', ['corr'])]
 
-    pltBotRight = BokehPlotting.figure(x_range = (xmin, xmax),
-                                 title='Delays on worst day', 
-                                 x_axis_label='Duration (mins)', 
-                                 y_axis_label='Number of flights',
-                                 plot_width=450, plot_height=300,
-                                 tools = TOOLS 
-                                 #tooltips = [('Day', '@x'),
-                                             #(f'{param}', '@y')
-                                             #]    
-                                 )
-    
-    pltBotRight.quad(top=histDepDel, bottom=0, left=edgesDepDel[:-1], right=edgesDepDel[1:],
-              fill_color="red", line_color="white", alpha=0.5, legend='Dep')
-    
-    pltBotRight.quad(top=histArrDel, bottom=0, left=edgesArrDel[:-1], right=edgesArrDel[1:],
-          fill_color="blue", line_color="white", alpha=0.5, legend='Arr')
-    
-                                              
-    #pltBotRight.legend.location = (0, 200)
-    pltBotRight.legend.orientation = "horizontal"
-    
-    #######################################################################
-    
-    plt = BokehLayouts.row(BokehLayouts.column(style(pltTopLeft), style(pltBotLeft)),
-                           BokehLayouts.column(style(pltTopRight), style(pltBotRight)))
-                           
-    
-    #BokehIO.save(plt)
+def make_update(updates):
+    def update(attribute, old, new):
+        if not session['applying']:
+            request_update(updates)
+    return update
 
-    return plt
+for wid, attribute, updates in plotUpdates:
+    wid.on_change(attribute, make_update(updates))
+doc.on_change(collect_patch_events)
 
 #######################################################################
-# call the plots
+# Days appended to a month (see incremental.py) refresh the plots of the
+# sessions showing it, and the choices of the widgets, from the refreshed
+# data store.  The listener is called from the worker thread that appended
+# them, so the refresh is scheduled on the session's next tick.
 #######################################################################
-airpInp = BokehWidgets.Select(title="Select Airport city", value=airport, options=airportList)
-airlInp = BokehWidgets.Select(title="Select Airline", value=airline, options=airlineList)
-wetInp = BokehWidgets.Select(title='Select Weather Param', value='TEMP', options=weatherParams)
-binWid = BokehWidgets.Slider(title="Select Bin Width (mins)", value=5, start=1, end=30, step=1)
+def refresh_month(yyyymm):
+    if yyyymm == monthInp.value:
+        request_update(['month', 'delay', 'daily', 'worstDay', 'corr'])
 
-plt_month = make_plot_delay()
-plt_Weather = make_plot_Weather()
-#table_CatMM = make_table(allData)
+def data_appended(yyyymm):
+    doc.add_next_tick_callback(lambda: refresh_month(yyyymm))
+
+DataStore.addListener(data_appended)
+doc.on_session_destroyed(lambda sessionContext: DataStore.removeListener(data_appended))
 
-def update_all(attribute, old, new):
-    pltLayout.children[1] = make_plot_delay()
-    pltLayout.children[3] = make_plot_Weather()
-    #pltLayout.children[5] = make_table (allData)
-     
-for wid in [airpInp, 
-	    airlInp, 
-	    wetInp, 
-	    binWid]:
-    wid.on_change('value', update_all)
+with PerfMetrics.span('session.plots'):
+    apply_plots({'delay', 'daily', 'worstDay', 'corr'}, current_selection(),
+                compute_plots({'delay', 'daily', 'worstDay', 'corr'}, current_selection(), None))
     
-pltLayout = BokehLayouts.column(BokehLayouts.row(BokehLayouts.widgetbox(airpInp), 
+pltLayout = BokehLayouts.column(BokehLayouts.row(BokehLayouts.widgetbox(monthInp),
+                                                 BokehLayouts.widgetbox(airpInp), 
                                                  BokehLayouts.widgetbox(airlInp),
-                                                 BokehLayouts.widgetbox(binWid)),
-                                plt_month,
+                                                 BokehLayouts.widgetbox(binWid, clientRebin),
+                                                 BokehLayouts.widgetbox(busyDiv)),
+                                plt_month['layout'],
                                 BokehLayouts.widgetbox(wetInp), 
-                                plt_Weather, 
+                                plt_Weather['layout'], 
+                                BokehLayouts.widgetbox(corrInp),
+                                plt_corr['layout'],
                                 #BokehLayouts.widgetbox(dayInp), 
                                 #table_CatMM, 
                                 width=900)
     
-BokehIO.curdoc().add_root(pltLayout)
-BokehIO.curdoc().title = f'Flight_onTime'
+doc.add_root(pltLayout)
+doc.title = f'Flight_onTime'
@@ -0,0 +1,152 @@
+#######################################################################
+# Performance metrics of the Flight_onTime bokeh-app
+#
+# Named spans time the loading stages of a month (see dataStore.py) and the
+# plot updates of the sessions (see main.py); each span also samples the
+# resident memory of the process at its end.  Every span name keeps its count,
+# total, last and maximum time and the times of its 'recentSpans' latest runs
+# (for percentiles), and values such as the size of the document patches are
+# recorded the same way.
+#
+#   'FLIGHT_ONTIME_METRICS=0'       turns the metrics off
+#   'FLIGHT_ONTIME_METRICS_LOG=1'   also logs every span as a line of JSON
+#                                   (logger 'flight_ontime.metrics')
+#   'FLIGHT_ONTIME_METRICS_PORT'    port of the metrics endpoint started by
+#                                   server_lifecycle.py (default 5007, 0: none)
+#
+# With several server processes every process publishes its metrics to
+# 'metricsDir' and the endpoint (which any of the processes may answer)
+# reports all of them.
+#######################################################################
+import numpy as Numpy
+import collections as Collections
+import contextlib as Contextlib
+import json as Json
+import logging as Logging
+import os as Os
+import resource as Resource
+import threading as Threading
+import time as Time
+from bokeh.protocol import Protocol as BokehProtocol
+
+metricsOn = Os.environ.get('FLIGHT_ONTIME_METRICS', '1') != '0'
+metricsLog = Os.environ.get('FLIGHT_ONTIME_METRICS_LOG', '0') != '0'
+metricsPort = int(Os.environ.get('FLIGHT_ONTIME_METRICS_PORT', '5007'))
+metricsDir = Os.path.join(Os.path.dirname(__file__), 'data', 'cache', 'metrics')
+publishSeconds = 10     # a process publishes its metrics this often
+recentSpans = 200
+
+logger = Logging.getLogger('flight_ontime.metrics')
+if metricsLog and not logger.handlers:
+    logger.addHandler(Logging.StreamHandler())
+    logger.setLevel(Logging.INFO)
+    logger.propagate = False
+startTime = Time.time()
+_metrics = {}           # name: {'count', 'total', 'last', 'max', 'recent'}
+_metricsLock = Threading.Lock()
+
+def residentBytes():
+    # return the resident memory of the process (its peak where /proc is not available)
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1])*Resource.getpagesize()
+    except OSError:
+        return Resource.getrusage(Resource.RUSAGE_SELF).ru_maxrss*1024
+
+def record(name, value, **labels):
+    #######################################################################
+    # add 'value' (seconds for spans, bytes for sizes) to the metric 'name';
+    # the 'labels' (e.g. the month) only go to the structured log
+    #######################################################################
+    if not metricsOn:
+        return
+    with _metricsLock:
+        metric = _metrics.setdefault(name, {'count': 0, 'total': 0.0, 'last': 0.0, 'max': 0.0,
+                                            'recent': Collections.deque(maxlen=recentSpans)})
+        metric['count'] += 1
+        metric['total'] += value
+        metric['last'] = value
+        metric['max'] = max(metric['max'], value)
+        metric['recent'].append(value)
+    if metricsLog:
+        logger.info(Json.dumps({'metric': name, 'value': round(value, 6), 'pid': Os.getpid(), **labels}))
+
+@Contextlib.contextmanager
+def span(name, **labels):
+    #######################################################################
+    # time the block as the span 'name', e.g.
+    #       with PerfMetrics.span('load.weather', month=yyyymm):
+    # and record the resident memory at its end as 'name.rss'
+    #######################################################################
+    if not metricsOn:
+        yield
+        return
+    spanStart = Time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, Time.perf_counter() - spanStart, **labels)
+        record(name + '.rss', residentBytes(), **labels)
+
+def resetMetrics():
+    # forget all the metrics recorded so far
+    with _metricsLock:
+        _metrics.clear()
+
+def timed(name, function, *args):
+    # return function(*args), timed as the span 'name' (for the tasks submitted to a pool)
+    with span(name):
+        return function(*args)
+
+def patchBytes(events):
+    # return the size of the document patch the server sends for the bokeh document 'events'
+    if not events:
+        return 0
+    patch = BokehProtocol('1.0').create('PATCH-DOC', events)
+    return (len(patch.header_json) + len(patch.metadata_json) + len(patch.content_json) +
+            sum(len(x[1]) for x in patch.buffers))
+
+def metricsReport():
+    #######################################################################
+    # return the metrics of this process: for every name its 'count', 'mean',
+    # 'last', 'max' and the 50/90/99 percentiles of its recent values
+    #######################################################################
+    with _metricsLock:
+        metrics = {name: dict(x, recent=list(x['recent'])) for name, x in _metrics.items()}
+    for metric in metrics.values():
+        recent = metric.pop('recent')
+        metric['mean'] = metric.pop('total')/metric['count']
+        metric.update(zip(['p50', 'p90', 'p99'], Numpy.percentile(recent, [50, 90, 99]).tolist()))
+    return {'pid': Os.getpid(), 'time': Time.time(), 'uptime': Time.time() - startTime,
+            'rss': residentBytes(), 'metrics': metrics}
+
+def publishMetrics(extra=None):
+    # write the metrics of this process (and the 'extra' values) to 'metricsDir' (as '<pid>.json')
+    report = metricsReport()
+    report.update(extra or {})
+    Os.makedirs(metricsDir, exist_ok=True)
+    tmpFile = Os.path.join(metricsDir, f'.{Os.getpid()}.json')
+    with open(tmpFile, 'w') as metricsFile:
+        Json.dump(report, metricsFile)
+    Os.replace(tmpFile, Os.path.join(metricsDir, f'{Os.getpid()}.json'))
+
+def allMetrics(extra=None):
+    #######################################################################
+    # return the metrics of this process (with the 'extra' dict of values,
+    # e.g. the result cache counters) and the last published metrics of the
+    # other live server processes
+    #######################################################################
+    report = metricsReport()
+    report.update(extra or {})
+    processes = [report]
+    for fileName in sorted(Os.listdir(metricsDir)) if Os.path.isdir(metricsDir) else []:
+        if (not fileName.endswith('.json')) or fileName.startswith('.') or (fileName == f'{Os.getpid()}.json'):
+            continue
+        try:
+            with open(Os.path.join(metricsDir, fileName)) as metricsFile:
+                other = Json.load(metricsFile)
+        except (OSError, ValueError):
+            continue
+        if Time.time() - other['time'] < 3*publishSeconds:
+            processes.append(other)
+    return {'processes': processes}
@@ -0,0 +1,118 @@
+#######################################################################
+# Plot data for the Flight_onTime bokeh-app
+#
+# Pure functions that compute the data behind the plots from the shared data
+# store (see dataStore.py) and the widget selections.  They do not touch any
+# bokeh document, so they can be used from callbacks, worker threads and
+# headless scripts alike.
+#######################################################################
+import numpy as Numpy
+import concurrent.futures as Futures
+import os as Os
+import groupIndex as GroupIndex
+import histograms as Histograms
+
+durTypes = ['DEP_DEL', 'ARR_DEL', 'DEP_TAXI', 'ARR_TAXI']
+dailyTypes = ['DEP_DEL', 'ARR_DEL']
+#######################################################################
+# Worker pool, shared by all the sessions of a server process, in which the
+# widget callbacks run these functions ('FLIGHT_ONTIME_WORKERS' threads).
+# Threads rather than processes, as the workers read the shared data store.
+#######################################################################
+executor = Futures.ThreadPoolExecutor(max_workers=int(Os.environ.get('FLIGHT_ONTIME_WORKERS', '4')))
+
+def quadData(hist, edges):
+    # return the 'top', 'left', 'right' columns of a histogram drawn with quads
+    return {'top': hist, 'left': edges[:-1], 'right': edges[1:]}
+
+def delayHists(dataStore, airport, airline, binW):
+    #######################################################################
+    # return {durType: quadData} of the delay and taxiing time histograms for
+    # the given 'airport' (City) and 'airline' (Airline) with bins of 'binW' mins
+    #######################################################################
+    airpID = dataStore['airportIds'][airport]
+    carID = dataStore['airlineIds'][airline]
+    hists = {}
+    for durType in durTypes:
+        cumHist = Histograms.getHist(dataStore['durationHists'], (airpID, carID, durType))
+        hists[durType] = quadData(*Histograms.rebin(cumHist, binW))
+    return hists
+
+def delayCounts(dataStore, airport, airline):
+    #######################################################################
+    # return {durType: {'value', 'count'}}, the 1-minute resolution counts of the
+    # delays and taxiing times for 'airport' and 'airline'; these are sent to
+    # the browser once, to be re-binned there (see plots.link_client_rebin)
+    #######################################################################
+    airpID = dataStore['airportIds'][airport]
+    carID = dataStore['airlineIds'][airline]
+    counts = {}
+    for durType in durTypes:
+        values, valueCounts = Histograms.counts(Histograms.getHist(dataStore['durationHists'], (airpID, carID, durType)))
+        counts[durType] = {'value': values, 'count': valueCounts}
+    return counts
+
+def dailyStats(dataStore, airport):
+    #######################################################################
+    # return the daily ('Date', 'Day') 'mean', 'median' and 'count' of each type of
+    # duration at 'airport', merged with the weather at its weather station
+    # (a slice of the precomputed daily statistics cube, see dataStore.py)
+    #######################################################################
+    airpID = dataStore['airportIds'][airport]
+    return dataStore['dailyIndex']['frame'].iloc[GroupIndex.groupRows(dataStore['dailyIndex'], (airpID,))]
+
+def dailyData(airpByDatestats, durType, param):
+    #######################################################################
+    # return the columns ('Day', 'mean', 'median', 'count' and the weather
+    # parameter 'param' as 'param') of the daily stats of 'durType'
+    #######################################################################
+    rows = airpByDatestats.loc[airpByDatestats['Type']==durType]
+    return {'Day': rows['Day'].to_numpy(),
+            'mean': rows['mean'].to_numpy(),
+            'median': rows['median'].to_numpy(),
+            'count': rows['count'].to_numpy(),
+            'param': rows[param].to_numpy()}
+
+def paramData(airpByDatestats, durType, param):
+    # return just the weather parameter column ('param') of the daily stats of 'durType'
+    return airpByDatestats.loc[airpByDatestats['Type']==durType, param].to_numpy()
+
+def correlationData(dataStore, durType):
+    #######################################################################
+    # return the columns ('City', 'param', 'r', 'slope', 'days') of the weather
+    # correlations (see correlations.py) with the daily mean of 'durType',
+    # 'airports', the airports ordered by their largest absolute correlation,
+    # and 'params', the weather parameters of the month
+    #######################################################################
+    corr = dataStore['weatherCorr']
+    corr = corr.loc[corr['Type']==durType]
+    airports = corr.assign(absR=corr['r'].abs()).groupby('City')['absR'].max().fillna(0)
+    return {'City': corr['City'].to_numpy(),
+            'param': corr['param'].to_numpy(),
+            'r': corr['r'].to_numpy(),
+            'slope': corr['slope'].to_numpy(),
+            'days': corr['days'].to_numpy(),
+            'airports': list(airports.sort_values(ascending=False, kind='mergesort').index),
+            'params': list(dataStore['weatherParams'])}
+
+def worstDayHists(dataStore, airport, airpByDatestats, binW):
+    #######################################################################
+    # return {durType: quadData} of the delays on the day with the largest mean
+    # delay, for departures and arrivals at 'airport', and 'xRange', the
+    # (5%, 95%) quantiles of those delays
+    #######################################################################
+    airpID = dataStore['airportIds'][airport]
+    hists = {}
+    xMins, xMaxs = [], []
+    for durType in dailyTypes:
+        rows = airpByDatestats.loc[airpByDatestats['Type']==durType]
+        if len(rows) == 0:
+            hists[durType] = quadData(Numpy.zeros(0), Numpy.zeros(0))
+            continue
+        worstDay = rows['Day'].to_numpy()[rows['mean'].to_numpy().argmax()]
+        cumHist = Histograms.getHist(dataStore['dailyHists'], (airpID, durType, worstDay))
+        hists[durType] = quadData(*Histograms.rebin(cumHist, binW))
+        xMins.append(Histograms.quantile(cumHist, 0.05))
+        xMaxs.append(Histograms.quantile(cumHist, 0.95))
+    hists['xRange'] = (min(xMins), max(xMaxs)) if xMins else (0, 1)
+    return hists
@@ -0,0 +1,356 @@
+#######################################################################
+# Figures for the Flight_onTime bokeh-app
+#
+# The figures are built once per document, backed by ColumnDataSources.
+# The 'update_plot_*' functions only replace the data (and titles, labels and
+# ranges) of the existing figures, so a widget change sends just the changed
+# columns to the browser instead of re-serializing whole figures.
+#
+# Nothing here refers to the widgets or to curdoc(), the data comes from
+# plotData.py.
+#######################################################################
+import bokeh.plotting as BokehPlotting
+import bokeh.models as BokehModels
+import bokeh.layouts as BokehLayouts
+import bokeh.palettes as BokehPalettes
+import plotData as PlotData
+
+#TOOLS = "crosshair,hover,save,pan,wheel_zoom,box_zoom,reset,box_select,lasso_select"
+TOOLS = "hover,pan,zoom_in,zoom_out,box_zoom,reset,save"
+durTypeLabels = {'DEP_DEL': 'departure delay', 'ARR_DEL': 'arrival delay',
+                 'DEP_TAXI': 'taxi-out time', 'ARR_TAXI': 'taxi-in time'}
+#######################################################################
+# Styling for a plot
+#######################################################################
+def style(p):
+    # Title
+    p.title.align = 'center'
+    p.title.text_font_size = '14pt'
+    p.title.text_font = 'Helvetica'
+
+    # Axis titles
+    p.xaxis.axis_label_text_font_size = '14pt'
+    p.xaxis.axis_label_text_font_style = 'bold'
+    p.yaxis.axis_label_text_font_size = '14pt'
+    p.yaxis.axis_label_text_font_style = 'bold'
+
+    # Tick labels
+    p.xaxis.major_label_text_font_size = '12pt'
+    p.yaxis.major_label_text_font_size = '12pt'
+
+    return p
+
+def quadSource():
+    # an empty source for a histogram drawn with quads
+    return BokehModels.ColumnDataSource(data={'top': [], 'left': [], 'right': []})
+
+def countSource():
+    # an empty source for the 1-minute resolution counts of a group (see plotData.delayCounts)
+    return BokehModels.ColumnDataSource(data={'value': [], 'count': []})
+
+def dailySource():
+    # an empty source for the daily stats (see plotData.dailyData)
+    return BokehModels.ColumnDataSource(data={'Day': [], 'mean': [], 'median': [], 'count': [], 'param': []})
+
+#######################################################################
+# Histograms of delays and taxiing times at an airport for an airline
+#######################################################################
+def make_plot_delay(durationRange):
+    #######################################################################
+    # build the (empty) delay and taxiing time figures, with the x range of both
+    # set to 'durationRange', and return a dictionary of the 'layout', the
+    # figures, the 'sources' (one per type of duration) and the 'countSources'
+    # used when re-binning in the browser (see link_client_rebin)
+    #######################################################################
+    minAll, maxAll = durationRange
+    sources = {durType: quadSource() for durType in PlotData.durTypes}
+    countSources = {durType: countSource() for durType in PlotData.durTypes}
+
+    plt1 = BokehPlotting.figure(
+                             title='Delays',
+                             x_axis_label='Duration (mins)',
+                             y_axis_label='Number of flights',
+                             plot_width=900, plot_height=500,
+                             x_range = (minAll, maxAll),
+                             tools = TOOLS)
+
+    plt1.quad(top='top', bottom=0, left='left', right='right', source=sources['DEP_DEL'],
+              fill_color="red", line_color="white", alpha=0.5, legend_label='Departures')
+
+    plt1.quad(top='top', bottom=0, left='left', right='right', source=sources['ARR_DEL'],
+          fill_color="blue", line_color="white", alpha=0.5, legend_label='Arrivals')
+
+    plt1.legend.location = "top_right"
+    plt1.legend.orientation = "vertical"
+
+    #######################################################################
+
+    plt2 = BokehPlotting.figure(
+                             title='Taxiing times',
+                             x_axis_label='Duration (mins)',
+                             y_axis_label='Number of flights',
+                             plot_width=900, plot_height=500,
+                             x_range = (minAll, maxAll),
+                             tools = TOOLS)
+
+    plt2.quad(top='top', bottom=0, left='left', right='right', source=sources['DEP_TAXI'],
+              fill_color="red", line_color="white", alpha=0.5, legend_label='Departures')
+
+    plt2.quad(top='top', bottom=0, left='left', right='right', source=sources['ARR_TAXI'],
+          fill_color="blue", line_color="white", alpha=0.5, legend_label='Arrivals')
+
+    plt2.legend.location = "top_right"
+    plt2.legend.orientation = "vertical"
+
+    #######################################################################
+
+    return {'layout': BokehLayouts.column(style(plt1), style(plt2)),
+            'plt1': plt1,
+            'plt2': plt2,
+            'sources': sources,
+            'countSources': countSources}
+
+def update_plot_delay(pltDelay, hists, airport, airline):
+    # show the histograms 'hists' (see plotData.delayHists) for 'airport' and 'airline'
+    for durType in PlotData.durTypes:
+        pltDelay['sources'][durType].data = hists[durType]
+    update_titles_delay(pltDelay, airport, airline)
+
+def update_range_delay(pltDelay, durationRange):
+    # set the x range of the delay and taxiing time figures to 'durationRange'
+    for plt in (pltDelay['plt1'], pltDelay['plt2']):
+        plt.x_range.start, plt.x_range.end = durationRange
+
+def update_plot_delay_counts(pltDelay, counts, airport, airline):
+    # send the 1-minute counts 'counts' (see plotData.delayCounts) to be re-binned in the browser
+    for durType in PlotData.durTypes:
+        pltDelay['countSources'][durType].data = counts[durType]
+    update_titles_delay(pltDelay, airport, airline)
+
+def update_titles_delay(pltDelay, airport, airline):
+    pltDelay['plt1'].title.text = f'Delays at {airport} for {airline}'
+    pltDelay['plt2'].title.text = f'Taxiing times at {airport} for {airline}'
+
+#######################################################################
+# Re-binning of the delay histograms in the browser.  Same bins as
+# histograms.rebin(): edges from the group minimum in steps of 'binW', with
+# the last bin closed and the values above the last edge dropped.
+#######################################################################
+rebinCode = '''
+if (!toggle.active) {
+    return;
+}
+var binW = slider.value;
+for (var k = 0; k < sources.length; k++) {
+    var value = countSources[k].data['value'];
+    var count = countSources[k].data['count'];
+    var span = value.length - 1;
+    var numEdges = (span > 0) ? Math.ceil(span/binW) : 0;
+    var top = [], left = [], right = [];
+    for (var i = 0; i < numEdges - 1; i++) {
+        var stop = (i + 1)*binW + ((i == numEdges - 2) ? 1 : 0);
+        var total = 0;
+        for (var j = i*binW; j < stop; j++) {
+            total += count[j];
+        }
+        top.push(total);
+        left.push(value[0] + i*binW);
+        right.push(value[0] + (i + 1)*binW);
+    }
+    sources[k].data = {'top': top, 'left': left, 'right': right};
+}
+'''
+
+def link_client_rebin(pltDelay, binWid, clientToggle):
+    #######################################################################
+    # while 'clientToggle' is active, re-bin the delay histograms in the browser
+    # whenever the 'binWid' slider moves or new counts arrive in 'countSources'
+    #######################################################################
+    rebinCallback = BokehModels.CustomJS(args={'sources': [pltDelay['sources'][x] for x in PlotData.durTypes],
+                                               'countSources': [pltDelay['countSources'][x] for x in PlotData.durTypes],
+                                               'slider': binWid,
+                                               'toggle': clientToggle},
+                                         code=rebinCode)
+    binWid.js_on_change('value', rebinCallback)
+    for durType in PlotData.durTypes:
+        pltDelay['countSources'][durType].js_on_change('data', rebinCallback)
+
+#######################################################################
+# Daily delays at an airport and the local weather
+#######################################################################
+def make_plot_Weather():
+    #######################################################################
+    # build the (empty) weather figures and return a dictionary of the 'layout',
+    # the figures, the daily stats 'sources' (one per type of delay) and the
+    # worst day 'histSources' (one per type of delay)
+    #######################################################################
+    sources = {durType: dailySource() for durType in PlotData.dailyTypes}
+    histSources = {durType: quadSource() for durType in PlotData.dailyTypes}
+
+    pltTopLeft = BokehPlotting.figure(x_range = (0, 1),
+                                 title="Delays vs Day",
+                                 x_axis_label='Day of month',
+                                 y_axis_label='Delay (mins)',
+                                 plot_width=450, plot_height=300,
+                                 tools = TOOLS,
+                                 tooltips = [('Day', '@Day'),
+                                             ('Avg', '@mean{int}'),
+                                             ('Med', '@median'),
+                                             ('Count', '@count')]
+                                 )
+    pltTopLeft.circle(x = 'Day', y = 'mean', line_color='red' ,color = 'red', fill_alpha=1, size=5,
+                      source = sources['DEP_DEL'], legend_label='Dep')
+
+    pltTopLeft.circle(x = 'Day', y = 'mean', line_color='blue' ,color = 'blue', fill_alpha=1, size=5,
+                  source = sources['ARR_DEL'], legend_label='Arr')
+
+    pltTopLeft.legend.orientation = "horizontal"
+
+    ######################################################################
+
+    pltTopRight = BokehPlotting.figure(
+                                 title='Delays',
+                                 x_axis_label='',
+                                 y_axis_label='Delay (mins)',
+                                 plot_width=450, plot_height=300,
+                                 tools = TOOLS,
+                                 tooltips = [('Day', '@Day'),
+                                             ('', '@param'),
+                                             ('Avg', '@mean{int}')
+                                             ]
+                                 )
+    pltTopRight.circle(x = 'param', y = 'mean', line_color='red' ,color = 'red', fill_alpha=1, size=5,
+                      source = sources['DEP_DEL'], legend_label='Dep')
+
+    pltTopRight.circle(x = 'param', y = 'mean', line_color='blue' ,color = 'blue', fill_alpha=1, size=5,
+                  source = sources['ARR_DEL'], legend_label='Arr')
+
+    pltTopRight.legend.orientation = "horizontal"
+
+    #######################################################################
+
+    pltBotLeft = BokehPlotting.figure(x_range = (0, 1),
+                                 title='',
+                                 x_axis_label='Day of month',
+                                 y_axis_label='',
+                                 plot_width=400, plot_height=300,
+                                 tools = TOOLS,
+                                 tooltips = [('Day', '@Day'),
+                                             ('', '@param')
+                                             ]
+                                 )
+    pltBotLeft.circle(x = 'Day', y = 'param', line_color='red' ,color = 'red', fill_alpha=1, size=5,
+                      source = sources['DEP_DEL'], legend_label='Dep')
+
+    pltBotLeft.circle(x = 'Day', y = 'param', line_color='blue' ,color = 'blue', fill_alpha=1, size=5,
+                  source = sources['ARR_DEL'], legend_label='Arr')
+
+    pltBotLeft.legend.orientation = "horizontal"
+
+    #######################################################################
+
+    pltBotRight = BokehPlotting.figure(x_range = (0, 1),
+                                 title='Delays on worst day',
+                                 x_axis_label='Duration (mins)',
+                                 y_axis_label='Number of flights',
+                                 plot_width=450, plot_height=300,
+                                 tools = TOOLS
+                                 )
+
+    pltBotRight.quad(top='top', bottom=0, left='left', right='right', source=histSources['DEP_DEL'],
+              fill_color="red", line_color="white", alpha=0.5, legend_label='Dep')
+
+    pltBotRight.quad(top='top', bottom=0, left='left', right='right', source=histSources['ARR_DEL'],
+          fill_color="blue", line_color="white", alpha=0.5, legend_label='Arr')
+
+    pltBotRight.legend.orientation = "horizontal"
+
+    #######################################################################
+
+    return {'layout': BokehLayouts.row(BokehLayouts.column(style(pltTopLeft), style(pltBotLeft)),
+                                       BokehLayouts.column(style(pltTopRight), style(pltBotRight))),
+            'pltTopLeft': pltTopLeft,
+            'pltTopRight': pltTopRight,
+            'pltBotLeft': pltBotLeft,
+            'pltBotRight': pltBotRight,
+            'sources': sources,
+            'histSources': histSources}
+
+def update_plot_daily(pltWeather, airpByDatestats, param):
+    # show the daily stats 'airpByDatestats' (see plotData.dailyStats) and the weather parameter 'param'
+    for durType in PlotData.dailyTypes:
+        pltWeather['sources'][durType].data = PlotData.dailyData(airpByDatestats, durType, param)
+    numDays = airpByDatestats['Date'].nunique()
+    pltWeather['pltTopLeft'].x_range.end = numDays
+    pltWeather['pltBotLeft'].x_range.end = numDays
+    update_labels_param(pltWeather, param)
+
+def update_plot_param(pltWeather, airpByDatestats, param):
+    # replace just the weather parameter column of the daily stats with 'param'
+    for durType in PlotData.dailyTypes:
+        pltWeather['sources'][durType].data['param'] = PlotData.paramData(airpByDatestats, durType, param)
+    update_labels_param(pltWeather, param)
+
+def update_labels_param(pltWeather, param):
+    # titles, axis labels and tooltips that name the weather parameter 'param'
+    pltWeather['pltTopRight'].title.text = f'Delays vs {param}'
+    pltWeather['pltTopRight'].xaxis.axis_label = f'{param}'
+    pltWeather['pltTopRight'].select_one(BokehModels.HoverTool).tooltips = [('Day', '@Day'),
+                                                                            (f'{param}', '@param'),
+                                                                            ('Avg', '@mean{int}')]
+    pltWeather['pltBotLeft'].title.text = f'{param} vs Day'
+    pltWeather['pltBotLeft'].yaxis.axis_label = f'{param}'
+    pltWeather['pltBotLeft'].select_one(BokehModels.HoverTool).tooltips = [('Day', '@Day'),
+                                                                           (f'{param}', '@param')]
+
+def update_plot_worst_day(pltWeather, hists):
+    # show the worst day histograms 'hists' (see plotData.worstDayHists)
+    for durType in PlotData.dailyTypes:
+        pltWeather['histSources'][durType].data = hists[durType]
+    pltWeather['pltBotRight'].x_range.start, pltWeather['pltBotRight'].x_range.end = hists['xRange']
+
+#######################################################################
+# Correlations of the weather with the daily delays and taxiing times at all
+# the top airports (a heatmap of airport x weather parameter)
+#######################################################################
+def make_plot_corr(weatherParams):
+    #######################################################################
+    # build the (empty) correlation heatmap with a column per weather parameter
+    # and return a dictionary of the 'layout', the figure and its 'source'
+    #######################################################################
+    source = BokehModels.ColumnDataSource(data={'City': [], 'param': [], 'r': [], 'slope': [], 'days': []})
+    mapper = BokehModels.LinearColorMapper(palette=BokehPalettes.RdBu11, low=-1, high=1, nan_color='lightgrey')
+
+    plt = BokehPlotting.figure(
+                             title='Correlation of the weather with the daily delays',
+                             x_range=BokehModels.FactorRange(factors=list(weatherParams)),
+                             y_range=BokehModels.FactorRange(factors=[]),
+                             x_axis_location='above',
+                             plot_width=900, plot_height=400,
+                             tools=TOOLS,
+                             tooltips=[('Airport', '@City'),
+                                       ('Param', '@param'),
+                                       ('Correlation', '@r{0.00}'),
+                                       ('Slope', '@slope{0.00} mins per unit'),
+                                       ('Days', '@days')])
+    plt.rect(x='param', y='City', width=1, height=1, source=source,
+             fill_color={'field': 'r', 'transform': mapper}, line_color=None)
+    plt.add_layout(BokehModels.ColorBar(color_mapper=mapper, location=(0, 0), width=12), 'right')
+    plt.xaxis.major_label_orientation = 1.0
+    plt.grid.grid_line_color = None
+    style(plt)
+    plt.xaxis.major_label_text_font_size = '10pt'
+    plt.yaxis.major_label_text_font_size = '8pt'
+
+    return {'layout': plt,
+            'plt': plt,
+            'source': source}
+
+def update_plot_corr(pltCorr, corrData, durType):
+    # show the correlations 'corrData' (see plotData.correlationData) of the daily mean of 'durType'
+    pltCorr['source'].data = {x: corrData[x] for x in ['City', 'param', 'r', 'slope', 'days']}
+    pltCorr['plt'].x_range.factors = corrData['params']
+    # the most weather-sensitive airports at the top
+    pltCorr['plt'].y_range.factors = corrData['airports'][::-1]
+    pltCorr['plt'].plot_height = max(400, 120 + 14*len(corrData['airports']))
+    pltCorr['plt'].title.text = f'Correlation of the weather with the daily mean {durTypeLabels[durType]}'
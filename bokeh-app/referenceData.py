@@ -0,0 +1,82 @@
+#######################################################################
+# Cached reference tables for the Flight_onTime bokeh-app
+#
+# The airline names ('Carriers.csv'), the airport locations
+# ('Airport_locations.csv') and the weather station list ('isd-history.txt')
+# rarely change, but parsing them is a noticeable part of every load.  Each
+# table is parsed once into the columnar cache (see columnStore.py) and later
+# loads read the cached columns directly.  A cached table is keyed on the
+# size and modification time of its source file (and, for the stations, on
+# the month), so it is rebuilt automatically when the source changes.
+#######################################################################
+import pandas as Pandas
+import os as Os
+import columnStore as ColumnStore
+
+def cachedTable(storeDir, sourceFile, builder, useCache=True):
+    #######################################################################
+    # return the frame 'builder()' made from 'sourceFile', from the cache in
+    # 'storeDir' when it is up to date (it is (re)built otherwise)
+    #######################################################################
+    if (useCache):
+        frame = ColumnStore.loadColumns(storeDir, [sourceFile], mmap=False)
+        if frame is not None:
+            return frame
+    frame = builder().reset_index(drop=True)
+    if (useCache):
+        ColumnStore.saveColumns(frame, storeDir, [sourceFile])
+    return frame
+
+def readAirlines(airlinesFile):
+    # return the airline codes and names ('CAR', 'Airline')
+    airlineData = Pandas.read_csv(airlinesFile, index_col=False)
+    airlineData.columns = ['CAR', 'Airline']
+    return airlineData
+
+def readAirports(airportInfoFile, colNos, colNames):
+    #######################################################################
+    # return the columns 'colNos' (named 'colNames', among them 'Airport',
+    # 'City', 'LAT' and 'LON') of the airports with a location.  'City' is
+    # suffixed with the initials of the airport name.
+    #######################################################################
+    airportData = Pandas.read_csv(airportInfoFile, index_col=False, usecols=colNos)
+    # 'usecols' keeps the file order, put the columns in the order of 'colNos'
+    airportData = airportData.iloc[:, Pandas.Index(colNos).argsort().argsort()]
+    airportData.columns = colNames
+    airportData = airportData.dropna(subset=['LAT', 'LON'])
+    airportData['City'] = airportData['City'] + ' - ' + airportData['Airport'].apply(lambda x: ''.join([y[0] for y in x.split()]))
+    return airportData
+
+def readStations(weatherStatLocFile, yyyymm):
+    #######################################################################
+    # return the 'STN', 'WBAN', 'LAT', 'LON' of the weather stations that are
+    # active during the whole month 'yyyymm' and have a valid location
+    #######################################################################
+    weatherStatData = Pandas.read_fwf(weatherStatLocFile,
+                                      names = ['STN', 'WBAN', 'STN_Name', 'CTRY', 'ST', 'CALL',
+                                               'LAT', 'LON', 'ELEV_M', 'BEGIN', 'END'],
+                                               header = None,
+                                               colspecs = [(0,6), (7,12), (13,42), (43,47), (48,50), (51,56),
+                                                           (57,64), (65,73), (74,81), (82,90), (91,99)],
+                                               delim_whitespace=True, skiprows=22)
+    weatherStatData = weatherStatData.loc[(weatherStatData['BEGIN'] < int(yyyymm + '01')) &
+                                          (weatherStatData['END'] > int(yyyymm + '31'))].copy()
+    weatherStatData['LAT'] = Pandas.to_numeric(weatherStatData['LAT'], errors='coerce')
+    weatherStatData['LON'] = Pandas.to_numeric(weatherStatData['LON'], errors='coerce')
+    weatherStatData = weatherStatData.dropna(subset=['LAT', 'LON'])
+    return weatherStatData[['STN', 'WBAN', 'LAT', 'LON']]
+
+def airlineTable(airlinesFile, storeRoot, useCache=True):
+    # the (cached) airline table, see readAirlines
+    return cachedTable(Os.path.join(storeRoot, 'airlines'), airlinesFile,
+                       lambda: readAirlines(airlinesFile), useCache)
+
+def airportTable(airportInfoFile, colNos, colNames, storeRoot, useCache=True):
+    # the (cached) airport table, see readAirports
+    return cachedTable(Os.path.join(storeRoot, 'airports'), airportInfoFile,
+                       lambda: readAirports(airportInfoFile, colNos, colNames), useCache)
+
+def stationTable(weatherStatLocFile, yyyymm, storeRoot, useCache=True):
+    # the (cached) weather station table of the month 'yyyymm', see readStations
+    return cachedTable(Os.path.join(storeRoot, 'stations-' + yyyymm), weatherStatLocFile,
+                       lambda: readStations(weatherStatLocFile, yyyymm), useCache)
@@ -0,0 +1,76 @@
+#######################################################################
+# Cache of computed plot data for the Flight_onTime bokeh-app
+#
+# The plot data of a selection (the delay histograms of an airport and
+# airline, the daily stats and worst day histograms of an airport, see
+# plotData.py) only depends on the month and the widget values, so it is
+# computed once per server process and shared by all the sessions.  The cache
+# is a least recently used one, bounded to 'resultCacheBudget' bytes
+# ('FLIGHT_ONTIME_RESULT_CACHE_MB', 256 MB by default, 0 turns it off).
+#
+# The cached results are shared: they must be treated as read-only (bokeh
+# copies the columns it is given into its own data sources).
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+import collections as Collections
+import os as Os
+import threading as Threading
+
+resultCacheBudget = int(Os.environ.get('FLIGHT_ONTIME_RESULT_CACHE_MB', '256'))*1024**2
+
+_results = Collections.OrderedDict()    # key: (result, size in bytes)
+_resultLock = Threading.Lock()
+cacheStats = {'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0, 'bytes': 0}
+
+def resultBytes(result):
+    # return the (approximate) number of bytes held by 'result' (nested dicts, lists, tuples, arrays and frames)
+    if isinstance(result, Numpy.ndarray):
+        return result.nbytes
+    if isinstance(result, (Pandas.DataFrame, Pandas.Series)):
+        return int(Numpy.sum(result.memory_usage(index=True, deep=True)))
+    if isinstance(result, dict):
+        return sum(resultBytes(x) for x in result.values())
+    if isinstance(result, (list, tuple)):
+        return sum(resultBytes(x) for x in result)
+    return 8
+
+def cached(key, compute):
+    #######################################################################
+    # return the result cached for 'key' (a tuple starting with the kind of
+    # result and the month), calling 'compute()' to compute it on a miss.
+    # Two sessions missing the same key at the same time may both compute it.
+    #######################################################################
+    with _resultLock:
+        if key in _results:
+            _results.move_to_end(key)
+            cacheStats['hits'] += 1
+            return _results[key][0]
+        cacheStats['misses'] += 1
+    result = compute()
+    size = resultBytes(result)
+    if size > resultCacheBudget:
+        return result
+    with _resultLock:
+        if key not in _results:
+            cacheStats['bytes'] += size
+        else:
+            cacheStats['bytes'] += size - _results[key][1]
+        _results[key] = (result, size)
+        while cacheStats['bytes'] > resultCacheBudget:
+            cacheStats['bytes'] -= _results.popitem(last=False)[1][1]
+            cacheStats['evictions'] += 1
+        cacheStats['entries'] = len(_results)
+    return result
+
+def dropMonth(yyyymm):
+    # drop the cached results of the month 'yyyymm' (e.g. when its data store is rebuilt)
+    with _resultLock:
+        for key in [x for x in _results if x[1] == yyyymm]:
+            cacheStats['bytes'] -= _results.pop(key)[1]
+        cacheStats['entries'] = len(_results)
+
+def cacheReport():
+    # return a copy of the hit/miss counters, the number of entries and their size
+    with _resultLock:
+        return dict(cacheStats)
@@ -0,0 +1,54 @@
+#######################################################################
+# Server lifecycle hooks for the Flight_onTime bokeh-app
+#
+# 'on_server_loaded' runs once per server process, before any session is
+# created.  It builds the shared data store (see dataStore.py) so that the
+# per-session main.py only has to construct the widgets and figures, and
+# starts the metrics endpoint (see perfMetrics.py) and the periodic check for
+# days appended to the months (see incremental.py).
+#######################################################################
+import dataStore as DataStore
+import incremental as Incremental
+import perfMetrics as PerfMetrics
+import plotData as PlotData
+import resultCache as ResultCache
+
+def on_server_loaded(server_context):
+    # Build the shared, read-only data used by every session
+    DataStore.getDataStore()
+    if PerfMetrics.metricsOn and PerfMetrics.metricsPort:
+        startMetricsServer(PerfMetrics.metricsPort)
+    if Incremental.appendCheckSeconds:
+        startAppendCheck(Incremental.appendCheckSeconds)
+
+def startAppendCheck(seconds):
+    # fold the batches appended to the built months into them every 'seconds', in the worker pool
+    import tornado.ioloop as TornadoIOLoop
+    TornadoIOLoop.PeriodicCallback(lambda: PlotData.executor.submit(Incremental.refreshMonths), seconds*1000).start()
+
+def startMetricsServer(port):
+    #######################################################################
+    # Serve the metrics of all the server processes as JSON at
+    # http://<host>:'port'/metrics (bokeh serve has no hook for extra
+    # handlers of its own).  Every process listens on 'port' (SO_REUSEPORT)
+    # and publishes its metrics for the others every 'publishSeconds'.
+    #######################################################################
+    import tornado.httpserver as TornadoHttpServer
+    import tornado.ioloop as TornadoIOLoop
+    import tornado.netutil as TornadoNetutil
+    import tornado.web as TornadoWeb
+
+    class MetricsHandler(TornadoWeb.RequestHandler):
+        def get(self):
+            self.write(PerfMetrics.allMetrics({'resultCache': ResultCache.cacheReport()}))
+
+    try:
+        sockets = TornadoNetutil.bind_sockets(port, reuse_port=True)
+    except (OSError, ValueError) as e:
+        print(f'Metrics endpoint not started on port {port}: {e}')
+        return
+    metricsServer = TornadoHttpServer.HTTPServer(TornadoWeb.Application([('/metrics', MetricsHandler)]))
+    metricsServer.add_sockets(sockets)
+    publish = lambda: PerfMetrics.publishMetrics({'resultCache': ResultCache.cacheReport()})
+    publish()
+    TornadoIOLoop.PeriodicCallback(publish, PerfMetrics.publishSeconds*1000).start()
@@ -0,0 +1,95 @@
+#######################################################################
+# Spatial index of weather stations for the Flight_onTime bokeh-app
+#
+# The index is built once over the stations that are active during the month
+# of interest.  Station locations are stored as unit vectors on the sphere, so
+# that the great-circle distance between two points is a monotonic function of
+# the chord length between their unit vectors.  All queries are batched: the
+# locations of every airport are answered with a few NumPy matrix operations,
+# instead of one Python-level pass over the station table per airport.
+#######################################################################
+import numpy as Numpy
+
+earthRadius = 6371.0    # km
+queryChunk = 256        # number of query points handled per matrix product
+
+def haversine(lat1, lon1, lat2, lon2):
+    #######################################################################
+    # Vectorized Haversine formula: return the distance (in km) between
+    # ('lat1', 'lon1') and ('lat2', 'lon2').  Arguments are in degrees and
+    # may be scalars or (broadcastable) arrays.
+    #######################################################################
+    lat1, lon1, lat2, lon2 = [Numpy.radians(Numpy.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2)]
+    a = Numpy.sin((lat2 - lat1)/2)**2 + Numpy.cos(lat1)*Numpy.cos(lat2)*Numpy.sin((lon2 - lon1)/2)**2
+    return 2*earthRadius*Numpy.arcsin(Numpy.sqrt(Numpy.clip(a, 0, 1)))
+
+def unitVectors(lat, lon):
+    # return an (N x 3) array of unit vectors for the given 'lat', 'lon' (degrees)
+    lat, lon = Numpy.radians(Numpy.asarray(lat, dtype=float)), Numpy.radians(Numpy.asarray(lon, dtype=float))
+    return Numpy.column_stack([Numpy.cos(lat)*Numpy.cos(lon), Numpy.cos(lat)*Numpy.sin(lon), Numpy.sin(lat)])
+
+def chordToKm(chord):
+    # convert a chord length between unit vectors into a great-circle distance (km)
+    return 2*earthRadius*Numpy.arcsin(Numpy.clip(chord/2, 0, 1))
+
+def kmToChord(dist):
+    # convert a great-circle distance (km) into a chord length between unit vectors
+    return 2*Numpy.sin(Numpy.minimum(Numpy.asarray(dist, dtype=float)/(2*earthRadius), Numpy.pi/2))
+
+def buildStationIndex(weatherStatData):
+    #######################################################################
+    # given the data frame 'weatherStatData' with 'STN', 'WBAN', 'LAT', 'LON'
+    # (valid, numeric locations) return the station index: a dictionary of the
+    # station identifiers and their unit vectors
+    #######################################################################
+    return {'STN': weatherStatData['STN'].to_numpy(),
+            'WBAN': weatherStatData['WBAN'].to_numpy(),
+            'LAT': weatherStatData['LAT'].to_numpy(dtype=float),
+            'LON': weatherStatData['LON'].to_numpy(dtype=float),
+            'XYZ': unitVectors(weatherStatData['LAT'], weatherStatData['LON'])}
+
+def chordDistances(stationIndex, lat, lon):
+    #######################################################################
+    # generator over chunks of the query points ('lat', 'lon'), yielding the
+    # slice of query points and the (chunk x stations) chord lengths
+    #######################################################################
+    queryXYZ = unitVectors(Numpy.atleast_1d(lat), Numpy.atleast_1d(lon))
+    for start in range(0, len(queryXYZ), queryChunk):
+        chunk = slice(start, start + queryChunk)
+        # |u - v|^2 = 2 - 2 u.v for unit vectors
+        chord2 = 2 - 2*(queryXYZ[chunk] @ stationIndex['XYZ'].T)
+        yield chunk, Numpy.sqrt(Numpy.clip(chord2, 0, 4))
+
+def queryNearest(stationIndex, lat, lon, k=1):
+    #######################################################################
+    # return the positions (in the index) of the 'k' nearest stations to each
+    # of the query points ('lat', 'lon') and their distances (km), both as
+    # (points x k) arrays ordered from nearest to farthest
+    #######################################################################
+    numPoints = len(Numpy.atleast_1d(lat))
+    k = min(k, len(stationIndex['XYZ']))
+    nearestPos = Numpy.empty((numPoints, k), dtype=Numpy.int64)
+    nearestDist = Numpy.empty((numPoints, k))
+    for chunk, chord in chordDistances(stationIndex, lat, lon):
+        candPos = Numpy.argpartition(chord, k - 1, axis=1)[:, :k]
+        candChord = Numpy.take_along_axis(chord, candPos, axis=1)
+        order = Numpy.argsort(candChord, axis=1, kind='stable')
+        nearestPos[chunk] = Numpy.take_along_axis(candPos, order, axis=1)
+        nearestDist[chunk] = chordToKm(Numpy.take_along_axis(candChord, order, axis=1))
+    return nearestPos, nearestDist
+
+def queryRadius(stationIndex, lat, lon, radius):
+    #######################################################################
+    # return, for each query point ('lat', 'lon'), the positions (in the index)
+    # of all the stations within 'radius' km and their distances, as two lists
+    # of arrays ordered from nearest to farthest
+    #######################################################################
+    maxChord = kmToChord(radius)
+    withinPos, withinDist = [], []
+    for chunk, chord in chordDistances(stationIndex, lat, lon):
+        for rowChord in chord:
+            rowPos = Numpy.flatnonzero(rowChord <= maxChord)
+            rowPos = rowPos[Numpy.argsort(rowChord[rowPos], kind='stable')]
+            withinPos.append(rowPos)
+            withinDist.append(chordToKm(rowChord[rowPos]))
+    return withinPos, withinDist
@@ -0,0 +1,182 @@
+#######################################################################
+# Weather station fetch and parse pipeline for the Flight_onTime bokeh-app
+#
+# With 'rawData' the daily weather of every station of interest is read from
+# the NCDC GSOD yearly station files ('STN-WBAN-YYYY.op.gz').  Missing files
+# are fetched (when downloading is enabled) from the 'weatherSource', by a pool
+# of threads: an FTP server ('ftp://host[:port]/path', the NCDC site by
+# default, or any local stand-in) or a local directory of the same layout
+# ('<source>/YYYY/STN-WBAN-YYYY.op.gz').  As each file arrives it is parsed
+# straight from its gzip stream in a pool of processes.  Progress and failures
+# are reported station by station, and the frames are returned per station so
+# that the caller concatenates them once.
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+import os as Os
+import shutil as Shutil
+import ftplib as Ftplib
+import urllib.parse as UrlParse
+import concurrent.futures as Futures
+
+ncdcSource = 'ftp://ftp.ncdc.noaa.gov/pub/data/gsod/'
+#######################################################################
+# GSOD fields with a 'missing' value: (column, sentinel, replacement)
+#######################################################################
+sentinelTable = [('TEMP',       9999.9, -50),
+                 ('DEWP',       9999.9, -50),
+                 ('MAXTemp',    9999.9, -50),
+                 ('MINTemp',    9999.9, -50),
+                 ('SLPress',    9999.9, 0),
+                 ('STPress',    9999.9, 0),
+                 ('VISIB',      999.9,  -1),
+                 ('MaxWindSpd', 999.9,  -1),
+                 ('WindSpd',    999.9,  -1),
+                 ('GUST',       999.9,  -1),
+                 ('PRCP',       99.99,  0),
+                 ('SnowDep',    999.9,  0)]
+# the value each of the 'sentinelTable' fields has when it was not measured
+fillValues = {column: fill for column, sentinel, fill in sentinelTable}
+# the fill values that only ever stand for a missing reading: a PRCP or SnowDep of 0 is
+# mostly a dry or snow-free day (the rare unmeasured day cannot be told apart from it)
+missingValues = {column: fill for column, fill in fillValues.items() if column not in ['PRCP', 'SnowDep']}
+# FRSHTT digits, most significant first
+frshttFlags = ['Fog', 'Rain', 'Snow', 'Hail', 'Thunder', 'Tornado']
+
+# columns of the cleaned daily weather (see readStation)
+weatherCols = (['STN', 'WBAN', 'Date', 'TEMP', 'DEWP', 'SLPress', 'STPress', 'VISIB', 'WindSpd', 'MaxWindSpd', 'GUST',
+                'MAXTemp', 'MINTemp', 'PRCP', 'SnowDep'] + frshttFlags)
+
+def emptyWeather():
+    # return a frame of cleaned daily weather (see readStation) without any days
+    return Pandas.DataFrame({x: Pandas.Series(dtype=object if x in ['STN', 'WBAN', 'Date'] else
+                                              (Numpy.int64 if x in frshttFlags else float)) for x in weatherCols})
+
+def stationFile(stn, wban, year):
+    # return the name of the GSOD file of station ('stn', 'wban') for 'year'
+    return stn + '-' + wban + '-' + year + '.op.gz'
+
+def fetchStation(statName, year, dataDir, source=None, refresh=False):
+    #######################################################################
+    # make sure the GSOD file 'statName' of 'year' is in 'dataDir' and return
+    # its path.  With a 'source' a missing file is fetched from it (see the
+    # header), written to a temporary file and renamed into place; with
+    # 'refresh' it is fetched again even if it exists (the yearly files of
+    # the current year grow every day).
+    # Raises an exception if the file is not available.
+    #######################################################################
+    gsodFile = Os.path.join(dataDir, statName)
+    if (Os.path.exists(gsodFile) and not refresh) or (source is None):
+        if not Os.path.exists(gsodFile):
+            raise FileNotFoundError(f'{statName} is not in {dataDir}')
+        return gsodFile
+
+    tmpFile = gsodFile + '.tmp-' + str(Os.getpid()) + '-' + str(id(gsodFile))
+    try:
+        sourceUrl = UrlParse.urlsplit(source)
+        if sourceUrl.scheme == 'ftp':
+            ftpObj = Ftplib.FTP()
+            ftpObj.connect(host=sourceUrl.hostname, port=sourceUrl.port or 21, timeout=60)
+            try:
+                ftpObj.login(user=sourceUrl.username or 'anonymous', passwd=sourceUrl.password or '')
+                ftpObj.cwd(sourceUrl.path.rstrip('/') + '/' + year + '/')
+                with open(tmpFile, 'wb') as fileObj:
+                    ftpObj.retrbinary('RETR %s'%statName, fileObj.write)
+            finally:
+                ftpObj.close()
+        else:
+            sourceDir = sourceUrl.path if sourceUrl.scheme == 'file' else source
+            Shutil.copyfile(Os.path.join(sourceDir, year, statName), tmpFile)
+        Os.replace(tmpFile, gsodFile)
+    finally:
+        if Os.path.exists(tmpFile):
+            Os.remove(tmpFile)
+    return gsodFile
+
+def formatUnique(values, formatter):
+    # apply 'formatter' (to an Index) for the distinct 'values' only and return the strings of all of them
+    valueCodes, uniqueValues = Pandas.factorize(values)
+    return Numpy.asarray(formatter(uniqueValues), dtype=object)[valueCodes]
+
+def readStation(gsodFile, yyyymm):
+    #######################################################################
+    # read the GSOD file 'gsodFile' (gzipped) and return the cleaned daily
+    # weather of the month 'yyyymm' as a dataframe
+    #######################################################################
+    airpWet = Pandas.DataFrame()    # To ensure it returns an empty Dataframe if no data exists.
+    airpWet = Pandas.read_fwf(gsodFile, compression='gzip',
+                            names = ['STN', 'WBAN', 'YEARMODA', 'TEMP', 'TEMP_Count',
+                                     'DEWP', 'DEWP_Count', 'SLPress', 'SLP_Count', 'STPress', 'STP_Count',
+                                     'VISIB', 'VISIB_Count', 'WindSpd', 'WDSP_Count', 'MaxWindSpd', 'GUST',
+                                     'MAXTemp', 'MAX_Flag', 'MINTemp', 'MIN_Flag', 'PRCP', 'PRCP_Flag',
+                                     'SnowDep', 'FRSHTT'],
+                                     header = None,
+                                     colspecs = [(0,6), (7,12), (14,22), (24,30), (31,33), (35,41),
+                                                 (42,44), (46,52), (53,55), (57,63), (64,66), (68,73),
+                                                 (74,76), (78,83), (84,86), (88,93), (95,100), (102,108),
+                                                 (108, 109), (110,116), (116,117), (118,123), (123,124),
+                                                 (125,130), (132,138)],
+                                                 delim_whitespace=True, skiprows=1)
+    airpWet.drop(['TEMP_Count', 'DEWP_Count', 'SLP_Count', 'STP_Count', 'VISIB_Count',
+                  'WDSP_Count', 'MAX_Flag', 'MIN_Flag', 'PRCP_Flag'], axis=1, inplace=True)
+    #
+    # Keep the days of the month (dates parsed once into datetime64)
+    #
+    dates = Pandas.to_datetime(airpWet['YEARMODA'], format='%Y%m%d')
+    inMonth = ((dates.dt.year*100 + dates.dt.month) == int(yyyymm)).to_numpy()
+    airpWet, dates = airpWet.loc[inMonth], dates.loc[inMonth]
+    #
+    # Fill up the unmeasured values with 'unexpected' values (see 'sentinelTable')
+    # and break up the FRSHTT column into its digits
+    #
+    sentinelCols = [x[0] for x in sentinelTable]
+    sentinels = Pandas.Series([x[1] for x in sentinelTable], index=sentinelCols)
+    fills = Pandas.Series([x[2] for x in sentinelTable], index=sentinelCols)
+    airpWet[sentinelCols] = airpWet[sentinelCols].mask(airpWet[sentinelCols].eq(sentinels, axis='columns'), fills, axis='columns')
+    frshtt = airpWet['FRSHTT'].to_numpy().astype(Numpy.int64)
+    for digitNo, flagName in enumerate(frshttFlags):
+        airpWet[flagName] = (frshtt // 10**(len(frshttFlags) - 1 - digitNo)) % 10
+    airpWet.drop(['FRSHTT'], axis=1, inplace=True)
+    airpWet = airpWet.rename(columns={'YEARMODA': 'Date'})
+    airpWet['STN'] = formatUnique(airpWet['STN'], lambda x: x.astype(str).str.zfill(6))
+    airpWet['WBAN'] = formatUnique(airpWet['WBAN'], lambda x: x.astype(str).str.zfill(5))
+    #
+    airpWet['Date'] = formatUnique(dates, lambda x: x.strftime('%Y-%m-%d'))
+    #
+    return airpWet
+
+def loadStations(statNames, yyyymm, dataDir, source=None, fetchThreads=8, parseProcs=None, report=print, refresh=False):
+    #######################################################################
+    # fetch (see fetchStation, also for 'refresh') and parse (see readStation)
+    # the GSOD files 'statNames' for the month 'yyyymm' concurrently.  Returns a dictionary
+    # {statName: dataframe}; a station that could not be fetched or parsed
+    # gets an empty dataframe.  Every station is passed to 'report' as a
+    # line of progress.
+    #######################################################################
+    statNames = sorted(set(statNames))
+    stationWet = {}
+    if len(statNames) == 0:
+        return stationWet
+
+    def done(statName, status):
+        stationWet.setdefault(statName, Pandas.DataFrame())
+        report(f'Weather station {len(stationWet)}/{len(statNames)} {statName}: {status}')
+
+    with Futures.ThreadPoolExecutor(max_workers=fetchThreads) as fetchPool, \
+         Futures.ProcessPoolExecutor(max_workers=parseProcs) as parsePool:
+        fetchFutures = {fetchPool.submit(fetchStation, x, yyyymm[0:4], dataDir, source, refresh): x for x in statNames}
+        parseFutures = {}
+        for future in Futures.as_completed(fetchFutures):
+            statName = fetchFutures[future]
+            try:
+                parseFutures[parsePool.submit(readStation, future.result(), yyyymm)] = statName
+            except Exception as e:
+                done(statName, f'fetch failed ({type(e).__name__}: {e})')
+        for future in Futures.as_completed(parseFutures):
+            statName = parseFutures[future]
+            try:
+                stationWet[statName] = future.result()
+                done(statName, f'{len(stationWet[statName])} days')
+            except Exception as e:
+                done(statName, f'parse failed ({type(e).__name__}: {e})')
+    return stationWet
@@ -1,5 +1,139 @@
-from subprocess import Popen
+import os
+import sys
+import atexit
+import json
+import time
+import threading
+import urllib.request
+from subprocess import Popen, PIPE, STDOUT
+
+appUrl = 'http://localhost:5006/bokeh-app'
+# seconds a starting server may go without any output before it is taken to be stuck
+# (it prints a line as each stage of building its data starts, see bokeh-app/dataStore.py)
+readyTimeout = int(os.environ.get('FLIGHT_ONTIME_READY_TIMEOUT', '300'))
+maxRestartDelay = 60	# seconds, the delay between restarts doubles up to this
+
+status = {'state': 'starting',	# preparing, starting, building, ready, restarting
+	  'progress': [],	# last lines of output of the data preparation and the server
+	  'lastOutput': None,	# time of the last line of output of the server
+	  'timings': {},	# seconds taken by 'prepare', 'start' and 'warmup'
+	  'restarts': 0,
+	  'pid': None,
+	  'readySince': None,
+	  'lastExit': None}
+statusLock = threading.Lock()
+server = {'proc': None}
+
+@atexit.register
+def stop_server():
+	if server['proc'] is not None and server['proc'].poll() is None:
+		server['proc'].terminate()
+
+def set_status(**kwargs):
+	with statusLock:
+		status.update(kwargs)
+
+def add_progress(line):
+	with statusLock:
+		status['progress'] = (status['progress'] + [line.rstrip()])[-20:]
+
+def prepare_data():
+	"""build the shared data caches (see bokeh-app/dataStore.py) before the server takes any traffic"""
+	set_status(state='preparing')
+	startTime = time.time()
+	proc = Popen([sys.executable, os.path.join('bokeh-app', 'dataStore.py')], stdout=PIPE, stderr=STDOUT,
+		     universal_newlines=True)
+	for line in proc.stdout:
+		add_progress(line)
+	proc.wait()
+	with statusLock:
+		status['timings']['prepare'] = round(time.time() - startTime, 2)
+		if proc.returncode != 0:
+			status['progress'].append(f'data preparation failed (exit code {proc.returncode})')
+
+def follow_output(proc):
+	"""pass the output of the server on, keeping its last lines and the time of the last one in the status"""
+	for line in proc.stdout:
+		sys.stdout.write(line)
+		sys.stdout.flush()
+		add_progress(line)
+		with statusLock:
+			status['lastOutput'] = time.time()
+			if status['state'] in ('starting', 'restarting') and line.startswith('Building '):
+				status['state'] = 'building'
+
+def wait_until_ready(proc):
+	"""poll the app until it answers (the first answer also warms up a session); False if the server
+	died, or went 'readyTimeout' seconds without answering or printing anything (e.g. a build stage)"""
+	startTime = time.time()
+	while time.time() - max(startTime, status['lastOutput'] or 0) < readyTimeout:
+		if proc.poll() is not None:
+			return False
+		try:
+			with urllib.request.urlopen(appUrl, timeout=30) as response:
+				if response.status == 200:
+					with statusLock:
+						status['timings']['start'] = round(time.time() - startTime, 2)
+					return True
+		except Exception:
+			time.sleep(0.5)
+	return False
+
+def warm_up():
+	"""open one more session so that its timing (a warm session) is reported"""
+	startTime = time.time()
+	try:
+		urllib.request.urlopen(appUrl, timeout=30).close()
+		with statusLock:
+			status['timings']['warmup'] = round(time.time() - startTime, 2)
+	except Exception:
+		pass
+
+def supervise():
+	"""prepare the data, then run bokeh server and restart it whenever it exits
+
+	FLIGHT_ONTIME_NUM_PROCS sets the number of server processes (0: one per CPU); they all
+	memory-map the caches built by the preparation instead of loading their own copy.
+	A starting server is only restarted if it stops making progress (see wait_until_ready), so
+	a slow cold build of a month is waited for rather than started over and over.
+	"""
+	numProcs = os.environ.get('FLIGHT_ONTIME_NUM_PROCS', '1')
+	prepare_data()
+	restartDelay = 1
+	while True:
+		set_status(state='starting' if status['restarts'] == 0 else 'restarting', readySince=None)
+		proc = server['proc'] = Popen(["bokeh", "serve", "bokeh-app", "--allow-websocket-origin=*", "--num-procs", numProcs],
+					      stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+		set_status(pid=proc.pid)
+		threading.Thread(target=follow_output, args=(proc,), daemon=True).start()
+		if wait_until_ready(proc):
+			set_status(state='ready', readySince=time.time())
+			warm_up()
+			restartDelay = 1
+		else:
+			proc.terminate()
+		exitCode = proc.wait()
+		with statusLock:
+			status['state'] = 'restarting'
+			status['restarts'] += 1
+			status['lastExit'] = {'code': exitCode, 'time': time.time()}
+		time.sleep(restartDelay)
+		restartDelay = min(2*restartDelay, maxRestartDelay)
 
 def load_jupyter_server_extension(nbapp):
-	"""serve the bokeh-app directory with bokeh server"""
-	Popen(["bokeh", "serve", "bokeh-app", "--allow-websocket-origin=*"])
+	"""serve the bokeh-app directory with bokeh server, and report its state at <base_url>flight-ontime/health"""
+	from tornado.web import RequestHandler
+	from notebook.utils import url_path_join
+
+	class HealthHandler(RequestHandler):
+		def get(self):
+			with statusLock:
+				report = json.loads(json.dumps(status))
+			report['uptime'] = round(time.time() - report['readySince'], 1) if report['readySince'] else 0
+			self.set_status(200 if report['state'] == 'ready' else 503)
+			self.set_header('Content-Type', 'application/json')
+			self.finish(json.dumps(report))
+
+	webApp = nbapp.web_app
+	webApp.add_handlers('.*$', [(url_path_join(webApp.settings['base_url'], 'flight-ontime/health'), HealthHandler)])
+	threading.Thread(target=supervise, daemon=True).start()
@@ -0,0 +1,9 @@
+#######################################################################
+# The modules of the Flight_onTime bokeh-app are imported by name, as
+# 'bokeh serve' does from within bokeh-app
+#######################################################################
+import os as Os
+import sys as Sys
+
+appDir = Os.path.join(Os.path.dirname(Os.path.abspath(__file__)), '..', 'bokeh-app')
+Sys.path.insert(0, appDir)
@@ -0,0 +1,52 @@
+#######################################################################
+# GSOD yearly station files ('STN-WBAN-YYYY.op.gz') for the weather tests,
+# written from the cleaned daily weather (the inverse of readStation in
+# weatherFetch.py): values that were filled in are written as their sentinel
+#######################################################################
+import gzip as Gzip
+import os as Os
+import weatherFetch as WeatherFetch
+
+gsodHeader = ('STN--- WBAN   YEARMODA    TEMP       DEWP      SLP        STP       VISIB      WDSP     MXSPD   GUST    '
+              'MAX     MIN   PRCP   SNDP   FRSHTT')
+# (field, first and last column, decimals) of the values of a GSOD line
+gsodFields = [('TEMP', 24, 30, 1), ('DEWP', 35, 41, 1), ('SLPress', 46, 52, 1), ('STPress', 57, 63, 1),
+              ('VISIB', 68, 73, 1), ('WindSpd', 78, 83, 1), ('MaxWindSpd', 88, 93, 1), ('GUST', 95, 100, 1),
+              ('MAXTemp', 102, 108, 1), ('MINTemp', 110, 116, 1), ('PRCP', 118, 123, 2), ('SnowDep', 125, 130, 1)]
+countFields = [(31, 33), (42, 44), (53, 55), (64, 66), (74, 76), (84, 86)]
+sentinels = {column: sentinel for column, sentinel, fill in WeatherFetch.sentinelTable}
+
+def gsodLine(stn, wban, yyyymmdd, values, frshtt='000000', flags=None):
+    #######################################################################
+    # return the GSOD line of a station day: 'values' maps the fields of
+    # 'gsodFields' to their value (None: missing, written as the sentinel),
+    # 'flags' the columns 108, 116 and 123 to a flag character
+    #######################################################################
+    line = [' ']*138
+    def place(start, stop, text):
+        line[start:stop] = list(str(text).rjust(stop - start))
+    place(0, 6, stn)
+    place(7, 12, wban)
+    place(14, 22, yyyymmdd)
+    for field, start, stop, decimals in gsodFields:
+        value = values.get(field)
+        place(start, stop, f'{sentinels[field] if value is None else value:.{decimals}f}')
+    for start, stop in countFields:
+        place(start, stop, '24')
+    for column, flag in (flags or {}).items():
+        place(column, column + 1, flag)
+    place(132, 138, frshtt)
+    return ''.join(line)
+
+def cleanedLine(row):
+    # return the GSOD line of a row of cleaned weather (see readStation); filled in values become sentinels
+    values = {field: (None if row[field] == WeatherFetch.fillValues[field] else row[field]) for field, *x in gsodFields}
+    frshtt = ''.join(str(int(row[x])) for x in WeatherFetch.frshttFlags)
+    return gsodLine(row['STN'], row['WBAN'], row['Date'].replace('-', ''), values, frshtt)
+
+def writeStation(dataDir, statName, lines):
+    # write the GSOD file 'statName' with the header and 'lines' to 'dataDir' and return its path
+    gsodFile = Os.path.join(dataDir, statName)
+    with Gzip.open(gsodFile, 'wt') as fileObj:
+        fileObj.write('\n'.join([gsodHeader] + list(lines)) + '\n')
+    return gsodFile
@@ -0,0 +1,101 @@
+#######################################################################
+# The columnar store (columnStore.py) under concurrent writers and readers,
+# and the derived flight store (loadFlightDur in dataStore.py) built by
+# several server processes at once
+#######################################################################
+import multiprocessing as Multiprocessing
+import os as Os
+import sys as Sys
+import numpy as Numpy
+import pandas as Pandas
+
+Sys.path.insert(0, Os.path.join(Os.path.dirname(Os.path.abspath(__file__)), '..', 'benchmarks'))
+import syntheticData as SyntheticData
+import columnStore as ColumnStore
+import dataStore as DataStore
+
+yyyymm = '201801'
+
+def versionFrame(version, rows=20000):
+    # a frame whose every value tells the version it was written as
+    return Pandas.DataFrame({'version': Numpy.full(rows, version, dtype=Numpy.int64),
+                             'name': Numpy.full(rows, 'v' + str(version), dtype=object)})
+
+def writeVersions(storeDir, first, count):
+    for version in range(first, first + count):
+        ColumnStore.saveColumns(versionFrame(version), storeDir)
+
+def readVersions(storeDir, count, results):
+    #######################################################################
+    # load the store 'count' times and put the number of loads that found no
+    # store or a store mixing versions into 'results'
+    #######################################################################
+    missing = mixed = 0
+    for loadNo in range(count):
+        frame = ColumnStore.loadColumns(storeDir)
+        if frame is None:
+            missing += 1
+        elif (frame['version'].nunique() != 1) or (set(frame['name']) != {'v' + str(frame['version'].iloc[0])}):
+            mixed += 1
+    results.put((missing, mixed))
+
+def test_readers_see_whole_stores_while_writers_replace_them(tmp_path):
+    storeDir = str(tmp_path/'store')
+    ColumnStore.saveColumns(versionFrame(0), storeDir)
+    context = Multiprocessing.get_context('fork')
+    results = context.Queue()
+    procs = ([context.Process(target=writeVersions, args=(storeDir, 1 + 100*x, 30)) for x in range(3)] +
+             [context.Process(target=readVersions, args=(storeDir, 200, results)) for x in range(3)])
+    for proc in procs:
+        proc.start()
+    readerResults = [results.get(timeout=120) for x in range(3)]
+    for proc in procs:
+        proc.join(timeout=120)
+        assert proc.exitcode == 0
+    assert readerResults == [(0, 0)]*3
+    # only the current version is left
+    frame = ColumnStore.loadColumns(storeDir)
+    assert frame['version'].iloc[0] in [30, 130, 230]
+    assert sorted(x for x in Os.listdir(str(tmp_path)) if not x.endswith('.lock')) == ['store', Os.path.basename(Os.path.realpath(storeDir))]
+
+def test_store_of_the_unversioned_layout_is_replaced(tmp_path):
+    storeDir = str(tmp_path/'store')
+    Os.makedirs(storeDir)
+    with open(Os.path.join(storeDir, ColumnStore.manifestFile), 'w') as fileObj:
+        fileObj.write('{}')
+    ColumnStore.saveColumns(versionFrame(1), storeDir)
+    assert Os.path.islink(storeDir)
+    assert ColumnStore.loadColumns(storeDir)['version'].iloc[0] == 1
+
+def loadInProcess(buildLog, results):
+    # load the month's durations as a server process does, logging every build of the store to 'buildLog'
+    buildFlightDur = DataStore.buildFlightDur
+    def loggedBuild(yyyymm):
+        with open(buildLog, 'a') as fileObj:
+            fileObj.write(str(Os.getpid()) + '\n')
+        return buildFlightDur(yyyymm)
+    DataStore.buildFlightDur = loggedBuild
+    flightDur, memoryReport = DataStore.loadFlightDur(yyyymm)
+    results.put((len(flightDur), int(flightDur['DURATION'].sum()), memoryReport))
+
+def test_processes_build_the_flight_store_once(tmp_path, monkeypatch):
+    dataDir = str(tmp_path/'data')
+    SyntheticData.writeDataDir(dataDir, yyyymm, scale=0.05, seed=1)
+    monkeypatch.setattr(DataStore, 'baseDir', Os.path.join(dataDir, ''))
+    monkeypatch.setattr(DataStore, 'cacheDir', Os.path.join(dataDir, 'cache', ''))
+    monkeypatch.setattr(DataStore, 'reportMemory', False)
+    buildLog = str(tmp_path/'builds.log')
+    context = Multiprocessing.get_context('fork')
+    results = context.Queue()
+    procs = [context.Process(target=loadInProcess, args=(buildLog, results)) for x in range(4)]
+    for proc in procs:
+        proc.start()
+    loaded = [results.get(timeout=300) for x in procs]
+    for proc in procs:
+        proc.join(timeout=60)
+        assert proc.exitcode == 0
+    assert all(x == loaded[0] for x in loaded)
+    with open(buildLog) as fileObj:
+        assert len(fileObj.read().split()) == 1
+    flightDur, memoryReport = DataStore.loadFlightDur(yyyymm)
+    assert (len(flightDur), int(flightDur['DURATION'].sum()), memoryReport) == loaded[0]
@@ -0,0 +1,80 @@
+#######################################################################
+# Weather/delay correlations (correlations.py) against a direct per group
+# Numpy.corrcoef / Numpy.polyfit, with missing readings and dry days
+#######################################################################
+import numpy as Numpy
+import pandas as Pandas
+import pytest
+import correlations as Correlations
+import weatherFetch as WeatherFetch
+
+params = ['TEMP', 'GUST', 'PRCP', 'VISIB']
+
+def dailyFrame(seed=0, days=31, airports=(10, 11, 12), missingShare=0.3):
+    #######################################################################
+    # daily mean delays with weather: a share of the readings replaced by the
+    # value that stands for a missing one (a few means by NaN), and a share of
+    # the PRCP readings 0 (dry days)
+    #######################################################################
+    rng = Numpy.random.default_rng(seed)
+    rows = []
+    for airport in airports:
+        for durType in ['ARR_DEL', 'DEP_DEL']:
+            frame = Pandas.DataFrame({'AIRPORT_ID': airport, 'Type': durType, 'Day': Numpy.arange(1, days + 1)})
+            for param in params:
+                frame[param] = rng.normal(20, 8, days).round(1)
+            frame['mean'] = 2*frame['TEMP'] - frame['GUST'] + rng.normal(0, 5, days)
+            frame.loc[rng.random(days) < 0.6, 'PRCP'] = 0.0
+            frame['mean'] += 3*frame['PRCP']
+            for param in [x for x in params if x in WeatherFetch.missingValues]:
+                frame.loc[rng.random(days) < missingShare, param] = WeatherFetch.missingValues[param]
+            frame.loc[rng.random(days) < missingShare/6, 'mean'] = Numpy.nan
+            rows.append(frame)
+    return Pandas.concat(rows, ignore_index=True).sample(frac=1, random_state=seed)
+
+def expected(frame, param):
+    # r, slope and days of one group by a direct computation over its valid days
+    valid = frame[param].ne(WeatherFetch.missingValues.get(param, Numpy.nan)) & frame['mean'].notna() & frame[param].notna()
+    x, y = frame.loc[valid, param].to_numpy(), frame.loc[valid, 'mean'].to_numpy()
+    if len(x) < Correlations.minCorrDays:
+        return Numpy.nan, Numpy.nan, len(x)
+    return Numpy.corrcoef(x, y)[0, 1], Numpy.polyfit(x, y, 1)[0], len(x)
+
+def test_matches_corrcoef_and_polyfit_with_missing_days():
+    frame = dailyFrame()
+    corr = Correlations.weatherCorrelations(frame, ['AIRPORT_ID', 'Type'], 'mean', params, WeatherFetch.missingValues)
+    assert len(corr) == 3*2*len(params)
+    for (airport, durType), group in frame.groupby(['AIRPORT_ID', 'Type']):
+        for param in params:
+            row = corr.loc[(corr['AIRPORT_ID'] == airport) & (corr['Type'] == durType) & (corr['param'] == param)].iloc[0]
+            r, slope, days = expected(group, param)
+            assert row['days'] == days
+            assert days < len(group) or param == 'PRCP'
+            Numpy.testing.assert_allclose([row['r'], row['slope']], [r, slope], rtol=1e-9, atol=1e-12)
+
+def test_fill_values_are_not_correlated():
+    # a parameter that is only ever its fill value has no valid day
+    frame = dailyFrame(seed=1)
+    frame['GUST'] = WeatherFetch.missingValues['GUST']
+    corr = Correlations.weatherCorrelations(frame, ['AIRPORT_ID', 'Type'], 'mean', params, WeatherFetch.missingValues)
+    gust = corr.loc[corr['param'] == 'GUST']
+    assert (gust['days'] == 0).all()
+    assert gust['r'].isna().all() and gust['slope'].isna().all()
+
+def test_dry_days_are_correlated():
+    # a PRCP of 0 is a reading: the dry days are in 'days' and in r
+    frame = dailyFrame(seed=3, missingShare=0)
+    assert (frame['PRCP'] == 0).mean() > 0.4
+    corr = Correlations.weatherCorrelations(frame, ['AIRPORT_ID', 'Type'], 'mean', ['PRCP'], WeatherFetch.missingValues)
+    for (airport, durType), group in frame.groupby(['AIRPORT_ID', 'Type']):
+        row = corr.loc[(corr['AIRPORT_ID'] == airport) & (corr['Type'] == durType)].iloc[0]
+        valid = group['mean'].notna()
+        assert row['days'] == valid.sum() and row['days'] > (group['PRCP'] != 0).sum()
+        Numpy.testing.assert_allclose(row['r'], Numpy.corrcoef(group.loc[valid, 'PRCP'], group.loc[valid, 'mean'])[0, 1], rtol=1e-9)
+
+@pytest.mark.parametrize('days', [Correlations.minCorrDays - 1, Correlations.minCorrDays])
+def test_groups_with_too_few_days(days):
+    frame = dailyFrame(seed=2, days=days, airports=(10,), missingShare=0)
+    corr = Correlations.weatherCorrelations(frame, ['AIRPORT_ID', 'Type'], 'mean', params, WeatherFetch.missingValues)
+    assert (corr['days'] == days).all()
+    assert corr['r'].isna().all() == (days < Correlations.minCorrDays)
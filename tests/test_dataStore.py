@@ -0,0 +1,47 @@
+#######################################################################
+# The data pipeline (dataStore.py) from raw files
+#######################################################################
+import os as Os
+import numpy as Numpy
+import pandas as Pandas
+import dataStore as DataStore
+import weatherFetch as WeatherFetch
+
+yyyymm = '201801'
+referenceFiles = [DataStore.airportInfoFile, DataStore.airlinesFile, DataStore.weatherStatLocFile]
+
+def writeRawFlights(dataDir, flightCount=2000, seed=0):
+    #######################################################################
+    # write a BTS On-Time csv (all the columns of 'flightColsFull') of random
+    # flights between a few US airports on two days of the month
+    #######################################################################
+    randGen = Numpy.random.default_rng(seed)
+    airportData = Pandas.read_csv(Os.path.join(dataDir, DataStore.airportInfoFile), index_col=False)
+    airportData = airportData.loc[(airportData['AIRPORT_IS_LATEST'] == 1) & (airportData['AIRPORT_COUNTRY_CODE_ISO'] == 'US')]
+    airports = airportData.dropna(subset=['LATITUDE', 'LONGITUDE'])['AIRPORT_SEQ_ID'].to_numpy()[0:4]
+    rawFlights = Pandas.DataFrame({x: '' for x in DataStore.flightColsFull}, index=range(flightCount))
+    rawFlights['Date'] = randGen.choice([yyyymm[0:4] + '-' + yyyymm[4:6] + '-0' + str(x) for x in [1, 2]], flightCount)
+    rawFlights['CAR'] = randGen.choice(['AA', 'DL'], flightCount)
+    rawFlights['ORIGIN_ID'] = randGen.choice(airports, flightCount)
+    rawFlights['DEST_ID'] = randGen.choice(airports, flightCount)
+    for colName in ['DEP_DEL', 'DEP_TAXI', 'ARR_TAXI', 'ARR_DEL']:
+        rawFlights[colName] = randGen.integers(-10, 60, flightCount).astype(float)
+    rawFlights.to_csv(Os.path.join(dataDir, DataStore.flightFilePrefix + yyyymm + '.csv'), index=False)
+
+def test_raw_build_without_weather_data(tmp_path, monkeypatch):
+    # none of the stations has a GSOD file: the weather is empty and the plots have no daily stats
+    dataDir = str(tmp_path)
+    for fileName in referenceFiles:
+        Os.symlink(Os.path.abspath(Os.path.join(Os.path.dirname(DataStore.__file__), DataStore.baseDir + fileName)),
+                   Os.path.join(dataDir, fileName))
+    writeRawFlights(dataDir)
+    monkeypatch.setattr(DataStore, 'baseDir', Os.path.join(dataDir, ''))
+    monkeypatch.setattr(DataStore, 'cacheDir', Os.path.join(dataDir, 'cache', ''))
+    monkeypatch.setattr(DataStore, 'rawData', True)
+    monkeypatch.setattr(DataStore, 'weatherSource', None)
+    monkeypatch.setattr(DataStore, 'weatherParseProcs', 1)
+    monkeypatch.setattr(DataStore, 'reportMemory', False)
+    dataStore = DataStore.buildDataStore(yyyymm)
+    assert len(dataStore['airportList']) > 0 and len(dataStore['durationHists']) > 0
+    assert len(dataStore['airpWet']) == 0 and list(dataStore['airpWet'].columns) == WeatherFetch.weatherCols
+    assert len(dataStore['dailyIndex']['frame']) == 0
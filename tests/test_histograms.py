@@ -0,0 +1,88 @@
+#######################################################################
+# Re-binning of the cumulative histograms (rebin in histograms.py) against
+# Numpy.histogram of the durations themselves, and the re-binning in the
+# browser (rebinCode in plots.py) against rebin
+#######################################################################
+import math as Math
+import numpy as Numpy
+import pytest
+import histograms as Histograms
+import plotData as PlotData
+import plots as Plots
+
+binWidths = range(1, 31)
+
+def durationGroups(seed=0):
+    # return groups of whole minute durations: random ones of several spreads, a single value and no value
+    randGen = Numpy.random.default_rng(seed)
+    groups = [randGen.integers(low, high, size) for low, high, size in
+              [(-30, 300, 5000), (0, 10, 200), (-5, 40, 30), (15, 16, 7), (0, 1000, 3), (-60, -20, 50)]]
+    groups += [Numpy.array([42]), Numpy.array([7, 7, 7]), Numpy.array([3, 4]), Numpy.array([], dtype=int)]
+    return groups
+
+def numpyHist(values, binW):
+    # the reference: the histogram of the values for the bins of width 'binW' from the group minimum
+    if len(values) == 0:
+        edges = Numpy.arange(0, 0, binW, dtype=float)
+    else:
+        edges = Numpy.arange(values.min(), values.max(), binW, dtype=float)
+    if len(edges) < 2:
+        return Numpy.zeros(0, dtype=Numpy.int64), edges
+    return Numpy.histogram(values, bins=edges)
+
+@pytest.mark.parametrize('binW', binWidths)
+def test_rebin_equals_numpy_histogram(binW):
+    for values in durationGroups():
+        hist, edges = Histograms.rebin(Histograms.cumulativeHist(values), binW)
+        numpyCounts, numpyEdges = numpyHist(values, binW)
+        Numpy.testing.assert_array_equal(edges, numpyEdges)
+        Numpy.testing.assert_array_equal(hist, numpyCounts)
+
+def test_rebin_of_merged_hists():
+    values = durationGroups(1)[0]
+    merged = Histograms.mergeHists(Histograms.cumulativeHist(values[:1000]), Histograms.cumulativeHist(values[1000:]))
+    for binW in binWidths:
+        Numpy.testing.assert_array_equal(Histograms.rebin(merged, binW)[0], numpyHist(values, binW)[0])
+
+def jsRebin(value, count, binW):
+    #######################################################################
+    # a line by line port of the loop of 'rebinCode' (plots.py), which
+    # re-bins the 1-minute counts of plotData.delayCounts in the browser;
+    # returns its (top, left, right)
+    #######################################################################
+    span = len(value) - 1
+    numEdges = Math.ceil(span/binW) if span > 0 else 0
+    top, left, right = [], [], []
+    for i in range(numEdges - 1):
+        stop = (i + 1)*binW + (1 if i == numEdges - 2 else 0)
+        total = 0
+        for j in range(i*binW, stop):
+            total += count[j]
+        top.append(total)
+        left.append(value[0] + i*binW)
+        right.append(value[0] + (i + 1)*binW)
+    return top, left, right
+
+def test_rebin_code_is_the_ported_one():
+    # the expressions of jsRebin, so that a change of the JavaScript fails here until the port follows it
+    for expression in ['var span = value.length - 1;',
+                       'var numEdges = (span > 0) ? Math.ceil(span/binW) : 0;',
+                       'for (var i = 0; i < numEdges - 1; i++) {',
+                       'var stop = (i + 1)*binW + ((i == numEdges - 2) ? 1 : 0);',
+                       'for (var j = i*binW; j < stop; j++) {',
+                       'total += count[j];',
+                       'left.push(value[0] + i*binW);',
+                       'right.push(value[0] + (i + 1)*binW);']:
+        assert expression in Plots.rebinCode
+
+@pytest.mark.parametrize('binW', binWidths)
+def test_client_rebin_equals_rebin(binW):
+    for values in durationGroups():
+        cumHist = Histograms.cumulativeHist(values)
+        value, count = Histograms.counts(cumHist)
+        top, left, right = jsRebin(list(value), list(count), binW)
+        hist, edges = Histograms.rebin(cumHist, binW)
+        quads = PlotData.quadData(hist, edges)
+        Numpy.testing.assert_array_equal(top, quads['top'])
+        Numpy.testing.assert_array_equal(left, quads['left'])
+        Numpy.testing.assert_array_equal(right, quads['right'])
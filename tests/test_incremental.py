@@ -0,0 +1,100 @@
+#######################################################################
+# Incremental append (incremental.py): appending days to a built month and
+# refreshing it gives the same data store as a full build with those days
+#######################################################################
+import collections as Collections
+import os as Os
+import sys as Sys
+import numpy as Numpy
+import pandas as Pandas
+import pytest
+
+Sys.path.insert(0, Os.path.join(Os.path.dirname(Os.path.abspath(__file__)), '..', 'benchmarks'))
+import syntheticData as SyntheticData
+import dataStore as DataStore
+import incremental as Incremental
+import resultCache as ResultCache
+
+yyyymm = '201801'
+
+@pytest.fixture
+def dataDir(tmp_path, monkeypatch):
+    #######################################################################
+    # a data directory with synthetic flights and the weather of the 25
+    # first days of the month, and the flights of the other days to append
+    #######################################################################
+    dataDir = str(tmp_path/'data')
+    flightFile = SyntheticData.writeDataDir(dataDir, yyyymm, scale=0.1, seed=2)   # (no airport or airline near the top threshold)
+    flights = Pandas.read_pickle(flightFile)
+    weatherFile = Os.path.join(dataDir, DataStore.weatherFilePrefix + yyyymm + '.pickle.gz')
+    weather = Pandas.read_pickle(weatherFile)
+    Os.remove(weatherFile)      # (a link to the app's weather)
+    flights.loc[flights['Date'] <= '2018-01-25'].reset_index(drop=True).to_pickle(flightFile)
+    weather.loc[weather['Date'] <= '2018-01-25'].reset_index(drop=True).to_pickle(weatherFile)
+    # days 24 to 28 (24 and 25 are known already), then 29 to 31
+    flights.loc[flights['Date'].between('2018-01-24', '2018-01-28')].to_pickle(str(tmp_path/'new1.pickle'))
+    flights.loc[flights['Date'] >= '2018-01-29'].to_pickle(str(tmp_path/'new2.pickle'))
+    weather.loc[weather['Date'] > '2018-01-25'].reset_index(drop=True).to_pickle(str(tmp_path/'newWeather.pickle'))
+
+    monkeypatch.setattr(DataStore, 'baseDir', Os.path.join(dataDir, ''))
+    monkeypatch.setattr(DataStore, 'cacheDir', Os.path.join(dataDir, 'cache', ''))
+    monkeypatch.setattr(DataStore, 'reportMemory', False)
+    monkeypatch.setattr(DataStore, '_dataStores', Collections.OrderedDict())
+    monkeypatch.setattr(DataStore, '_listeners', [])
+    return tmp_path
+
+def appendWeatherBatch(tmp_path):
+    # write the weather of the new days as a batch (as appendWeather does after fetching the GSOD files)
+    batchFile = Incremental.batchName(DataStore.weatherFilePrefix, yyyymm)
+    Pandas.read_pickle(str(tmp_path/'newWeather.pickle')).to_pickle(Incremental.dataPath(batchFile + '.pickle.gz'))
+
+def sameHists(hists, other):
+    assert set(hists) == set(other)
+    for key, cumHist in hists.items():
+        assert (cumHist['min'], cumHist['max'], cumHist['count']) == (other[key]['min'], other[key]['max'], other[key]['count'])
+        Numpy.testing.assert_array_equal(cumHist['cumCounts'], other[key]['cumCounts'])
+
+def test_merged_flight_store_equals_full_build(dataDir):
+    DataStore.loadFlightDur(yyyymm)
+    summary = Incremental.appendDays(yyyymm, str(dataDir/'new1.pickle'), weather=False)
+    assert summary['dates'] == ['2018-01-26', '2018-01-27', '2018-01-28']
+    Incremental.appendDays(yyyymm, str(dataDir/'new2.pickle'), weather=False)
+    assert Incremental.appendDays(yyyymm, str(dataDir/'new2.pickle'), weather=False)['flights'] == 0
+    merged, _ = DataStore.loadFlightDur(yyyymm)     # the store appendFlights wrote
+    full, _ = DataStore.buildFlightDur(yyyymm)
+    assert list(merged.columns) == list(full.columns)
+    for colName in full.columns:
+        Numpy.testing.assert_array_equal(Numpy.asarray(merged[colName]), Numpy.asarray(full[colName]))
+
+def test_append_then_refresh_equals_full_build(dataDir):
+    built = DataStore.getDataStore(yyyymm)
+    notified = []
+    DataStore.addListener(notified.append)
+    ResultCache.cached(('daily', yyyymm, 0, 'x'), lambda: Numpy.zeros(3))
+
+    Incremental.appendDays(yyyymm, str(dataDir/'new1.pickle'), weather=False)
+    appendWeatherBatch(dataDir)
+    Incremental.appendDays(yyyymm, str(dataDir/'new2.pickle'), weather=False)
+    assert Incremental.refreshMonths() == [yyyymm]
+    assert Incremental.refreshMonths() == []
+    assert notified == [yyyymm]
+    assert not any(x[1] == yyyymm for x in ResultCache._results)
+
+    refreshed = DataStore.getDataStore(yyyymm)
+    assert refreshed is not built and len(refreshed['appendBatches']) == 3
+    full = DataStore.buildDataStore(yyyymm)
+    # the lists of the month are kept from its first build; they are the same here
+    for name in ['airportList', 'airlineList', 'airportIds', 'airlineIds', 'weatherParams']:
+        assert refreshed[name] == full[name]
+    for name in ['topAirports', 'topAirlines']:
+        Pandas.testing.assert_frame_equal(refreshed[name], full[name])
+    sameHists(refreshed['durationHists'], full['durationHists'])
+    sameHists(refreshed['dailyHists'], full['dailyHists'])
+    Pandas.testing.assert_frame_equal(refreshed['dayStats'].astype({'Date': str, 'Type': str}),
+                                      full['dayStats'].astype({'Date': str, 'Type': str}))
+    cube, fullCube = refreshed['dailyIndex']['frame'], full['dailyIndex']['frame']
+    Pandas.testing.assert_frame_equal(cube.astype({'Date': str, 'Type': str}), fullCube.astype({'Date': str, 'Type': str}))
+    assert refreshed['dailyIndex']['offsets'] == full['dailyIndex']['offsets']
+    assert cube['Day'].max() == 31 and built['dailyIndex']['frame']['Day'].max() == 25
+    Pandas.testing.assert_frame_equal(refreshed['weatherCorr'].astype({'Type': str}), full['weatherCorr'].astype({'Type': str}))
+    assert len(refreshed['flightDur']) == len(full['flightDur'])
@@ -0,0 +1,75 @@
+#######################################################################
+# The readiness wait of the server extension (bokehServerExtension.py): a
+# starting server is waited for as long as it makes progress
+#######################################################################
+import os as Os
+import subprocess as Subprocess
+import sys as Sys
+import threading as Threading
+import time as Time
+import pytest
+
+Sys.path.insert(0, Os.path.join(Os.path.dirname(Os.path.abspath(__file__)), '..'))
+import bokehServerExtension as ServerExtension
+
+class FakeResponse:
+    status = 200
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        return False
+
+def startServer(script):
+    # a stand-in for the bokeh server: 'script' run in python, followed as the extension does
+    proc = Subprocess.Popen([Sys.executable, '-u', '-c', script], stdout=Subprocess.PIPE, stderr=Subprocess.STDOUT,
+                            universal_newlines=True)
+    Threading.Thread(target=ServerExtension.follow_output, args=(proc,), daemon=True).start()
+    return proc
+
+@pytest.fixture
+def extension(monkeypatch):
+    # a fresh status, a 1 s timeout and an app that answers once 'answering' is set
+    monkeypatch.setattr(ServerExtension, 'status', {'state': 'starting', 'progress': [], 'lastOutput': None, 'timings': {}})
+    monkeypatch.setattr(ServerExtension, 'readyTimeout', 1)
+    answering = Threading.Event()
+    def urlopen(url, timeout):
+        if not answering.is_set():
+            raise ConnectionRefusedError()
+        return FakeResponse()
+    monkeypatch.setattr(ServerExtension.urllib.request, 'urlopen', urlopen)
+    return answering
+
+def test_a_building_server_is_waited_for(extension):
+    # four times the timeout, printing a build stage every 0.3 s, then it answers
+    proc = startServer("import time\n"
+                       "for x in range(14):\n"
+                       "    print(f'Building Jan 2018: stage{x}')\n"
+                       "    time.sleep(0.3)\n"
+                       "time.sleep(60)\n")
+    Threading.Timer(4, extension.set).start()
+    try:
+        startTime = Time.time()
+        assert ServerExtension.wait_until_ready(proc)
+        assert Time.time() - startTime > 3.5
+        assert ServerExtension.status['state'] == 'building'
+        assert ServerExtension.status['progress'][-1].startswith('Building Jan 2018: stage')
+    finally:
+        proc.kill()
+        proc.wait()
+
+def test_a_silent_server_times_out(extension):
+    proc = startServer("import time\n"
+                       "print('Building Jan 2018: flightFile')\n"
+                       "time.sleep(60)\n")
+    try:
+        startTime = Time.time()
+        assert not ServerExtension.wait_until_ready(proc)
+        assert Time.time() - startTime < 5
+        assert proc.poll() is None
+    finally:
+        proc.kill()
+        proc.wait()
+
+def test_a_server_that_exits_is_not_ready(extension):
+    proc = startServer("print('Building Jan 2018: flightFile')\n")
+    assert not ServerExtension.wait_until_ready(proc)
@@ -0,0 +1,68 @@
+#######################################################################
+# Parsing of the GSOD station files (readStation in weatherFetch.py): the
+# files written back from the committed weather of January 2018 parse to
+# the same frame, and the sentinels and FRSHTT digits are decoded
+#######################################################################
+import os as Os
+import pandas as Pandas
+import pytest
+import gsodFiles as GsodFiles
+import weatherFetch as WeatherFetch
+
+weatherFile = Os.path.join(Os.path.dirname(Os.path.abspath(__file__)), '..', 'bokeh-app', 'data', 'weatherData_201801.pickle.gz')
+
+@pytest.fixture(scope='module')
+def weather():
+    return Pandas.read_pickle(weatherFile)
+
+def test_regenerated_stations_parse_to_the_pickle(weather, tmp_path):
+    stationWet = []
+    for (stn, wban), rows in weather.groupby(['STN', 'WBAN'], sort=False):
+        statName = WeatherFetch.stationFile(stn, wban, '2018')
+        # with a day of the month before and after, which are not kept
+        lines = ([GsodFiles.gsodLine(stn, wban, '20171231', {'TEMP': 1.0})] +
+                 [GsodFiles.cleanedLine(x) for x in rows.to_dict('records')] +
+                 [GsodFiles.gsodLine(stn, wban, '20180201', {'TEMP': 1.0})])
+        stationWet.append(WeatherFetch.readStation(GsodFiles.writeStation(str(tmp_path), statName, lines), '201801'))
+    Pandas.testing.assert_frame_equal(Pandas.concat(stationWet, ignore_index=True), weather.reset_index(drop=True))
+
+def test_sentinels_are_replaced(tmp_path):
+    values = {field: 12.5 for field, *x in GsodFiles.gsodFields}
+    missing = {field: None for field, *x in GsodFiles.gsodFields}
+    lines = [GsodFiles.gsodLine('722020', '12839', '20180101', values),
+             GsodFiles.gsodLine('722020', '12839', '20180102', missing),
+             # just below the sentinels: readings, not missing
+             GsodFiles.gsodLine('722020', '12839', '20180103', {'TEMP': 9999.8, 'VISIB': 999.8, 'PRCP': 99.98, 'SnowDep': 0.0})]
+    airpWet = WeatherFetch.readStation(GsodFiles.writeStation(str(tmp_path), 'x.op.gz', lines), '201801')
+    assert list(airpWet['Date']) == ['2018-01-01', '2018-01-02', '2018-01-03']
+    for column, sentinel, fill in WeatherFetch.sentinelTable:
+        assert airpWet[column].iloc[0] == 12.5
+        assert airpWet[column].iloc[1] == fill, column
+    assert (airpWet['TEMP'].iloc[2], airpWet['VISIB'].iloc[2], airpWet['PRCP'].iloc[2]) == (9999.8, 999.8, 99.98)
+    assert airpWet['SnowDep'].iloc[2] == 0
+
+def test_flags_are_ignored(tmp_path):
+    # the flags after MAX, MIN and PRCP do not change the values
+    values = {'MAXTemp': 40.1, 'MINTemp': 20.3, 'PRCP': 0.25}
+    lines = [GsodFiles.gsodLine('722020', '12839', '20180101', values, flags={108: '*', 116: '*', 123: 'G'}),
+             GsodFiles.gsodLine('722020', '12839', '20180102', values)]
+    airpWet = WeatherFetch.readStation(GsodFiles.writeStation(str(tmp_path), 'x.op.gz', lines), '201801')
+    for column in values:
+        assert list(airpWet[column]) == [values[column]]*2
+
+@pytest.mark.parametrize('frshtt', ['000000', '100000', '010010', '001100', '000001', '111111', '101010'])
+def test_frshtt_digits(frshtt, tmp_path):
+    lines = [GsodFiles.gsodLine('722020', '12839', '20180115', {'TEMP': 30.0}, frshtt)]
+    airpWet = WeatherFetch.readStation(GsodFiles.writeStation(str(tmp_path), 'x.op.gz', lines), '201801')
+    assert [int(airpWet[x].iloc[0]) for x in WeatherFetch.frshttFlags] == [int(x) for x in frshtt]
+    assert 'FRSHTT' not in airpWet.columns
+
+def test_station_ids_are_zero_padded(tmp_path):
+    lines = [GsodFiles.gsodLine('722590', '03927', '20180115', {'TEMP': 30.0})]
+    airpWet = WeatherFetch.readStation(GsodFiles.writeStation(str(tmp_path), 'x.op.gz', lines), '201801')
+    assert (airpWet['STN'].iloc[0], airpWet['WBAN'].iloc[0]) == ('722590', '03927')
+
+def test_no_days_in_the_month(tmp_path):
+    lines = [GsodFiles.gsodLine('722020', '12839', '20180201', {'TEMP': 30.0})]
+    airpWet = WeatherFetch.readStation(GsodFiles.writeStation(str(tmp_path), 'x.op.gz', lines), '201801')
+    assert len(airpWet) == 0